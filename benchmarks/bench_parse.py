@@ -0,0 +1,109 @@
+"""对比两次解析（html2text + BeautifulSoup）与单次解析（convert_page）的转换速度
+
+用法:
+    python benchmarks/bench_parse.py                      # 使用生成的固定语料
+    python benchmarks/bench_parse.py --save-corpus DIR     # 保存生成的语料
+    python benchmarks/bench_parse.py --corpus DIR          # 使用保存的HTML页面
+    python benchmarks/bench_parse.py --processes 4         # 同时测试进程池转换
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sitegen import generate_site  # noqa: E402
+from web_crawler import WebCrawler, convert_html  # noqa: E402
+
+BASE_URL = 'https://docs.example.com'
+
+
+def load_corpus(corpus_dir):
+    pages = {}
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            if name.endswith('.html'):
+                path = os.path.join(root, name)
+                with open(path, 'r', encoding='utf-8') as f:
+                    pages['/' + os.path.relpath(path, corpus_dir).replace(os.sep, '/')] = f.read()
+    return pages
+
+
+def save_corpus(pages, corpus_dir):
+    for path, html in pages.items():
+        file_path = os.path.join(corpus_dir, path.lstrip('/'))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+
+
+def two_pass(crawler, pages):
+    return [(crawler.html_to_markdown(html), crawler.extract_urls(html, BASE_URL + path)) for path, html in pages]
+
+
+def single_pass(crawler, pages):
+    return [crawler.convert_page(html, BASE_URL + path) for path, html in pages]
+
+
+def process_pool(processes, pages):
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # 预热子进程，不计入导入模块的时间
+        list(executor.map(convert_html, ['<p>warmup</p>'] * processes))
+        start = time.perf_counter()
+        list(executor.map(convert_html, [html for _, html in pages], chunksize=8))
+        return time.perf_counter() - start
+
+
+def best_of(func, crawler, pages, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(crawler, pages)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=300, help='生成的页面数')
+    parser.add_argument('--paragraphs', type=int, default=12, help='每个生成页面的段落数')
+    parser.add_argument('--corpus', help='已保存的HTML页面目录')
+    parser.add_argument('--save-corpus', help='将生成的语料保存到目录后退出')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    parser.add_argument('--processes', type=int, default=0, help='大于0时同时测试该数量的进程池转换')
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = generate_site(args.pages, paragraphs=args.paragraphs)
+    if args.save_corpus:
+        save_corpus(corpus, args.save_corpus)
+        print(f'已保存 {len(corpus)} 个页面到 {args.save_corpus}')
+        return
+
+    pages = sorted(corpus.items())
+    total_kb = sum(len(html.encode('utf-8')) for _, html in pages) / 1024
+    crawler = WebCrawler()
+
+    two_pass_time, expected = best_of(two_pass, crawler, pages, args.repeat)
+    single_pass_time, actual = best_of(single_pass, crawler, pages, args.repeat)
+    if actual != expected:
+        print('警告: 单次解析的结果与两次解析不一致')
+
+    print(f'语料: {len(pages)} 个页面, {total_kb:.1f} KB')
+    for name, elapsed in (('两次解析', two_pass_time), ('单次解析', single_pass_time)):
+        print(f'{name}: {elapsed:.3f} 秒, {len(pages) / elapsed:.1f} 页/秒')
+    print(f'加速比: {two_pass_time / single_pass_time:.2f}x')
+
+    if args.processes > 0:
+        elapsed = process_pool(args.processes, pages)
+        print(f'进程池({args.processes}进程): {elapsed:.3f} 秒, {len(pages) / elapsed:.1f} 页/秒, '
+              f'相对单次解析 {single_pass_time / elapsed:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""离线端到端基准测试：爬取本地生成的站点，再用模拟的OpenAI兼容接口清洗爬取结果
+
+站点服务器和模拟清洗服务在子进程中运行，不访问外部网络，也不需要API密钥。
+同样的参数总是生成同样的站点和429序列，不同版本之间的结果可以直接比较。
+
+用法:
+    python benchmarks/bench_suite.py                                  # 默认参数
+    python benchmarks/bench_suite.py --pages 2000 --depth 4 --paragraphs 40
+    python benchmarks/bench_suite.py --latency 0.5 --rate-limit 0.1 --clean-workers 16
+    python benchmarks/bench_suite.py --skip-clean --concurrency 8 --json result.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_servers import start_in_process  # noqa: E402
+from sitegen import links_for_depth  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """本进程到目前为止的峰值常驻内存(MB)，无法获取时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def fetch_json(url):
+    import requests
+    return requests.get(url, timeout=10).json()
+
+
+def bench_crawl(site_url, work_dir, args):
+    from metrics import Metrics
+    from web_crawler import WebCrawler
+
+    metrics = Metrics()
+    crawler = WebCrawler(metrics=metrics)
+    start = time.perf_counter()
+    stats = crawler.crawl(f'{site_url}/index.html', work_dir, concurrency=args.concurrency,
+                          process_workers=args.process_workers, respect_robots=False, use_sitemap=False)
+    elapsed = time.perf_counter() - start
+    crawler.close()
+    pages = stats['new'] + stats['changed'] + stats['unchanged'] + stats['duplicate']
+    return {
+        'seconds': elapsed,
+        'pages': pages,
+        'failed': stats['failed'],
+        'pages_per_second': pages / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {stage: {key: values[key] for key in ('count', 'total', 'p50', 'p95')}
+                   for stage, values in metrics.summary()['stages'].items() if values['total']},
+    }
+
+
+def bench_clean(llm_url, work_dir, args):
+    from markdown_cleaner import MarkdownCleaner
+    from metrics import Metrics
+
+    metrics = Metrics()
+    cleaner = MarkdownCleaner(api_key='offline-benchmark', api_endpoint=llm_url, model='mock',
+                              use_cache=False, stream=args.stream, metrics=metrics)
+    before = fetch_json(f'{llm_url}/stats')
+    start = time.perf_counter()
+    results = cleaner.clean_directory(work_dir, max_workers=args.clean_workers, incremental=False,
+                                      batch=args.batch)
+    elapsed = time.perf_counter() - start
+    after = fetch_json(f'{llm_url}/stats')
+
+    summary = metrics.summary()
+    api = summary['stages'].get('api', {})
+    return {
+        'seconds': elapsed,
+        'files': len(results),
+        'failed': sum(1 for _, success, _ in results if not success),
+        'files_per_second': len(results) / elapsed if elapsed else 0.0,
+        'api_calls': after['requests'] - before['requests'],
+        'rate_limited': after['rate_limited'] - before['rate_limited'],
+        'completion_tokens': after['completion_tokens'] - before['completion_tokens'],
+        'tokens_per_second': (after['completion_tokens'] - before['completion_tokens']) / elapsed if elapsed else 0.0,
+        'api_p50': api.get('p50', 0.0),
+        'api_p95': api.get('p95', 0.0),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def print_report(report):
+    config = report['config']
+    print(f"站点: {config['pages']} 个页面, 深度 {config['depth']} (每页 {config['links']} 个子链接), "
+          f"每页 {config['paragraphs']} 段")
+    rss = lambda value: f'{value:.1f} MB' if value is not None else '未知'  # noqa: E731
+    crawl = report.get('crawl')
+    if crawl:
+        print(f"爬取: {crawl['pages']} 页, {crawl['seconds']:.2f} 秒, {crawl['pages_per_second']:.1f} 页/秒, "
+              f"失败 {crawl['failed']}, 峰值内存 {rss(crawl['peak_rss_mb'])}")
+        for stage, values in sorted(crawl['stages'].items(), key=lambda item: -item[1]['total']):
+            print(f"  {stage:<8} 合计 {values['total']:.2f} 秒, p50 {values['p50'] * 1000:.1f} ms, "
+                  f"p95 {values['p95'] * 1000:.1f} ms")
+    clean = report.get('clean')
+    if clean:
+        print(f"清洗: {clean['files']} 个文件, {clean['seconds']:.2f} 秒, {clean['files_per_second']:.1f} 文件/秒, "
+              f"失败 {clean['failed']}, 峰值内存 {rss(clean['peak_rss_mb'])}")
+        print(f"  API调用 {clean['api_calls']} 次 (429: {clean['rate_limited']}), "
+              f"输出 {clean['tokens_per_second']:.0f} 令牌/秒, "
+              f"延迟 p50 {clean['api_p50'] * 1000:.0f} ms, p95 {clean['api_p95'] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    site = parser.add_argument_group('站点')
+    site.add_argument('--pages', type=int, default=300, help='生成的页面数')
+    site.add_argument('--depth', type=int, default=3, help='站点深度（不超过爬虫的最大爬取深度）')
+    site.add_argument('--paragraphs', type=int, default=12, help='每个页面的段落数，控制页面大小')
+    crawl = parser.add_argument_group('爬取')
+    crawl.add_argument('--concurrency', type=int, default=4, help='爬取并发数')
+    crawl.add_argument('--process-workers', type=int, default=0, help='转换进程数')
+    llm = parser.add_argument_group('模拟清洗服务')
+    llm.add_argument('--latency', type=float, default=0.05, help='每个API请求的延迟(秒)')
+    llm.add_argument('--rate-limit', type=float, default=0.0, help='返回429的请求比例')
+    llm.add_argument('--output-ratio', type=float, default=0.8,
+                     help='输出长度相对于输入文档的比例（批量清洗时小于1会截掉分隔符，触发逐个重试）')
+    llm.add_argument('--retry-after-ms', type=int, default=50, help='429响应中的retry-after-ms')
+    clean = parser.add_argument_group('清洗')
+    clean.add_argument('--clean-workers', type=int, default=8, help='并发清洗的文件数')
+    clean.add_argument('--stream', action='store_true', help='使用流式响应')
+    clean.add_argument('--batch', action='store_true', help='合并小文件请求')
+    parser.add_argument('--skip-crawl', action='store_true', help='只测试清洗（需要--work-dir中已有爬取结果）')
+    parser.add_argument('--skip-clean', action='store_true', help='只测试爬取')
+    parser.add_argument('--work-dir', help='爬取结果目录，默认使用临时目录并在结束后删除')
+    parser.add_argument('--json', help='将结果以JSON格式保存到该文件')
+    args = parser.parse_args()
+
+    links = links_for_depth(args.pages, args.depth)
+    report = {'config': {'pages': args.pages, 'depth': args.depth, 'links': links, 'paragraphs': args.paragraphs,
+                         'concurrency': args.concurrency, 'clean_workers': args.clean_workers,
+                         'latency': args.latency, 'rate_limit': args.rate_limit, 'stream': args.stream,
+                         'batch': args.batch}}
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='md_bench_')
+    servers = []
+    try:
+        if not args.skip_crawl:
+            process, site_url = start_in_process('site', total_pages=args.pages, links_per_page=links,
+                                                 paragraphs=args.paragraphs)
+            servers.append(process)
+            report['crawl'] = bench_crawl(site_url, work_dir, args)
+        if not args.skip_clean:
+            process, llm_url = start_in_process('llm', latency=args.latency, rate_limit_ratio=args.rate_limit,
+                                                output_ratio=args.output_ratio,
+                                                retry_after_ms=args.retry_after_ms)
+            servers.append(process)
+            report['clean'] = bench_clean(llm_url, work_dir, args)
+    finally:
+        for process in servers:
+            process.terminate()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
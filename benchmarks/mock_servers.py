@@ -0,0 +1,178 @@
+"""基准测试使用的本地服务器：生成站点的HTTP服务器和兼容OpenAI接口的模拟清洗服务
+
+两个服务器都只监听127.0.0.1，可以在子进程中运行，避免与被测代码争用GIL和内存。
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, Queue
+
+from sitegen import generate_site
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """从内存中的{路径: HTML}字典返回页面，支持keep-alive"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写入，否则keep-alive连接会受延迟确认影响
+    pages = {}
+
+    def do_GET(self):
+        html = self.pages.get(self.path.split('?', 1)[0].split('#', 1)[0])
+        if html is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """模拟 /chat/completions 接口
+
+    响应内容为用户消息中第一个空行之后的文本（即待清洗的文档）按output_ratio截取的前缀，
+    usage按4个字符一个令牌估算。按rate_limit_ratio的概率返回带retry-after-ms的429。
+    GET /stats 返回请求计数。
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+    rate_limit_ratio = 0.0
+    retry_after_ms = 50
+    output_ratio = 1.0
+    stats = None
+    lock = threading.Lock()
+    rng = random.Random(0)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            with self.lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with self.lock:
+            self.stats['requests'] += 1
+            limited = self.rng.random() < self.rate_limit_ratio
+            if limited:
+                self.stats['rate_limited'] += 1
+        if limited:
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded', 'type': 'rate_limit_error'}},
+                            {'retry-after-ms': str(self.retry_after_ms)})
+            return
+
+        time.sleep(self.latency)
+        messages = request.get('messages', [])
+        prompt = ''.join(message.get('content', '') for message in messages)
+        document = messages[-1]['content'].split('\n\n', 1)[-1] if messages else ''
+        content = document[:max(1, int(len(document) * self.output_ratio))]
+        usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4,
+                 'total_tokens': (len(prompt) + len(content)) // 4}
+        with self.lock:
+            self.stats['prompt_tokens'] += usage['prompt_tokens']
+            self.stats['completion_tokens'] += usage['completion_tokens']
+
+        base = {'id': 'mock', 'created': int(time.time()), 'model': request.get('model', 'mock')}
+        if request.get('stream'):
+            self._send_stream(base, content, usage if request.get('stream_options', {}).get('include_usage') else None)
+            return
+        self._send_json(200, dict(base, object='chat.completion', usage=usage, choices=[{
+            'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}]))
+
+    def _send_stream(self, base, content, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        chunk = dict(base, object='chat.completion.chunk')
+        for start in range(0, len(content), 64):
+            delta = {'content': content[start:start + 64]}
+            self._send_event(dict(chunk, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}]))
+        self._send_event(dict(chunk, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        if usage:
+            self._send_event(dict(chunk, choices=[], usage=usage))
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+    def _send_event(self, data):
+        self.wfile.write(f'data: {json.dumps(data, ensure_ascii=False)}\n\n'.encode('utf-8'))
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_site_server(pages, port=0):
+    """创建提供pages（{路径: HTML}）的服务器，需要调用serve_forever"""
+    handler = type('Handler', (SiteHandler,), {'pages': pages})
+    return _QuietServer(('127.0.0.1', port), handler)
+
+
+def create_llm_server(latency=0.0, rate_limit_ratio=0.0, output_ratio=1.0, retry_after_ms=50, seed=0, port=0):
+    """创建模拟清洗服务，需要调用serve_forever
+
+    Args:
+        latency: 每个请求的固定延迟(秒)
+        rate_limit_ratio: 返回429的请求比例
+        output_ratio: 输出长度相对于输入文档的比例
+        retry_after_ms: 429响应中的retry-after-ms
+        seed: 决定哪些请求返回429的随机种子
+    """
+    handler = type('Handler', (MockLLMHandler,), {
+        'latency': latency, 'rate_limit_ratio': rate_limit_ratio, 'output_ratio': output_ratio,
+        'retry_after_ms': retry_after_ms, 'lock': threading.Lock(), 'rng': random.Random(seed),
+        'stats': {'requests': 0, 'rate_limited': 0, 'prompt_tokens': 0, 'completion_tokens': 0},
+    })
+    return _QuietServer(('127.0.0.1', port), handler)
+
+
+def _serve(kind, kwargs, ready):
+    if kind == 'site':
+        server = create_site_server(generate_site(**kwargs))
+    else:
+        server = create_llm_server(**kwargs)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_in_process(kind, **kwargs):
+    """在子进程中启动服务器
+
+    Args:
+        kind: 'site'时kwargs传给sitegen.generate_site，'llm'时传给create_llm_server
+
+    Returns:
+        (子进程, 基础URL)，用完后调用process.terminate()
+    """
+    ready = Queue()
+    process = Process(target=_serve, args=(kind, kwargs, ready), daemon=True)
+    process.start()
+    port = ready.get(timeout=60)
+    return process, f'http://127.0.0.1:{port}'
@@ -0,0 +1,76 @@
+"""确定性的文档站点生成器，供基准测试使用
+
+同样的参数总是生成同样的页面，保证不同版本之间的测试结果可以比较。
+"""
+import random
+
+WORDS = [
+    'crawler', 'markdown', 'session', 'pipeline', 'index', 'worker', 'config', 'request',
+    'response', 'cache', 'token', 'document', 'section', 'parser', 'buffer', 'thread',
+]
+CJK_TEXT = '网页爬虫将文档站点转换为结构化知识，清洗后的内容用于向量检索和问答系统'
+
+
+def page_path(index):
+    """页面编号对应的URL路径"""
+    return '/index.html' if index == 0 else f'/docs/page-{index}.html'
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+    start = rng.randint(0, len(CJK_TEXT) - 12)
+    return ' '.join(words).capitalize() + '. ' + CJK_TEXT[start:start + rng.randint(8, 12)] + '。'
+
+
+def generate_page(index, total_pages, links_per_page=8, paragraphs=12, seed=0):
+    """生成编号为index的页面HTML
+
+    Args:
+        index: 页面编号，0为首页
+        total_pages: 站点页面总数，子链接只指向站点内的页面
+        links_per_page: 正文中的子链接数量
+        paragraphs: 正文段落数，控制页面大小
+        seed: 随机种子
+    """
+    rng = random.Random(seed * 1000003 + index)
+    nav = ''.join(f'<li><a href="{page_path(i)}">导航 {i}</a></li>' for i in range(min(total_pages, 10)))
+
+    # 子链接优先指向下一层页面，使站点具有一定深度
+    children = [i for i in range(index * links_per_page + 1, (index + 1) * links_per_page + 1) if i < total_pages]
+    while len(children) < links_per_page and total_pages > 1:
+        children.append(rng.randrange(total_pages))
+
+    body = [f'<h1>文档页面 {index}</h1>']
+    for p in range(paragraphs):
+        if p % 4 == 0:
+            body.append(f'<h2>章节 {p // 4 + 1}</h2>')
+        body.append(f'<p>{_sentence(rng)} {_sentence(rng)}</p>')
+        if p % 5 == 2:
+            body.append(f'<pre><code>def handler_{index}_{p}(request):\n    return request.{rng.choice(WORDS)}()\n</code></pre>')
+        if p % 6 == 3:
+            rows = ''.join(f'<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 999)}</td></tr>' for _ in range(4))
+            body.append(f'<table><tr><th>名称</th><th>数值</th></tr>{rows}</table>')
+    body.append('<ul>' + ''.join(
+        f'<li><a href="{page_path(child)}?utm_source=body#top">相关页面 {child}</a></li>' for child in children) + '</ul>')
+
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>文档页面 {index}</title><script>var page = {index};</script></head><body>'
+        f'<header><nav><ul>{nav}</ul></nav></header>'
+        f'<main>{"".join(body)}</main>'
+        '<footer><p>版权所有 © 2024 示例文档站点</p></footer>'
+        '</body></html>'
+    )
+
+
+def generate_site(total_pages, **kwargs):
+    """生成整个站点，返回{URL路径: HTML}字典"""
+    return {page_path(i): generate_page(i, total_pages, **kwargs) for i in range(total_pages)}
+
+
+def links_for_depth(total_pages, depth):
+    """使total_pages个页面的站点在depth层内全部可达的最小每页子链接数"""
+    links = 1
+    while sum(links ** level for level in range(depth + 1)) < total_pages:
+        links += 1
+    return links
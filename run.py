@@ -1,31 +1,92 @@
 #!/usr/bin/env python3
+"""启动工具
+
+    python run.py                 # 启动Streamlit界面
+    python run.py crawl ...       # 不启动界面，执行命令行子命令（见 python run.py --help）
+"""
 import os
+import re
 import subprocess
 import sys
 
-def check_requirements():
-    """检查并安装所需的依赖"""
+# 命令行子命令，参数以这些名称或选项开头时不启动界面
+CLI_COMMANDS = ('crawl', 'clean', 'pipeline', '-h', '--help')
+
+
+def parse_requirements(path="requirements.txt"):
+    """解析依赖文件，返回(包名, 固定版本)列表，没有用==固定版本时版本为None"""
+    requirements = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].split(';', 1)[0].strip()
+            if not line or line.startswith('-'):
+                continue
+            match = re.match(r'([A-Za-z0-9][A-Za-z0-9._-]*)(?:\[[^\]]*\])?\s*(?:==\s*([^\s,]+))?', line)
+            if match:
+                requirements.append((match.group(1), match.group(2)))
+    return requirements
+
+
+def missing_requirements(path="requirements.txt"):
+    """通过importlib.metadata检查已安装的版本，返回未安装或版本不一致的依赖说明列表
+
+    只读取已安装包的元数据，不导入包本身，也不调用pip。
+    """
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:  # Python 3.7没有importlib.metadata，交给pip检查
+        return [f"{name}=={pinned}" if pinned else name for name, pinned in parse_requirements(path)]
+
+    missing = []
+    for name, pinned in parse_requirements(path):
+        try:
+            installed = version(name)
+        except PackageNotFoundError:
+            missing.append(f"{name}（未安装）")
+            continue
+        if pinned and installed != pinned:
+            missing.append(f"{name}（已安装 {installed}，需要 {pinned}）")
+    return missing
+
+
+def check_requirements(path="requirements.txt"):
+    """检查依赖，只有缺少依赖或版本不一致时才调用pip安装
+
+    提示和pip的输出写入标准错误，命令行模式下标准输出只包含结果JSON。
+    """
+    missing = missing_requirements(path)
+    if not missing:
+        return True
+    print("需要安装或更新依赖: " + ", ".join(missing), file=sys.stderr)
+    try:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", path], stdout=sys.stderr)
         return True
     except subprocess.CalledProcessError:
-        print("安装依赖失败，请检查网络连接或手动安装依赖。")
+        print("安装依赖失败，请检查网络连接或手动安装依赖。", file=sys.stderr)
         return False
 
+
 def main():
-    # 确保在正确的目录中
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    os.chdir(script_dir)
-    
+
     # 检查并安装依赖
-    print("正在检查依赖...")
-    if not check_requirements():
+    if not check_requirements(os.path.join(script_dir, "requirements.txt")):
         sys.exit(1)
-    
+
+    # 带子命令时不启动界面，命令行中的相对路径相对于当前目录
+    args = sys.argv[1:]
+    if args and args[0] in CLI_COMMANDS:
+        sys.path.insert(0, os.path.join(script_dir, "src"))
+        from cli import main as cli_main
+        sys.exit(cli_main(args))
+
+    # 确保在正确的目录中
+    os.chdir(script_dir)
+
     # 启动 Streamlit 应用
     print("正在启动爬虫工具...")
     try:
-        subprocess.run(["streamlit", "run", "src/app.py"], check=True)
+        subprocess.run([sys.executable, "-m", "streamlit", "run", "src/app.py"], check=True)
     except subprocess.CalledProcessError:
         print("启动失败，请确保已正确安装所有依赖。")
         sys.exit(1)
@@ -33,4 +94,4 @@ def main():
         print("\n程序已终止")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
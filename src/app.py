@@ -2,14 +2,129 @@ import streamlit as st
 from web_crawler import WebCrawler
 import os
 import glob
+import time
 from markdown_cleaner import MarkdownCleaner
-from config import DEEPSEEK_API_KEY, DEEPSEEK_API_ENDPOINT, DEEPSEEK_MODEL
+from search_index import SearchIndex
+from metrics import Metrics
+from jobs import JobManager, RUNNING, DONE, FAILED, CANCELLED
+from config import DEEPSEEK_API_KEY, DEEPSEEK_API_ENDPOINT, DEEPSEEK_MODEL, CLEAN_MAX_WORKERS, METRICS_FILE
 
 # 设置页面标题
 st.set_page_config(page_title="网页爬虫与Markdown清洗工具", layout="wide")
 
+STATUS_LABELS = {RUNNING: '运行中', DONE: '已完成', FAILED: '失败', CANCELLED: '已取消'}
+
+
+@st.cache_resource
+def get_job_manager():
+    """所有会话共享的后台任务管理器，页面重新运行或刷新时任务继续执行"""
+    return JobManager()
+
+
+@st.cache_resource(show_spinner=False)
+def get_cleaner(api_key, api_endpoint, model, requests_per_minute, tokens_per_minute, stream):
+    """按设置缓存清洗器，多次清洗复用API客户端的连接池、限流器和自适应并发上限"""
+    return MarkdownCleaner(api_key=api_key, api_endpoint=api_endpoint, model=model,
+                           requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                           stream=stream)
+
+
+def show_clean_error(error_message):
+    if "timeout" in error_message.lower():
+        st.error(f'处理超时: {error_message}\n\n可能原因：文件过大或API响应慢。尝试减小文件大小或稍后再试。')
+    elif "api key" in error_message.lower() or "unauthorized" in error_message.lower():
+        st.error(f'API密钥错误: {error_message}\n\n请检查您的API密钥是否正确。')
+    else:
+        st.error(f'处理过程中发生错误: {error_message}')
+
+
+def render_jobs(kind, render_result):
+    """显示某类任务的进度和结果，运行中的任务可以取消"""
+    manager = get_job_manager()
+    jobs = manager.jobs(kind)
+    if not jobs:
+        return
+    st.subheader('任务')
+    for job in jobs:
+        snapshot = job.snapshot()
+        with st.container(border=True):
+            st.markdown(f"**{snapshot['title']}** · {STATUS_LABELS[snapshot['status']]} · "
+                        f"用时 {snapshot['elapsed']:.0f} 秒")
+            if snapshot['status'] == RUNNING:
+                st.progress(snapshot['progress'] / 100)
+                st.text(snapshot['message'])
+                if not snapshot['cancel_requested'] and st.button('取消', key=f"job_cancel_{snapshot['id']}"):
+                    job.cancel()
+            elif snapshot['status'] == FAILED:
+                if kind == 'clean':
+                    show_clean_error(snapshot['error'])
+                else:
+                    st.error(f"发生错误: {snapshot['error']}")
+            else:
+                render_result(snapshot)
+            if snapshot['log']:
+                with st.expander('进度日志', expanded=False):
+                    st.text('\n'.join(snapshot['log'][-50:]))
+    if any(not job.running for job in jobs) and st.button('清除已结束的任务', key=f'{kind}_clear_jobs'):
+        manager.clear_finished(kind)
+        st.rerun()
+
+
+def render_crawl_result(snapshot):
+    result = snapshot['result']
+    stats = result['stats']
+    summary = (f"新增 {stats['new']} 个、变化 {stats['changed']} 个、未变化 {stats['unchanged']} 个页面，"
+               f"重复 {stats['duplicate']} 个，跳过 {stats['skipped']} 个，失败 {stats['failed']} 个")
+    if stats['cancelled']:
+        st.warning(f"爬取已取消：{summary}。使用相同的URL和保存路径再次爬取会从中断处继续")
+    else:
+        st.success(f"爬取完成！{summary}。文件已保存到: {result['save_path']}")
+    if result.get('metrics_report'):
+        st.code(result['metrics_report'])
+
+
+def render_clean_result(snapshot):
+    result = snapshot['result']
+    if result['mode'] == 'file':
+        if result['success']:
+            st.success(f"处理完成！清洗后的文件已保存到: {result['result']}")
+        else:
+            st.error(f"处理失败: {result['result']}")
+    else:
+        results = result['results']
+        total = len(results)
+        success_count = sum(1 for _, success, _ in results if success)
+        message = f'共 {total} 个文件，成功 {success_count} 个，失败 {total - success_count} 个'
+        if snapshot['status'] == CANCELLED:
+            st.warning(f'清洗已取消！{message}。再次清洗该目录时会跳过已完成的文件')
+        else:
+            st.success(f'全部处理完成！{message}')
+        index_stats = result.get('index_stats')
+        if index_stats:
+            st.info(f"全文索引已更新：新增 {index_stats['added']} 个，更新 {index_stats['updated']} 个，"
+                    f"删除 {index_stats['removed']} 个文件")
+        
+        # 显示每个文件的处理结果
+        if total > 0:
+            with st.expander('处理结果明细', expanded=total <= 20):
+                for file_path, success, file_result in results:
+                    if success:
+                        file_stats = result['file_stats'].get(file_path, {})
+                        note = ''
+                        if file_stats.get('continuations'):
+                            note = f"（自动续写 {file_stats['continuations']} 次）"
+                        if file_stats.get('truncated'):
+                            note += '（输出可能不完整）'
+                        st.markdown(f'✅ **{os.path.basename(file_path)}**: 已保存到 `{file_result}`{note}')
+                    else:
+                        st.markdown(f'❌ **{os.path.basename(file_path)}**: {file_result}')
+    if result.get('metrics_report'):
+        st.subheader('性能指标')
+        st.code(result['metrics_report'])
+
+
 # 创建标签页
-tab1, tab2 = st.tabs(["网页爬虫", "Markdown清洗"])
+tab1, tab2, tab3 = st.tabs(["网页爬虫", "Markdown清洗", "全文搜索"])
 
 # 标签页1: 网页爬虫
 with tab1:
@@ -41,27 +156,55 @@ with tab1:
     if 'save_path' in st.session_state:
         save_path = st.session_state['save_path']
 
+    # 爬取范围设置
+    with st.expander("爬取范围", expanded=False):
+        include_text = st.text_area("只爬取匹配以下规则的URL（每行一个正则表达式，留空表示不限制）", value="",
+                                    key='crawler_include')
+        exclude_text = st.text_area("不爬取匹配以下规则的URL（每行一个正则表达式）", value="",
+                                    key='crawler_exclude')
+        max_page_mb = st.number_input("单个页面最大大小 (MB)", min_value=1, max_value=100, value=5, step=1,
+                                      key='crawler_max_page_mb',
+                                      help="超过该大小的页面停止下载并跳过；图片、PDF、压缩包等非HTML内容总是跳过")
+        respect_robots = st.checkbox("遵守robots.txt", value=True, key='crawler_robots',
+                                     help="跳过robots.txt禁止爬取的页面，并按其中的Crawl-delay控制请求间隔")
+        use_sitemap = st.checkbox("从sitemap.xml读取页面", value=True, key='crawler_sitemap',
+                                  help="开始时读取网站sitemap中列出的页面，不必逐页解析链接才能发现")
+        crawl_delay = st.number_input("同一网站两次请求的最小间隔 (秒)", min_value=0.0, max_value=60.0, value=0.0,
+                                      step=0.5, key='crawler_delay')
+        crawler_metrics = st.checkbox("记录性能指标", value=False, key='crawler_metrics',
+                                      help=f"记录每个页面下载、解码、转换、写入的耗时，保存到输出目录的{METRICS_FILE}并在完成后显示汇总")
+
     if st.button('开始爬取', key='crawler_start'):
         if url and save_path:
             try:
-                # 显示进度信息
-                progress_text = st.empty()
-                progress_text.text('正在初始化爬虫...')
+                # 创建爬虫实例，爬取在后台线程中执行，页面重新运行不会中断爬取
+                metrics = Metrics(os.path.join(save_path, METRICS_FILE)) if crawler_metrics else None
+                crawler = WebCrawler(
+                    include_patterns=[line.strip() for line in include_text.splitlines() if line.strip()],
+                    exclude_patterns=[line.strip() for line in exclude_text.splitlines() if line.strip()],
+                    max_page_bytes=int(max_page_mb * 1024 * 1024),
+                    metrics=metrics
+                )
+                crawl_args = dict(start_url=url, save_path=save_path, respect_robots=respect_robots,
+                                  use_sitemap=use_sitemap, delay=crawl_delay)
                 
-                # 创建爬虫实例并开始爬取
-                crawler = WebCrawler()
-                
-                # 更新状态
-                progress_text.text('开始爬取网页...')
-                crawler.crawl(url, save_path)
-                
-                # 完成提示
-                st.success(f'爬取完成！文件已保存到: {os.path.abspath(save_path)}')
+                def run_crawl(job, crawler=crawler, metrics=metrics, crawl_args=crawl_args):
+                    try:
+                        stats = crawler.crawl(callback=job.update, cancel_event=job.cancel_event, **crawl_args)
+                    finally:
+                        crawler.close()
+                        if metrics:
+                            metrics.close()
+                    return {'stats': stats, 'save_path': os.path.abspath(crawl_args['save_path']),
+                            'metrics_report': metrics.report() if metrics else None}
                 
+                get_job_manager().submit('crawl', f'爬取 {url}', run_crawl)
             except Exception as e:
                 st.error(f'发生错误: {str(e)}')
         else:
             st.warning('请输入URL和保存路径')
+    
+    render_jobs('crawl', render_crawl_result)
 
 # 标签页2: Markdown清洗
 with tab2:
@@ -134,110 +277,128 @@ with tab2:
                               help="控制输出文本的最大长度")
         timeout_value = st.slider("API超时时间(秒)", min_value=30, max_value=300, value=120, step=30,
                                  help="API请求的最大等待时间")
+        max_workers = st.slider("并发文件数", min_value=1, max_value=16, value=CLEAN_MAX_WORKERS, step=1,
+                                help="目录模式下同时清洗的文件数")
+        stream_output = st.checkbox("流式输出", value=False,
+                                    help="边接收边写入输出文件，按已接收的令牌数显示进度；调用失败时保留部分结果（.partial文件）")
+        incremental = st.checkbox("跳过未变化的文件", value=True,
+                                  help="目录模式下跳过内容未变化且已成功清洗的文件，只处理新文件、变化的文件和上次失败的文件")
+        batch_small_files = st.checkbox("合并小文件请求", value=False,
+                                        help="目录模式下将多个短文档放入同一个API请求清洗，减少请求次数；结果无法拆分的文件会单独重新清洗")
+        clean_metrics = st.checkbox("记录性能指标", value=False, key='md_metrics',
+                                    help=f"记录每次API调用的耗时、令牌用量和重试次数，保存到文件所在目录的{METRICS_FILE}并在完成后显示汇总")
+        limit_col1, limit_col2 = st.columns(2)
+        with limit_col1:
+            requests_per_minute = st.number_input("每分钟最大请求数", min_value=0, value=0, step=10,
+                                                  help="0表示不限制，按账户的速率限制设置可避免429错误")
+        with limit_col2:
+            tokens_per_minute = st.number_input("每分钟最大令牌数", min_value=0, value=0, step=10000,
+                                                help="0表示不限制，包括输入和输出令牌")
     
-    # 处理按钮
     if st.button('开始清洗', key='md_start_clean'):
         # 检查API密钥
         if not api_key:
             st.error('请设置有效的DeepSeek API密钥')
+        elif option == '单个文件' and not file_path:
+            st.error('请输入文件路径')
+        elif option == '单个文件' and not os.path.exists(file_path):
+            st.error(f'文件不存在: {file_path}')
+        elif option == '整个目录' and not dir_path:
+            st.error('请输入目录路径')
+        elif option == '整个目录' and not os.path.isdir(dir_path):
+            st.error(f'目录不存在: {dir_path}')
         else:
-            # 初始化进度信息
-            progress_container = st.container()
-            with progress_container:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                detailed_text = st.empty()
-                results_area = st.container()
-            
-            # 创建清洗器实例
+            # 创建清洗器实例：记录性能指标时使用独立实例，否则复用缓存的清洗器
             try:
-                cleaner = MarkdownCleaner(api_key=api_key, api_endpoint=api_endpoint, model=model)
-                
-                # 处理回调函数
-                def update_progress(path, progress, message):
-                    # 更新进度条
-                    if progress >= 0:
-                        progress_bar.progress(progress / 100)
-                    
-                    # 更新状态文本
-                    file_name = os.path.basename(path) if os.path.exists(path) else path
-                    status_text.text(f"处理: {file_name} - {progress}%")
-                    detailed_text.text(message)
-                    
-                    # 如果是文件完成或失败，添加到结果区域
-                    if progress == 100 or progress == -1:
-                        with results_area:
-                            if progress == 100:
-                                st.success(f"{file_name}: {message}")
-                            else:
-                                st.error(f"{file_name}: {message}")
-                
-                try:
-                    if option == '单个文件':
-                        # 检查路径
-                        if not file_path:
-                            st.error('请输入文件路径')
-                        elif not os.path.exists(file_path):
-                            st.error(f'文件不存在: {file_path}')
-                        else:
-                            status_text.text('开始处理文件...')
-                            
-                            # 配置显示实时状态
-                            status_container = st.empty()
-                            status_container.info("正在处理中，请耐心等待...")
-                            
-                            # 开始处理
-                            success, result = cleaner.clean_file(file_path, update_progress)
-                            
-                            # 更新最终状态
-                            if success:
-                                progress_bar.progress(100)
-                                status_container.success(f'处理完成！清洗后的文件已保存到: {result}')
-                            else:
-                                progress_bar.progress(0)
-                                status_container.error(f'处理失败: {result}')
-                    else:
-                        # 检查路径
-                        if not dir_path:
-                            st.error('请输入目录路径')
-                        elif not os.path.isdir(dir_path):
-                            st.error(f'目录不存在: {dir_path}')
-                        else:
-                            status_text.text('开始处理目录...')
-                            
-                            # 配置显示实时状态
-                            status_container = st.empty()
-                            status_container.info("正在处理中，请耐心等待...")
-                            
-                            # 开始处理
-                            results = cleaner.clean_directory(dir_path, update_progress)
-                            
-                            # 汇总结果
-                            total = len(results)
-                            success_count = sum(1 for _, success, _ in results if success)
-                            
-                            # 更新最终状态
-                            progress_bar.progress(100)
-                            status_container.success(f'全部处理完成！共 {total} 个文件，成功 {success_count} 个，失败 {total - success_count} 个')
-                            
-                            # 显示每个文件的处理结果
-                            if total > 0:
-                                st.subheader('处理结果明细')
-                                for file_path, success, result in results:
-                                    if success:
-                                        st.markdown(f'✅ **{os.path.basename(file_path)}**: 已保存到 `{result}`')
-                                    else:
-                                        st.markdown(f'❌ **{os.path.basename(file_path)}**: {result}')
-                except Exception as e:
-                    error_message = str(e)
-                    if "timeout" in error_message.lower():
-                        st.error(f'处理超时: {error_message}\n\n可能原因：文件过大或API响应慢。尝试减小文件大小或稍后再试。')
-                    elif "api key" in error_message.lower() or "unauthorized" in error_message.lower():
-                        st.error(f'API密钥错误: {error_message}\n\n请检查您的API密钥是否正确。')
-                    else:
-                        st.error(f'处理过程中发生错误: {error_message}')
-                    progress_bar.progress(0)
+                target_path = file_path if option == '单个文件' else dir_path
+                metrics = None
+                if clean_metrics:
+                    metrics_dir = dir_path if option == '整个目录' else os.path.dirname(file_path)
+                    metrics = Metrics(os.path.join(metrics_dir or '.', METRICS_FILE))
+                    cleaner = MarkdownCleaner(api_key=api_key, api_endpoint=api_endpoint, model=model,
+                                              requests_per_minute=int(requests_per_minute) or None,
+                                              tokens_per_minute=int(tokens_per_minute) or None,
+                                              stream=stream_output, metrics=metrics)
+                else:
+                    # 缓存的清洗器被多个任务共享，每个任务使用独立的文件统计
+                    cleaner = get_cleaner(api_key, api_endpoint, model, int(requests_per_minute) or None,
+                                          int(tokens_per_minute) or None, stream_output).for_job()
             except Exception as e:
                 st.error(f'初始化API客户端失败: {str(e)}')
                 st.info("解决建议: 请确保API密钥正确且有效，API端点可访问，并且网络连接正常。")
-                progress_bar.progress(0)
\ No newline at end of file
+            else:
+                clean_args = dict(mode='file' if option == '单个文件' else 'dir', path=target_path,
+                                  max_workers=max_workers, incremental=incremental, batch=batch_small_files)
+                
+                def run_clean(job, cleaner=cleaner, metrics=metrics, clean_args=clean_args):
+                    path = clean_args['path']
+                    try:
+                        if clean_args['mode'] == 'file':
+                            success, result = cleaner.clean_file(path, job.update)
+                            outcome = {'mode': 'file', 'success': success, 'result': result}
+                        else:
+                            results = cleaner.clean_directory(path, job.update, max_workers=clean_args['max_workers'],
+                                                              incremental=clean_args['incremental'],
+                                                              batch=clean_args['batch'],
+                                                              cancel_event=job.cancel_event)
+                            outcome = {'mode': 'dir', 'results': results,
+                                       'file_stats': {item[0]: dict(cleaner.file_stats.get(item[0], {}))
+                                                      for item in results}}
+                            # 增量更新清洗结果的全文索引
+                            job.update(path, 100, '正在更新全文索引...')
+                            search_index = SearchIndex(path)
+                            try:
+                                outcome['index_stats'] = search_index.update_directory(path)
+                            finally:
+                                search_index.close()
+                    finally:
+                        if metrics:
+                            metrics.close()
+                    outcome['metrics_report'] = metrics.report() if metrics else None
+                    return outcome
+                
+                get_job_manager().submit('clean', f'清洗 {target_path}', run_clean)
+    
+    render_jobs('clean', render_clean_result)
+
+# 标签页3: 全文搜索
+with tab3:
+    st.title('清洗结果全文搜索')
+    
+    search_dir = st.text_input('清洗输出目录', value='./output', key='search_dir')
+    query = st.text_input('搜索内容', key='search_query', placeholder='输入关键词，多个关键词用空格分隔')
+    search_limit = st.slider('最多显示结果数', min_value=5, max_value=100, value=20, step=5, key='search_limit')
+    
+    if st.button('重建索引', key='search_reindex'):
+        if os.path.isdir(search_dir):
+            search_index = SearchIndex(search_dir)
+            try:
+                index_stats = search_index.update_directory(search_dir)
+            finally:
+                search_index.close()
+            st.success(f"索引更新完成：新增 {index_stats['added']} 个，更新 {index_stats['updated']} 个，"
+                       f"删除 {index_stats['removed']} 个，未变化 {index_stats['unchanged']} 个文件")
+        else:
+            st.warning(f'目录不存在: {search_dir}')
+    
+    if query:
+        if not os.path.isdir(search_dir):
+            st.warning(f'目录不存在: {search_dir}')
+        else:
+            search_index = SearchIndex(search_dir)
+            try:
+                if len(search_index) == 0:
+                    search_index.update_directory(search_dir)
+                hits = search_index.search(query, limit=search_limit)
+            finally:
+                search_index.close()
+            if not hits:
+                st.info('没有找到匹配的内容')
+            for hit in hits:
+                title = f"**{hit['key']}**" + (f" › {hit['heading']}" if hit['heading'] else '')
+                st.markdown(f"{title}\n\n{hit['snippet']}")
+
+# 有任务运行时定时刷新页面显示进度；任务在后台线程中执行，刷新或操作控件不会中断任务
+if get_job_manager().has_running():
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import CLEAN_MANIFEST_FILE
+
+
+def file_hash(file_path: str) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_snapshot(file_path: str) -> Dict[str, Any]:
+    """读取一次文件，返回同一个文件句柄的大小、修改时间和内容哈希
+
+    打开后先取文件状态再读取内容：读取期间文件被修改时记录的是旧的修改时间，下次比较时会重新计算哈希，
+    不会把新的修改时间和旧内容的哈希记在一起。
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+
+
+class CleanManifest:
+    """目录清洗记录，保存在目标目录中
+
+    每个源文件记录大小、修改时间、内容哈希、输出文件路径和清洗状态。
+    再次清洗同一目录时，内容未变化且已成功清洗的文件会被跳过，只重试失败和变化的文件。
+    """
+
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+    def __init__(self, dir_path: str, save_interval: int = 20):
+        """
+        Args:
+            dir_path: 清洗的目标目录
+            save_interval: 每记录多少个文件写一次磁盘
+        """
+        self.dir_path = dir_path
+        self.path = os.path.join(dir_path, CLEAN_MANIFEST_FILE)
+        self.save_interval = save_interval
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                # 记录文件损坏时重新清洗所有文件
+                self.entries = {}
+
+    def _key(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.dir_path).replace(os.sep, '/')
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(self._key(file_path))
+
+    def is_unchanged(self, file_path: str) -> bool:
+        """文件已成功清洗、输出文件仍存在且内容未变化时返回True"""
+        entry = self.get(file_path)
+        if not entry or entry.get('status') != self.SUCCESS:
+            return False
+        output = entry.get('output')
+        if not output or not os.path.exists(os.path.join(self.dir_path, output)):
+            return False
+
+        stat = os.stat(file_path)
+        if stat.st_size == entry.get('size') and stat.st_mtime == entry.get('mtime'):
+            return True
+        if stat.st_size != entry.get('size'):
+            return False
+
+        # 修改时间变化但大小相同时比较内容哈希（例如文件被重新写入了相同内容）
+        if file_hash(file_path) != entry.get('sha256'):
+            return False
+        with self._lock:
+            entry['mtime'] = stat.st_mtime
+        return True
+
+    def record(self, file_path: str, success: bool, result: str, snapshot: Optional[Dict[str, Any]] = None,
+               extra: Optional[Dict[str, Any]] = None):
+        """记录文件的清洗结果
+
+        Args:
+            file_path: 源文件路径
+            success: 是否清洗成功
+            result: 输出文件路径或错误信息
+            snapshot: 清洗开始前由file_snapshot取得的文件状态和哈希，清洗期间文件被修改时下次会重新清洗
+            extra: 需要一并记录的其他信息
+        """
+        entry = dict(snapshot or file_snapshot(file_path))
+        entry.update({
+            'status': self.SUCCESS if success else self.FAILED,
+            'cleaned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        if success:
+            entry['output'] = os.path.relpath(result, self.dir_path).replace(os.sep, '/')
+        else:
+            entry['error'] = result
+        if extra:
+            entry.update(extra)
+
+        with self._lock:
+            self.entries[self._key(file_path)] = entry
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_interval
+        if should_save:
+            self.save()
+
+    def save(self):
+        """原子地写入记录文件"""
+        with self._lock:
+            data = json.dumps({'version': 1, 'files': self.entries}, ensure_ascii=False, indent=1)
+            self._unsaved = 0
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
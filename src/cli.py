@@ -0,0 +1,258 @@
+"""命令行入口：不启动界面，直接爬取、清洗或边爬取边清洗，结果以JSON格式输出到标准输出
+
+进度信息输出到标准错误，标准输出只包含结果JSON，便于在cron、CI或脚本中处理。
+openai、bs4、html2text等依赖在子命令执行时才导入，解析参数和显示帮助不需要加载它们。
+
+用法:
+    python run.py crawl https://example.com/docs/ output/docs --concurrency 8
+    python run.py clean output/docs --workers 4 --api-key sk-...
+    python run.py pipeline https://example.com/docs/ output/docs --metrics output/docs/.metrics.jsonl
+
+退出码：0表示完成，1表示有文件清洗失败或命令出错（结果JSON中包含error），130表示被Ctrl+C取消（爬取状态和清洗记录会保留，
+再次运行相同的命令会继续处理）。
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import DEEPSEEK_API_KEY, DEEPSEEK_API_ENDPOINT, DEEPSEEK_MODEL
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_CANCELLED = 130
+
+
+def _progress(quiet: bool):
+    """进度回调：输出到标准错误，不影响标准输出中的JSON结果"""
+    if quiet:
+        return None
+
+    def callback(path, progress, message):
+        prefix = f"[{progress:>3}%]" if progress >= 0 else "[错误]"
+        print(f"{prefix} {message}", file=sys.stderr, flush=True)
+    return callback
+
+
+def _run_cancellable(target: Callable[[threading.Event], Any]) -> Tuple[Any, bool]:
+    """在工作线程中执行target，按Ctrl+C时设置取消标志并等待进行中的请求完成
+
+    Returns:
+        (target的返回值, 是否被取消)
+    """
+    cancel_event = threading.Event()
+    done = threading.Event()
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = target(cancel_event)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=run, name='cli-worker', daemon=True).start()
+    # Thread.join被KeyboardInterrupt打断后线程状态可能不正确，改为等待完成标志
+    while not done.is_set():
+        try:
+            done.wait(0.2)
+        except KeyboardInterrupt:
+            if cancel_event.is_set():
+                raise  # 再次按Ctrl+C时立即退出
+            print("正在取消，等待进行中的请求完成（再次按Ctrl+C立即退出）...", file=sys.stderr, flush=True)
+            cancel_event.set()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result'), cancel_event.is_set()
+
+
+def _clean_summary(results: List[Tuple[str, bool, str]]) -> Dict[str, Any]:
+    failed = [{'file': file, 'error': message} for file, success, message in results if not success]
+    return {
+        'files': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': failed,
+        'outputs': [message for _, success, message in results if success],
+    }
+
+
+def _create_metrics(args):
+    if not args.metrics:
+        return None
+    from metrics import Metrics
+    return Metrics(args.metrics)
+
+
+def _attach_metrics(result: Dict[str, Any], metrics) -> Dict[str, Any]:
+    """在结果中附加各阶段的耗时汇总并关闭事件文件"""
+    if metrics is not None:
+        result['metrics'] = metrics.summary()
+        metrics.close()
+    return result
+
+
+def _create_crawler(args, metrics):
+    from web_crawler import WebCrawler
+    return WebCrawler(include_patterns=args.include, exclude_patterns=args.exclude, metrics=metrics)
+
+
+def _crawl_kwargs(args) -> Dict[str, Any]:
+    return {
+        'concurrency': args.concurrency,
+        'process_workers': args.process_workers,
+        'dedup': not args.no_dedup,
+        'respect_robots': False if args.ignore_robots else None,
+        'use_sitemap': False if args.no_sitemap else None,
+        'delay': args.delay,
+    }
+
+
+def _create_cleaner(args, metrics):
+    from markdown_cleaner import MarkdownCleaner
+    return MarkdownCleaner(api_key=args.api_key, api_endpoint=args.api_endpoint, model=args.model,
+                           requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                           use_cache=False if args.no_cache else None, stream=args.stream, metrics=metrics)
+
+
+def cmd_crawl(args) -> Tuple[Dict[str, Any], int]:
+    metrics = _create_metrics(args)
+    crawler = _create_crawler(args, metrics)
+    try:
+        stats, cancelled = _run_cancellable(lambda cancel_event: crawler.crawl(
+            args.url, args.output, callback=_progress(args.quiet), cancel_event=cancel_event, **_crawl_kwargs(args)))
+    finally:
+        crawler.close()
+    return _attach_metrics({'crawl': stats}, metrics), EXIT_CANCELLED if cancelled else EXIT_OK
+
+
+def cmd_clean(args) -> Tuple[Dict[str, Any], int]:
+    metrics = _create_metrics(args)
+    cleaner = _create_cleaner(args, metrics)
+    callback = _progress(args.quiet)
+    if os.path.isfile(args.path):
+        success, message = cleaner.clean_file(args.path, callback)
+        results, cancelled = [(args.path, success, message)], False
+    else:
+        results, cancelled = _run_cancellable(lambda cancel_event: cleaner.clean_directory(
+            args.path, callback, max_workers=args.workers, incremental=not args.full, batch=args.batch,
+            dedup=not args.no_dedup, cancel_event=cancel_event))
+    summary = _clean_summary(results)
+    if cancelled:
+        code = EXIT_CANCELLED
+    else:
+        code = EXIT_FAILED if summary['failed'] else EXIT_OK
+    return _attach_metrics({'clean': summary}, metrics), code
+
+
+def cmd_pipeline(args) -> Tuple[Dict[str, Any], int]:
+    from pipeline import run_pipeline
+
+    metrics = _create_metrics(args)
+    crawler = _create_crawler(args, metrics)
+    cleaner = _create_cleaner(args, metrics)
+    try:
+        summary, cancelled = _run_cancellable(lambda cancel_event: run_pipeline(
+            crawler, cleaner, args.url, args.output, callback=_progress(args.quiet), clean_workers=args.workers,
+            incremental=not args.full, cancel_event=cancel_event, **_crawl_kwargs(args)))
+    finally:
+        crawler.close()
+    result = dict(summary, clean=_clean_summary(summary['clean']))
+    if cancelled:
+        code = EXIT_CANCELLED
+    else:
+        code = EXIT_FAILED if result['clean']['failed'] else EXIT_OK
+    return _attach_metrics({'pipeline': result}, metrics), code
+
+
+def _add_crawl_arguments(parser):
+    group = parser.add_argument_group('爬取')
+    group.add_argument('url', help='起始URL')
+    group.add_argument('output', help='Markdown文件保存目录，爬取状态也保存在该目录中')
+    group.add_argument('--concurrency', type=int, default=1, help='同时抓取的页面数（默认1）')
+    group.add_argument('--process-workers', type=int, default=0, help='转换Markdown的子进程数（默认0，不使用子进程）')
+    group.add_argument('--include', action='append', metavar='REGEX', help='只爬取匹配的URL，可重复指定')
+    group.add_argument('--exclude', action='append', metavar='REGEX', help='不爬取匹配的URL，可重复指定')
+    group.add_argument('--delay', type=float, help='同一主机两次请求之间的最小间隔(秒)')
+    group.add_argument('--ignore-robots', action='store_true', help='不遵守robots.txt')
+    group.add_argument('--no-sitemap', action='store_true', help='不读取sitemap')
+
+
+def _add_clean_arguments(parser, pipeline=False):
+    group = parser.add_argument_group('清洗')
+    if not pipeline:
+        group.add_argument('path', help='要清洗的Markdown文件或目录')
+    group.add_argument('--api-key', default=os.environ.get('DEEPSEEK_API_KEY', DEEPSEEK_API_KEY),
+                       help='API密钥，默认读取环境变量DEEPSEEK_API_KEY，其次使用配置文件中的值')
+    group.add_argument('--api-endpoint', default=DEEPSEEK_API_ENDPOINT, help=f'API端点（默认{DEEPSEEK_API_ENDPOINT}）')
+    group.add_argument('--model', default=DEEPSEEK_MODEL, help=f'模型名称（默认{DEEPSEEK_MODEL}）')
+    group.add_argument('--workers', type=int, default=None if pipeline else 1,
+                       help='同时清洗的文件数' + ('（默认使用配置文件中的值）' if pipeline else '（默认1）'))
+    group.add_argument('--rpm', type=int, help='每分钟最大请求数')
+    group.add_argument('--tpm', type=int, help='每分钟最大令牌数')
+    group.add_argument('--full', action='store_true', help='重新清洗所有文件，不跳过未变化的文件')
+    group.add_argument('--stream', action='store_true', help='使用流式响应')
+    group.add_argument('--no-cache', action='store_true', help='不使用本地结果缓存')
+    if not pipeline:
+        group.add_argument('--batch', action='store_true', help='将多个小文件合并到一个API请求中清洗')
+
+
+def _add_common_arguments(parser):
+    parser.add_argument('--no-dedup', action='store_true', help='不跳过内容重复或近似的页面和文件')
+    parser.add_argument('--metrics', metavar='FILE', help='将各阶段的耗时事件写入该JSONL文件，并在结果中附加汇总')
+    parser.add_argument('--quiet', action='store_true', help='不输出进度信息')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='run.py', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', metavar='{crawl,clean,pipeline}')
+    subparsers.required = True
+
+    crawl = subparsers.add_parser('crawl', help='爬取网站并保存为Markdown文件')
+    _add_crawl_arguments(crawl)
+    _add_common_arguments(crawl)
+    crawl.set_defaults(handler=cmd_crawl)
+
+    clean = subparsers.add_parser('clean', help='使用API清洗Markdown文件或目录')
+    _add_clean_arguments(clean)
+    _add_common_arguments(clean)
+    clean.set_defaults(handler=cmd_clean)
+
+    pipeline = subparsers.add_parser('pipeline', help='边爬取边清洗')
+    _add_crawl_arguments(pipeline)
+    _add_clean_arguments(pipeline, pipeline=True)
+    _add_common_arguments(pipeline)
+    pipeline.set_defaults(handler=cmd_pipeline)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """执行子命令，将结果JSON写入标准输出
+
+    Returns:
+        退出码
+    """
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    try:
+        # 爬虫等模块直接print的日志转到标准错误，保证标准输出只有结果JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            result, code = args.handler(args)
+    except Exception as e:
+        result, code = {'error': f"{type(e).__name__}: {str(e)}"}, EXIT_FAILED
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['cancelled'] = code == EXIT_CANCELLED
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2, default=str)
+    sys.stdout.write('\n')
+    sys.stdout.flush()
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
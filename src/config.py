@@ -1,3 +1,5 @@
+import os
+
 # DeepSeek API 配置
 DEEPSEEK_API_KEY = "your API key"  # 替换为你的API密钥
 DEEPSEEK_API_ENDPOINT = "https://api.deepseek.com"  # API端点
@@ -6,4 +8,83 @@ DEEPSEEK_MODEL = "deepseek-chat"  # 模型名称
 # 清洗配置
 MAX_RETRIES = 3  # 最大重试次数
 TIMEOUT = 120  # API请求超时时间(秒)
-CLEANED_FILE_PREFIX = "Cleandone-"  # 清洗后文件名前缀 
\ No newline at end of file
+CLEANED_FILE_PREFIX = "Cleandone-"  # 清洗后文件名前缀 
+
+# 爬虫配置
+CRAWL_MAX_DEPTH = 5  # 最大爬取深度
+CRAWL_PER_HOST_LIMIT = 4  # 并发模式下每个主机的最大同时连接数
+CRAWL_STATE_FILE = ".crawl_state.sqlite"  # 保存在输出目录中的爬取状态文件，用于断点续爬
+CRAWL_POOL_SIZE = 10  # HTTP连接池大小（每个主机保持的长连接数）
+CRAWL_CONNECT_TIMEOUT = 10  # 建立连接超时时间(秒)
+CRAWL_READ_TIMEOUT = 30  # 读取响应超时时间(秒)
+
+# 并发清洗配置
+CLEAN_MAX_WORKERS = 4  # 目录并发清洗时的默认线程数
+REQUESTS_PER_MINUTE = None  # 每分钟最大请求数，None表示不限制
+TOKENS_PER_MINUTE = None  # 每分钟最大令牌数（输入+输出），None表示不限制
+CHUNK_MAX_TOKENS = 3000  # 长文档分块时每块的最大输入令牌数，需保证清洗结果不超过输出上限
+CHUNK_MAX_WORKERS = 4  # 同一文件的分块并发清洗线程数
+
+# 清洗结果缓存配置
+CACHE_ENABLED = True  # 是否缓存API清洗结果
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".md_knowledge_cache", "clean_cache.sqlite")  # 缓存文件路径
+CACHE_MAX_BYTES = 500 * 1024 * 1024  # 缓存大小上限，超出后按最近最少使用淘汰
+CLEAN_MANIFEST_FILE = ".clean_manifest.json"  # 目录清洗记录文件，用于跳过未变化的文件
+
+# 预清洗配置
+BOILERPLATE_MIN_DOCUMENTS = 3  # 至少在多少个文档中重复出现的行才可能被视为模板内容
+BOILERPLATE_MIN_RATIO = 0.5  # 出现在超过该比例文档中的行视为导航、页脚等模板内容
+MAX_CONTINUATIONS = 3  # 输出达到max_tokens被截断时最多自动续写的次数
+
+# 小文件批量清洗配置
+BATCH_SMALL_FILE_TOKENS = 800  # 令牌数不超过该值的文件参与批量清洗
+BATCH_MAX_TOKENS = 3000  # 每个批量请求的最大输入令牌数，需保证清洗结果不超过输出上限
+BATCH_MAX_FILES = 20  # 每个批量请求最多包含的文件数
+
+# 自适应重试和并发配置
+RATE_LIMIT_MAX_RETRIES = 8  # 429限流错误的最大重试次数（与其他错误分开计数）
+RETRY_BACKOFF_BASE = 1.0  # 没有Retry-After时的退避基数(秒)，实际等待为0到基数*2^重试次数之间的随机值
+RETRY_BACKOFF_MAX = 60.0  # 单次退避等待的上限(秒)
+ADAPTIVE_INITIAL_CONCURRENCY = 8  # 所有线程共享的初始API并发数
+ADAPTIVE_MAX_CONCURRENCY = 32  # 自适应调整时API并发数的上限
+
+# 爬取清洗流水线配置
+PIPELINE_QUEUE_SIZE = 32  # 等待清洗的页面队列长度上限，队列已满时爬取暂停
+PIPELINE_CLEAN_WORKERS = 4  # 流水线中的清洗线程数
+
+# 去重配置
+DEDUP_MAX_DISTANCE = 3  # SimHash指纹汉明距离不超过该值的页面视为近似重复，0表示只跳过完全相同的页面
+CRAWL_DEDUP_MAX_DISTANCE = 0  # 爬取时的近似重复距离，默认只跳过完全相同的页面；爬虫比较的是包含导航和页脚的原始内容，共享大段导航的不同页面指纹几乎相同
+
+# 爬取内容过滤配置
+CRAWL_SKIP_EXTENSIONS = (  # 不会被爬取的URL扩展名
+    '.pdf', '.zip', '.gz', '.tgz', '.tar', '.rar', '.7z', '.bz2', '.xz', '.exe', '.msi', '.dmg', '.iso', '.apk', '.bin',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico', '.bmp', '.tif', '.tiff',
+    '.mp3', '.mp4', '.m4a', '.avi', '.mov', '.mkv', '.webm', '.wav', '.flac', '.ogg',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot', '.css', '.js', '.json', '.xml', '.rss', '.atom',
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.csv',
+)
+CRAWL_HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')  # 允许转换的响应类型，没有Content-Type时按HTML处理
+CRAWL_MAX_PAGE_BYTES = 5 * 1024 * 1024  # 单个页面的最大字节数，超过时停止下载并跳过
+
+# 爬取礼貌性配置
+CRAWL_RESPECT_ROBOTS = True  # 是否遵守robots.txt的Disallow规则和Crawl-delay
+CRAWL_USE_SITEMAP = True  # 是否从sitemap.xml读取页面URL作为种子
+CRAWL_SITEMAP_MAX_URLS = 50000  # 从sitemap读取的最大URL数
+CRAWL_SITEMAP_MAX_BYTES = 50 * 1024 * 1024  # 单个sitemap（gzip解压后）的最大字节数，超过时忽略该sitemap
+CRAWL_ROBOTS_MAX_BYTES = 512 * 1024  # robots.txt的最大读取字节数，超出部分忽略
+CRAWL_DEFAULT_DELAY = 0.0  # robots.txt没有要求时，同一主机两次请求之间的最小间隔(秒)
+
+# 语料库配置
+CORPUS_COMMIT_INTERVAL = 100  # 语料库每累计多少次写入提交一次事务
+
+# 全文索引配置
+SEARCH_INDEX_FILE = ".search_index.sqlite"  # 保存在清洗输出目录中的全文索引文件名
+SEARCH_MMAP_BYTES = 256 * 1024 * 1024  # 读取索引时内存映射的最大字节数
+
+# 性能统计配置
+METRICS_FILE = ".metrics.jsonl"  # 启用性能统计时保存在输出目录中的事件文件（每行一个JSON事件）
+
+# 后台任务配置
+JOBS_MAX_HISTORY = 20  # 界面中保留的已结束任务数
+JOBS_LOG_LINES = 200  # 每个任务保留的最近进度消息数
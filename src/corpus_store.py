@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import CORPUS_COMMIT_INTERVAL
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CorpusStore:
+    """以规范化URL为键的SQLite语料库，替代每个页面一个Markdown文件的输出方式
+
+    每个页面保存Markdown内容、抓取校验信息和内容哈希，清洗结果写回同一条记录。
+    写入按commit_interval批量提交，读取可按URL随机访问。多个线程可以共享同一个实例。
+    """
+
+    def __init__(self, path: str, commit_interval: Optional[int] = None):
+        """
+        Args:
+            path: 数据库文件路径，所在目录不存在时自动创建
+            commit_interval: 每累计多少次写入提交一次事务，默认使用配置文件中的值
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.commit_interval = commit_interval or CORPUS_COMMIT_INTERVAL
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, markdown TEXT NOT NULL, markdown_hash TEXT NOT NULL, "
+            "content_hash TEXT, etag TEXT, last_modified TEXT, fetched_at REAL, "
+            "cleaned TEXT, cleaned_from TEXT, cleaned_at REAL, clean_error TEXT, clean_stats TEXT)"
+        )
+        self.conn.commit()
+
+    def put_page(self, url: str, markdown: str, info: Optional[Dict[str, Any]] = None):
+        """保存抓取到的页面，已有的清洗结果保留，但内容变化后会被视为需要重新清洗"""
+        info = info or {}
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO pages (url, markdown, markdown_hash, content_hash, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET markdown = excluded.markdown, markdown_hash = excluded.markdown_hash, "
+                "content_hash = excluded.content_hash, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, fetched_at = excluded.fetched_at",
+                (url, markdown, text_hash(markdown), info.get('content_hash'), info.get('etag'),
+                 info.get('last_modified'), time.time())
+            )
+            self._after_write()
+
+    def put_cleaned(self, url: str, cleaned: str, source_hash: str, stats: Optional[Dict[str, Any]] = None):
+        """保存清洗结果
+
+        Args:
+            source_hash: 清洗所用Markdown内容的哈希，清洗期间页面被重新抓取时结果会被视为过期
+            stats: 清洗统计，例如预清洗删除的令牌数和续写次数
+        """
+        with self._lock:
+            self.conn.execute(
+                "UPDATE pages SET cleaned = ?, cleaned_from = ?, cleaned_at = ?, clean_error = NULL, clean_stats = ? "
+                "WHERE url = ?",
+                (cleaned, source_hash, time.time(), json.dumps(stats or {}), url)
+            )
+            self._after_write()
+
+    def put_clean_error(self, url: str, error: str):
+        with self._lock:
+            self.conn.execute("UPDATE pages SET clean_error = ? WHERE url = ?", (error, url))
+            self._after_write()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """按URL读取页面记录，不存在时返回None"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT url, markdown, markdown_hash, content_hash, etag, last_modified, fetched_at, "
+                "cleaned, cleaned_from, cleaned_at, clean_error, clean_stats FROM pages WHERE url = ?", (url,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            record = dict(zip([column[0] for column in cursor.description], row))
+        record['clean_stats'] = json.loads(record['clean_stats']) if record['clean_stats'] else {}
+        return record
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def urls(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT url FROM pages ORDER BY url")]
+
+    def pending_clean(self) -> List[str]:
+        """内容还没有清洗结果，或清洗后又发生变化的页面URL"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT url FROM pages WHERE cleaned_from IS NULL OR cleaned_from != markdown_hash ORDER BY url")]
+
+    def url_is_cleaned(self, url: str) -> bool:
+        """页面已有清洗结果且清洗后内容没有变化时返回True"""
+        with self._lock:
+            row = self.conn.execute("SELECT cleaned_from = markdown_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return bool(row and row[0])
+
+    def iter_markdown(self, batch_size: int = 500) -> Iterator[Tuple[str, str]]:
+        """按URL顺序分批读取(url, markdown)，不会一次把整个语料库读入内存"""
+        last_url = ''
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT url, markdown FROM pages WHERE url > ? ORDER BY url LIMIT ?", (last_url, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_url = rows[-1][0]
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+            self._pending_writes = 0
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def _after_write(self):
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_interval:
+            self.conn.commit()
+            self._pending_writes = 0
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+from collections import deque
+
+from config import CRAWL_STATE_FILE
+
+
+class CrawlFrontier:
+    """持久化到输出目录的待爬URL队列
+
+    待爬队列和已访问集合保存在SQLite文件中，爬虫中断后重新调用crawl会从
+    保存的状态继续，而不是重新抓取所有页面。内存中保留一份队列副本用于调度，
+    数据库只做顺序追加和状态更新。
+
+    同一文件中还保存每个页面的校验信息（ETag、Last-Modified、内容哈希、
+    输出文件和页面链接），在多次爬取之间保留，用于增量重爬。
+    """
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, save_path, commit_interval=50):
+        """打开（或创建）输出目录中的状态文件
+
+        Args:
+            save_path: 爬虫输出目录
+            commit_interval: 每累计多少次写入提交一次事务
+        """
+        self.path = os.path.join(save_path, CRAWL_STATE_FILE)
+        self.commit_interval = commit_interval
+        self._pending_writes = 0
+        self._queue = deque()
+        self._known = set()
+        self.visited = set()
+        self.resumed = False
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE NOT NULL, "
+            "depth INTEGER NOT NULL, status TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT, "
+            "file_path TEXT, links TEXT, simhash TEXT)"
+        )
+        # 旧版本的状态文件没有simhash列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        if 'simhash' not in columns:
+            self.conn.execute("ALTER TABLE pages ADD COLUMN simhash TEXT")
+        self.conn.commit()
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def begin(self, start_url):
+        """开始一次爬取：同一起始URL的未完成爬取会被恢复，否则重新开始
+
+        Returns:
+            是否从保存的状态恢复
+        """
+        unfinished = (self._get_meta('start_url') == start_url and self._get_meta('finished') == '0')
+        if unfinished:
+            # 上次失败的页面在续爬时重试
+            self.conn.execute("UPDATE frontier SET status = ? WHERE status = ?", (self.PENDING, self.FAILED))
+            for url, depth, status in self.conn.execute("SELECT url, depth, status FROM frontier ORDER BY seq"):
+                self._known.add(url)
+                if status == self.DONE:
+                    self.visited.add(url)
+                else:
+                    self._queue.append((url, depth))
+            self.resumed = True
+
+        if not self.resumed:
+            self.conn.execute("DELETE FROM frontier")
+            self._known.clear()
+            self.visited.clear()
+            self._queue.clear()
+            self._set_meta('start_url', start_url)
+            self._set_meta('finished', '0')
+            self.push(start_url, 0)
+        self.conn.commit()
+        return self.resumed
+
+    def push(self, url, depth):
+        """将URL加入待爬队列，已经入队过的URL会被忽略
+
+        Returns:
+            是否为新加入的URL
+        """
+        if url in self._known:
+            return False
+        self._known.add(url)
+        self._queue.append((url, depth))
+        self.conn.execute("INSERT OR IGNORE INTO frontier (url, depth, status) VALUES (?, ?, ?)",
+                          (url, depth, self.PENDING))
+        self._after_write()
+        return True
+
+    def pop(self):
+        """取出下一个待爬URL，返回(url, depth)；数据库中的状态在完成前保持pending"""
+        return self._queue.popleft()
+
+    def requeue(self, items):
+        """将暂时无法调度的URL按原顺序放回队首"""
+        self._queue.extendleft(reversed(items))
+
+    def mark_done(self, url):
+        self.visited.add(url)
+        self.conn.execute("UPDATE frontier SET status = ? WHERE url = ?", (self.DONE, url))
+        self._after_write()
+
+    def mark_failed(self, url):
+        self.conn.execute("UPDATE frontier SET status = ? WHERE url = ?", (self.FAILED, url))
+        self._after_write()
+
+    def page_info(self, url):
+        """返回上次爬取时保存的页面校验信息，没有记录时返回None"""
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash, file_path, links, simhash FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, file_path, links, simhash = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_hash': content_hash,
+            'file_path': file_path,
+            'links': json.loads(links) if links else [],
+            'simhash': int(simhash, 16) if simhash else None,
+        }
+
+    def record_page(self, url, info):
+        """保存页面校验信息，info的键与page_info返回值相同"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, file_path, links, simhash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, info.get('etag'), info.get('last_modified'), info.get('content_hash'),
+             info.get('file_path'), json.dumps(sorted(info.get('links') or [])),
+             format(info['simhash'], 'x') if info.get('simhash') is not None else None)
+        )
+        self._after_write()
+
+    def fingerprints(self):
+        """返回已保存页面的(url, 内容哈希, SimHash指纹)，用于跨次爬取的去重"""
+        return [(url, content_hash, int(simhash, 16) if simhash else None)
+                for url, content_hash, simhash in self.conn.execute(
+                    "SELECT url, content_hash, simhash FROM pages WHERE file_path IS NOT NULL")]
+
+    def finish(self):
+        """标记本次爬取已完成，下一次crawl将重新开始"""
+        self._set_meta('finished', '1')
+        self.conn.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def _after_write(self):
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_interval:
+            self.conn.commit()
+            self._pending_writes = 0
+
+    def __len__(self):
+        return len(self._queue)
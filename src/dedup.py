@@ -0,0 +1,150 @@
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import DEDUP_MAX_DISTANCE
+from text_utils import CJK_PATTERN
+
+# 广告和统计平台的跟踪参数，不影响页面内容；ref、from、source等通用名称在很多网站上
+# 表示分支、分页等实际参数，不能去掉
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'twclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'ref_src', 'spm',
+}
+TRACKING_PREFIXES = ('utm_', 'hmsr', 'hmpl', 'hmcu', 'hmkw', 'hmci')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+FINGERPRINT_BITS = 64
+
+
+def canonicalize_url(url: str) -> str:
+    """规范化URL，使指向同一页面的不同写法得到相同结果
+
+    协议和主机名转为小写，去掉默认端口、片段（#...）和跟踪参数，其余查询参数按名称排序，
+    合并路径中重复的斜杠。末尾斜杠保留：/docs/ 和 /docs 中的相对链接解析结果不同，
+    而且不能确定服务器把它们当作同一个页面。
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        host = f"{parts.username}{':' + parts.password if parts.password else ''}@{host}"
+
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ''))
+
+
+def _features(text: str) -> List[str]:
+    """提取用于SimHash的特征：英文等按3个连续单词，中日韩文字按2个连续字符"""
+    words = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        if CJK_PATTERN.search(word):
+            words.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+        else:
+            words.append(word)
+    if len(words) < 3:
+        return words
+    return [' '.join(words[i:i + 3]) for i in range(len(words) - 2)]
+
+
+def simhash(text: str) -> int:
+    """计算文本的64位SimHash指纹，内容相近的文本指纹的汉明距离也小"""
+    weights = [0] * FINGERPRINT_BITS
+    for feature in _features(text):
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(FINGERPRINT_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def content_hash(text: str) -> str:
+    """忽略空白差异的内容哈希"""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+class DuplicateIndex:
+    """线程安全的重复内容索引：内容哈希判断完全重复，SimHash判断近似重复
+
+    64位指纹分成max_distance+1段，汉明距离不超过max_distance的两个指纹至少有一段完全相同，
+    因此只需比较某一段相同的候选指纹，不必逐个比较。
+    """
+
+    def __init__(self, max_distance: Optional[int] = None):
+        """
+        Args:
+            max_distance: 判定为近似重复的最大汉明距离，0表示只检测完全重复，默认使用配置文件中的值
+        """
+        self.max_distance = DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self._exact: Dict[str, str] = {}
+        bands = self.max_distance + 1
+        self._band_width = -(-FINGERPRINT_BITS // bands)
+        self._bands: List[Dict[int, List[Tuple[int, str]]]] = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def _band_keys(self, fingerprint: int):
+        mask = (1 << self._band_width) - 1
+        return [(fingerprint >> (i * self._band_width)) & mask for i in range(len(self._bands))]
+
+    def find_exact(self, digest: str, key: Optional[str] = None) -> Optional[str]:
+        """返回内容哈希相同的其他条目，没有时返回None"""
+        with self._lock:
+            found = self._exact.get(digest)
+        return found if found != key else None
+
+    def find_near(self, fingerprint: int, key: Optional[str] = None) -> Optional[str]:
+        """返回指纹距离不超过max_distance的其他条目，没有时返回None"""
+        if not self.max_distance:
+            return None
+        with self._lock:
+            return self._find_near(fingerprint, key)
+
+    def _find_near(self, fingerprint, key):
+        for band, band_key in zip(self._bands, self._band_keys(fingerprint)):
+            for other, other_key in band.get(band_key, ()):
+                if other_key != key and hamming_distance(fingerprint, other) <= self.max_distance:
+                    return other_key
+        return None
+
+    def add(self, key: str, digest: Optional[str] = None, fingerprint: Optional[int] = None):
+        with self._lock:
+            self._add(key, digest, fingerprint)
+
+    def _add(self, key, digest, fingerprint):
+        if digest:
+            self._exact.setdefault(digest, key)
+        if fingerprint is not None and self.max_distance:
+            for band, band_key in zip(self._bands, self._band_keys(fingerprint)):
+                band.setdefault(band_key, []).append((fingerprint, key))
+
+    def check_and_add(self, key: str, digest: Optional[str], fingerprint: Optional[int] = None) -> Optional[str]:
+        """检查内容是否与已有条目完全重复或近似重复，不重复时加入索引
+
+        检查和加入在同一次加锁中完成，并发调用时两个相同的页面只有一个会被保留。
+
+        Returns:
+            重复时返回已有条目的键，否则返回None
+        """
+        with self._lock:
+            found = self._exact.get(digest) if digest else None
+            if (found is None or found == key) and fingerprint is not None and self.max_distance:
+                found = self._find_near(fingerprint, key)
+            if found is not None and found != key:
+                return found
+            self._add(key, digest, fingerprint)
+        return None
+
+    def check_text(self, key: str, text: str) -> Optional[str]:
+        """按文本内容调用check_and_add"""
+        return self.check_and_add(key, content_hash(text), simhash(text) if self.max_distance else None)
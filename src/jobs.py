@@ -0,0 +1,155 @@
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from config import JOBS_LOG_LINES, JOBS_MAX_HISTORY
+
+# 任务状态
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Job:
+    """后台任务的状态，由工作线程更新，界面线程读取
+
+    update的参数与爬虫和清洗器的进度回调相同，可以直接作为callback传入；
+    cancel_event可以作为cancel_event参数传给WebCrawler.crawl和MarkdownCleaner.clean_directory。
+    """
+
+    def __init__(self, job_id: int, kind: str, title: str):
+        self.id = job_id
+        self.kind = kind
+        self.title = title
+        self.status = RUNNING
+        self.progress = 0
+        self.message = ''
+        self.log = deque(maxlen=JOBS_LOG_LINES)
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, path: str, progress: int, message: str):
+        """进度回调：progress为-1表示出错，只记录消息，不改变进度"""
+        with self._lock:
+            if progress >= 0:
+                self.progress = progress
+            self.message = message
+            self.log.append(message)
+
+    def cancel(self):
+        self.cancel_event.set()
+        with self._lock:
+            if self.status == RUNNING:
+                self.message = '正在取消，等待进行中的请求完成...'
+
+    @property
+    def running(self) -> bool:
+        return self.status == RUNNING
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前状态的副本，避免界面读取时工作线程正在修改"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'title': self.title,
+                'status': self.status,
+                'progress': self.progress,
+                'message': self.message,
+                'log': list(self.log),
+                'result': self.result,
+                'error': self.error,
+                'cancel_requested': self.cancel_event.is_set(),
+                'elapsed': (self.finished_at or time.time()) - self.started_at,
+            }
+
+    def _finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            if status == DONE:
+                self.progress = 100
+
+
+class JobManager:
+    """在后台线程中运行爬取和清洗任务
+
+    任务与Streamlit脚本的运行相互独立：界面重新运行或切换控件时任务继续执行，
+    界面每次运行时读取任务状态显示进度。通过st.cache_resource在所有会话间共享同一个实例。
+    """
+
+    def __init__(self, max_history: Optional[int] = None):
+        """
+        Args:
+            max_history: 保留的已结束任务数，超过时删除最早结束的任务，默认使用配置文件中的值
+        """
+        self.max_history = max_history or JOBS_MAX_HISTORY
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, title: str, target: Callable[[Job], Any]) -> Job:
+        """启动任务
+
+        Args:
+            kind: 任务类型，例如crawl、clean，用于在不同标签页中分别显示
+            title: 显示的任务名称
+            target: 在工作线程中执行的函数，接收Job参数，返回值保存为任务结果
+
+        Returns:
+            新建的任务
+        """
+        with self._lock:
+            job = Job(next(self._ids), kind, title)
+            self._jobs[job.id] = job
+            self._prune()
+
+        def run():
+            try:
+                result = target(job)
+            except Exception as e:
+                job.update(title, -1, f"任务失败: {str(e)}")
+                job._finish(FAILED, error=str(e))
+                return
+            job._finish(CANCELLED if job.cancel_event.is_set() else DONE, result)
+
+        threading.Thread(target=run, name=f"job-{job.id}-{kind}", daemon=True).start()
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, kind: Optional[str] = None) -> List[Job]:
+        """返回任务列表，最新的任务在前"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if kind is None or job.kind == kind]
+
+    def cancel(self, job_id: int):
+        job = self.get(job_id)
+        if job:
+            job.cancel()
+
+    def has_running(self, kind: Optional[str] = None) -> bool:
+        return any(job.running for job in self.jobs(kind))
+
+    def clear_finished(self, kind: Optional[str] = None):
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if not job.running and (kind is None or job.kind == kind):
+                    del self._jobs[job_id]
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if not job.running), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job.id]
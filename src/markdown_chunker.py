@@ -0,0 +1,112 @@
+import re
+from typing import List
+
+from text_utils import estimate_tokens
+
+HEADING_PATTERN = re.compile(r'^ {0,3}#{1,6}(\s|$)')
+FENCE_PATTERN = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+
+def split_blocks(text: str) -> List[str]:
+    """将Markdown拆分为块：标题行、段落和完整的代码块
+
+    块之间以空行或标题分隔，代码块内部的空行和#开头的行不会被当作分隔。
+    每个块保留原始文本（包括末尾的空行），所以按顺序拼接所有块即可还原原文。
+    """
+    blocks = []
+    current = []
+    fence = None
+
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip('\r\n')
+        if fence is not None:
+            current.append(line)
+            if stripped.strip().startswith(fence):
+                fence = None
+            continue
+
+        fence_match = FENCE_PATTERN.match(stripped)
+        if fence_match:
+            fence = fence_match.group(1)[0] * len(fence_match.group(1))
+            current.append(line)
+            continue
+
+        if HEADING_PATTERN.match(stripped) and any(l.strip() for l in current):
+            blocks.append(''.join(current))
+            current = []
+        current.append(line)
+        if not stripped.strip() and any(l.strip() for l in current):
+            blocks.append(''.join(current))
+            current = []
+
+    if current:
+        blocks.append(''.join(current))
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int) -> List[str]:
+    """拆分超过预算的普通段落：先按行，单行仍然过长时按字符"""
+    if FENCE_PATTERN.match(block.lstrip('\n')):
+        return [block]  # 代码块不拆分
+
+    pieces = []
+    current = ''
+    for line in block.splitlines(keepends=True):
+        while estimate_tokens(line) > max_tokens:
+            # 按最坏情况（全部为中文）估算可容纳的字符数
+            size = max(1, int(max_tokens / 0.6))
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:size])
+            line = line[size:]
+        if current and estimate_tokens(current + line) > max_tokens:
+            pieces.append(current)
+            current = ''
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_markdown(text: str, max_tokens: int) -> List[str]:
+    """按标题和段落边界将Markdown切分为不超过max_tokens的片段
+
+    优先在标题处切分，使同一章节尽量留在同一片段中；不会在代码块内部切分，
+    因此单个超长代码块会单独成为一个超过预算的片段。按顺序拼接所有片段即可还原原文。
+
+    Args:
+        text: Markdown文本
+        max_tokens: 每个片段的最大估算令牌数
+
+    Returns:
+        片段列表，文本不超过预算时只有一个片段
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks = []
+    current = ''
+    current_tokens = 0
+    for block in split_blocks(text):
+        block_tokens = estimate_tokens(block)
+        if block_tokens > max_tokens:
+            pieces = _split_oversized(block, max_tokens)
+        else:
+            pieces = [block]
+
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            starts_section = bool(HEADING_PATTERN.match(piece))
+            # 超出预算时切分；新章节开始且当前片段已过半时也提前切分，保持章节完整
+            if current and (current_tokens + piece_tokens > max_tokens or
+                            (starts_section and current_tokens > max_tokens // 2)):
+                chunks.append(current)
+                current = ''
+                current_tokens = 0
+            current += piece
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append(current)
+    return chunks
@@ -1,8 +1,23 @@
+import copy
 import os
+import queue
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Tuple, Dict, Any, Optional
-from openai import OpenAI
+from openai import (
+    OpenAI,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AuthenticationError,
+    NotFoundError,
+    PermissionDeniedError,
+    RateLimitError
+)
 
 from config import (
     DEEPSEEK_API_KEY,
@@ -10,23 +25,103 @@ from config import (
     DEEPSEEK_MODEL,
     MAX_RETRIES,
     TIMEOUT,
-    CLEANED_FILE_PREFIX
+    CLEANED_FILE_PREFIX,
+    REQUESTS_PER_MINUTE,
+    TOKENS_PER_MINUTE,
+    CHUNK_MAX_TOKENS,
+    CHUNK_MAX_WORKERS,
+    CACHE_ENABLED,
+    CACHE_PATH,
+    CACHE_MAX_BYTES,
+    MAX_CONTINUATIONS,
+    BATCH_SMALL_FILE_TOKENS,
+    BATCH_MAX_TOKENS,
+    BATCH_MAX_FILES,
+    RATE_LIMIT_MAX_RETRIES,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    ADAPTIVE_INITIAL_CONCURRENCY,
+    ADAPTIVE_MAX_CONCURRENCY
 )
+from clean_manifest import CleanManifest, file_snapshot
+from corpus_store import CorpusStore
+from dedup import DuplicateIndex
+from markdown_chunker import split_markdown
+from metrics import Metrics
+from pre_cleaner import BoilerplateFilter
+from rate_limiter import AdaptiveConcurrency, RateLimiter, parse_retry_after
+from result_cache import ResultCache
+from streaming_output import StreamingOutput, StreamPart
+from text_utils import estimate_tokens
+
+SYSTEM_PROMPT = """你是一个专业的Markdown文档清洗专家。你的任务是清洗网页抓取的Markdown文件，使其更适合向量模型分析和存储。
+请遵循以下清洗原则：
+1. 删除无用的页面标题、菜单信息、页脚信息、广告等干扰内容
+2. 完整保留文档中的重要观点、核心文本、代码块、索引、网址和图片链接
+3. 可以对语义进行适当重组和简化，但必须保持原意精准
+4. 保持Markdown格式的完整性和一致性
+5. 返回的内容必须是完整的Markdown文本，不要添加任何评论或解释"""
+
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+6. 输入包含多个相互独立的文档，每个文档以 <<<FILE 编号>>> 行开始、以 <<<END FILE 编号>>> 行结束。请分别清洗每个文档，并用完全相同的两行分隔符包裹每个文档的清洗结果，编号和顺序保持不变"""
+
+BATCH_OUTPUT_PATTERN = re.compile(r'<<<FILE (\d+)>>>[ \t]*\n(.*?)\n?<<<END FILE \1>>>', re.DOTALL)
+
+# 爬虫输出文件第一行的页面URL标题，各页面都不同，判断重复内容时忽略
+URL_HEADER_PATTERN = re.compile(r'\A# https?://\S+\s*\n')
+
+CONTINUE_PROMPT = "输出被截断了，请从上次中断的地方继续输出，不要重复已输出的内容，也不要添加任何说明。"
+
 
 class MarkdownCleaner:
     """使用Deepseek API清洗Markdown文件的处理器"""
     
-    def __init__(self, api_key: Optional[str] = None, api_endpoint: Optional[str] = None, model: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, api_endpoint: Optional[str] = None, model: Optional[str] = None,
+                 requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 use_cache: Optional[bool] = None, cache_path: Optional[str] = None, pre_clean: bool = True,
+                 stream: bool = False, metrics: Optional[Metrics] = None):
         """初始化清洗处理器
         
         Args:
             api_key: Deepseek API密钥，如果为None则使用配置文件中的密钥
             api_endpoint: API端点，如果为None则使用配置文件中的端点
             model: 模型名称，如果为None则使用配置文件中的模型
+            requests_per_minute: 每分钟最大请求数，如果为None则使用配置文件中的值
+            tokens_per_minute: 每分钟最大令牌数，如果为None则使用配置文件中的值
+            use_cache: 是否使用本地结果缓存，如果为None则使用配置文件中的设置
+            cache_path: 缓存文件路径，如果为None则使用配置文件中的路径
+            pre_clean: 是否在调用API前用本地规则删除导航、页脚等模板内容
+            stream: 是否使用流式响应，将输出增量写入文件并按令牌数报告进度
+            metrics: Metrics实例，提供时记录每次API调用的耗时、令牌用量和重试，以及每个文件的清洗耗时和字节数
         """
         self.api_key = api_key or DEEPSEEK_API_KEY
         self.api_endpoint = api_endpoint or DEEPSEEK_API_ENDPOINT
         self.model = model or DEEPSEEK_MODEL
+        self.max_tokens = 4000  # 限制返回的令牌数量
+        self.chunk_tokens = CHUNK_MAX_TOKENS  # 超过该令牌数的文档分块清洗
+        self.chunk_workers = CHUNK_MAX_WORKERS
+        self.max_continuations = MAX_CONTINUATIONS  # 输出被截断时最多自动续写的次数
+        
+        # 内容未变化的文件直接使用缓存结果，不再调用API
+        if use_cache is None:
+            use_cache = CACHE_ENABLED
+        self.cache = ResultCache(cache_path or CACHE_PATH, CACHE_MAX_BYTES) if use_cache else None
+        
+        # 预清洗：目录清洗时根据整个目录统计重复内容，单文件清洗时只应用通用规则
+        self.pre_clean = pre_clean
+        self.stream = stream
+        self.default_pre_cleaner = BoilerplateFilter()
+        self.metrics = metrics
+        
+        # 每个文件的处理统计（预清洗减少的令牌数等），以文件路径为键，每次清洗目录或语料库时重新开始统计
+        self.file_stats: Dict[str, Dict[str, Any]] = {}
+        self._stats_lock = threading.Lock()
+        
+        # 所有线程共享的限流器，并发清洗时总速率不超过账户限额
+        self.rate_limiter = RateLimiter(requests_per_minute or REQUESTS_PER_MINUTE,
+                                        tokens_per_minute or TOKENS_PER_MINUTE)
+        # 所有线程共享的自适应并发上限，收到429时减半，持续成功时逐步恢复
+        self.concurrency = AdaptiveConcurrency(ADAPTIVE_INITIAL_CONCURRENCY, maximum=ADAPTIVE_MAX_CONCURRENCY)
         
         # 验证必要参数
         if not self.api_key:
@@ -37,17 +132,33 @@ class MarkdownCleaner:
             self.client = OpenAI(
                 api_key=self.api_key,
                 base_url=self.api_endpoint,
-                timeout=TIMEOUT  # 设置全局超时
+                timeout=TIMEOUT,  # 设置全局超时
+                max_retries=0  # 由_request统一重试，避免客户端内部重试掩盖429
             )
         except Exception as e:
             raise Exception(f"初始化OpenAI客户端失败: {str(e)}")
+    
+    def for_job(self) -> 'MarkdownCleaner':
+        """返回供一个清洗任务使用的清洗器
         
-    def _call_api(self, content: str, callback=None) -> str:
+        与当前清洗器共享API客户端、限流器、自适应并发上限和结果缓存，文件统计各自独立，
+        多个任务同时使用同一个缓存的清洗器时不会互相覆盖统计。
+        """
+        job_cleaner = copy.copy(self)
+        job_cleaner.file_stats = {}
+        job_cleaner._stats_lock = threading.Lock()
+        return job_cleaner
+        
+    def _call_api(self, content: str, callback=None, part: Optional[Tuple[int, int]] = None,
+                  stream_part: Optional[StreamPart] = None, stats: Optional[Dict[str, Any]] = None) -> str:
         """调用Deepseek API清洗Markdown内容
         
         Args:
             content: 原始Markdown内容
             callback: 回调函数用于报告进度
+            part: 分块清洗时的(片段序号, 片段总数)，序号从1开始
+            stream_part: 流式模式下接收增量输出的写入句柄
+            stats: 文件统计字典，记录续写次数等信息
             
         Returns:
             清洗后的Markdown内容
@@ -55,95 +166,327 @@ class MarkdownCleaner:
         Raises:
             Exception: API调用失败
         """
-        system_message = """你是一个专业的Markdown文档清洗专家。你的任务是清洗网页抓取的Markdown文件，使其更适合向量模型分析和存储。
-请遵循以下清洗原则：
-1. 删除无用的页面标题、菜单信息、页脚信息、广告等干扰内容
-2. 完整保留文档中的重要观点、核心文本、代码块、索引、网址和图片链接
-3. 可以对语义进行适当重组和简化，但必须保持原意精准
-4. 保持Markdown格式的完整性和一致性
-5. 返回的内容必须是完整的Markdown文本，不要添加任何评论或解释"""
+        system_message = SYSTEM_PROMPT
 
-        user_message = f"请清洗以下Markdown文档，使其更适合向量分析:\n\n{content}"
+        if part:
+            user_message = (f"以下是一篇长文档的第{part[0]}/{part[1]}部分，请只清洗这一部分，"
+                            f"不要补充开头或结尾，使其更适合向量分析:\n\n{content}")
+        else:
+            user_message = f"请清洗以下Markdown文档，使其更适合向量分析:\n\n{content}"
         
-        # 截断过长内容以防止API限制
+        # 截断过长内容以防止API限制（分块后只有无法拆分的超长代码块会触发）
         max_content_length = 100000  # 约10万字符
         if len(user_message) > max_content_length:
             if callback:
                 callback("内容截断", 15, f"文档过长，已截断到前{max_content_length}字符")
             user_message = user_message[:max_content_length] + "\n\n[内容已截断，仅处理前部分]"
         
-        # 重试机制
-        for attempt in range(MAX_RETRIES):
+        # 相同的输入、提示词、模型和输出上限直接返回缓存结果；缓存键不包含片段序号，
+        # 文档中插入或删除章节后，其余未变化的片段仍然命中缓存
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(content, part=bool(part))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if self.metrics:
+                    self.metrics.record('cache_hit', bytes_out=len(cached.encode('utf-8')))
+                if callback:
+                    callback("缓存命中", 40, "内容未变化，使用缓存的清洗结果")
+                if stream_part:
+                    stream_part.write(cached)
+                return cached
+        
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ]
+        expected_tokens = estimate_tokens(content)
+        result, finish_reason = self._request(messages, callback, expected_tokens, stream_part)
+        
+        # 输出达到max_tokens被截断时，在后续请求中让模型从中断处继续，直到完整或达到续写上限
+        pieces = [result]
+        continuations = 0
+        while finish_reason == "length" and continuations < self.max_continuations:
+            continuations += 1
+            if callback:
+                callback("自动续写", 40, f"输出达到长度上限，正在续写 ({continuations}/{self.max_continuations})...")
+            if stream_part:
+                stream_part.checkpoint()
+            messages = messages + [
+                {"role": "assistant", "content": pieces[-1]},
+                {"role": "user", "content": CONTINUE_PROMPT}
+            ]
+            piece, finish_reason = self._request(messages, callback,
+                                                 max(expected_tokens - estimate_tokens(''.join(pieces)), 0),
+                                                 stream_part)
+            pieces.append(piece)
+        result = ''.join(pieces)
+        
+        self._add_stat(stats, 'continuations', continuations)
+        if finish_reason == "length":
+            # 达到续写上限仍未完成，结果不完整，不写入缓存
+            self._add_stat(stats, 'truncated', 1)
+            if callback:
+                callback("自动续写", 40, f"续写 {continuations} 次后输出仍不完整，结果可能被截断")
+        elif cache_key:
+            self.cache.put(cache_key, result)
+        return result
+    
+    def _cache_key(self, content: str, part: bool = False) -> str:
+        """结果缓存的键，批量清洗的文件和单独清洗的文件使用相同的键，两种方式可以互相命中缓存"""
+        return ResultCache.make_key(SYSTEM_PROMPT, 'part' if part else 'document', content,
+                                    self.model, self.max_tokens)
+    
+    def _add_stat(self, stats: Optional[Dict[str, Any]], key: str, value: int):
+        """线程安全地累加文件统计（分块清洗时多个线程共享同一个统计字典）"""
+        if stats is None:
+            return
+        with self._stats_lock:
+            stats[key] = stats.get(key, 0) + value
+    
+    def _request(self, messages: List[Dict[str, str]], callback=None, expected_tokens: int = 0,
+                 stream_part: Optional[StreamPart] = None) -> Tuple[str, Optional[str]]:
+        """发送一次补全请求，失败时按错误类型重试
+        
+        429按Retry-After等待并降低共享并发；超时、连接错误和5xx按带抖动的指数退避重试；
+        认证失败、模型不存在等无法通过重试解决的错误直接抛出。
+        
+        Args:
+            messages: 对话消息
+            callback: 回调函数用于报告进度
+            expected_tokens: 预计输出的令牌数，用于限流预留和流式进度
+            stream_part: 提供时使用流式请求，增量写入该句柄
+            
+        Returns:
+            (生成的内容, finish_reason)
+        """
+        # 预计消耗的令牌数：输入加上预留的输出
+        input_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        reserved_tokens = input_tokens + min(self.max_tokens, expected_tokens)
+        
+        # 重试机制：429与其他可重试错误分开计数
+        attempt = 0
+        rate_limited = 0
+        while True:
+            waited = self.rate_limiter.acquire(reserved_tokens)
+            if callback and waited > 0:
+                callback("API调用", 25, f"达到速率限制，已等待 {waited:.1f} 秒")
+            
+            waited = self.concurrency.acquire()
+            if callback and waited > 0.1:
+                callback("API调用", 25, f"等待并发名额 {waited:.1f} 秒（当前并发上限 {self.concurrency.limit}）")
             try:
                 if callback:
                     callback("API调用", 25 + (attempt * 5), f"正在调用API (尝试 {attempt+1}/{MAX_RETRIES})...")
                 
                 # 使用OpenAI库1.68.2版本的API调用方式
                 start_time = time.time()
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message}
-                    ],
-                    timeout=TIMEOUT,
-                    max_tokens=4000  # 限制返回的令牌数量
-                )
+                if stream_part:
+                    if attempt > 0 or rate_limited > 0:
+                        stream_part.reset()
+                    result, finish_reason, usage = self._stream_completion(messages, callback, expected_tokens,
+                                                                           stream_part)
+                else:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        timeout=TIMEOUT,
+                        max_tokens=self.max_tokens
+                    )
+                    
+                    # 确保我们能够正确访问响应内容
+                    if not (hasattr(response, 'choices') and len(response.choices) > 0 and hasattr(response.choices[0], 'message')):
+                        raise Exception("API响应格式不正确")
+                    result = response.choices[0].message.content
+                    finish_reason = getattr(response.choices[0], 'finish_reason', None)
+                    usage = getattr(response, 'usage', None)
                 elapsed_time = time.time() - start_time
                 
+                self.concurrency.record_success()
+                if self.metrics:
+                    self._record_api(start_time, elapsed_time, usage, attempt + rate_limited, finish_reason)
                 if callback:
                     callback("API调用", 40, f"API响应成功，用时 {elapsed_time:.2f} 秒")
+                return result, finish_reason
                 
-                # 确保我们能够正确访问响应内容
-                if hasattr(response, 'choices') and len(response.choices) > 0 and hasattr(response.choices[0], 'message'):
-                    return response.choices[0].message.content
+            except RateLimitError as e:
+                # 429：降低共享并发，按服务端要求的时间等待后重试
+                retry_after = parse_retry_after(e.response.headers)
+                self.concurrency.record_rate_limit(retry_after)
+                rate_limited += 1
+                if self.metrics:
+                    self.metrics.record('api_retry', reason='rate_limit', retry_after=retry_after or 0)
+                if rate_limited >= RATE_LIMIT_MAX_RETRIES:
+                    raise Exception(f"API持续返回速率限制 (已重试 {rate_limited} 次): {str(e)}")
+                if retry_after is not None:
+                    # 少量抖动，避免所有线程在同一时刻恢复请求
+                    wait_time = retry_after + random.uniform(0, min(1.0, retry_after * 0.1 + 0.05))
                 else:
-                    raise Exception("API响应格式不正确")
-                
+                    wait_time = self._backoff(rate_limited - 1)
+                if callback:
+                    callback("API调用", 25, f"API返回速率限制，并发上限降为 {self.concurrency.limit}，"
+                                           f"等待 {wait_time:.1f} 秒后重试...")
+            
+            except (AuthenticationError, PermissionDeniedError):
+                raise Exception(f"API认证失败: API密钥无效或已过期")
+            
+            except NotFoundError:
+                raise Exception(f"模型'{self.model}'不存在，请检查模型名称是否正确。可用模型: deepseek-chat, deepseek-coder")
+            
             except Exception as e:
                 error_msg = str(e)
+                timed_out = isinstance(e, APITimeoutError) or "timed out" in error_msg.lower() or "timeout" in error_msg.lower()
                 
-                # 特殊处理超时错误
-                if "timeout" in error_msg.lower() or "timed out" in error_msg.lower():
+                if isinstance(e, APIStatusError) and not timed_out:
+                    # 408/409/5xx可重试，其余状态码（如400）是请求本身的问题，重试无效
+                    if "Model Not Exist" in error_msg:
+                        raise Exception(f"模型'{self.model}'不存在，请检查模型名称是否正确。可用模型: deepseek-chat, deepseek-coder")
+                    if e.status_code not in (408, 409) and e.status_code < 500:
+                        raise Exception(f"API请求无效 (HTTP {e.status_code}): {error_msg}")
+                
+                attempt += 1
+                if self.metrics:
+                    self.metrics.record('api_retry', reason='timeout' if timed_out else type(e).__name__)
+                if timed_out:
                     if callback:
-                        callback("API调用", -1, f"API请求超时 (尝试 {attempt+1}/{MAX_RETRIES}): 服务器响应时间过长")
-                    if attempt == MAX_RETRIES - 1:
+                        callback("API调用", -1, f"API请求超时 (尝试 {attempt}/{MAX_RETRIES}): 服务器响应时间过长")
+                    if attempt >= MAX_RETRIES:
                         raise Exception(f"API请求超时，服务器响应时间过长。请稍后再试或减小文件大小。")
+                elif attempt >= MAX_RETRIES:
+                    raise Exception(f"API调用失败 (尝试 {attempt}/{MAX_RETRIES}): {error_msg}")
+                elif callback:
+                    reason = "网络连接失败" if isinstance(e, APIConnectionError) else "API调用失败"
+                    callback("API调用", 25, f"{reason} (尝试 {attempt}/{MAX_RETRIES}): 准备重试...")
                 
-                # 特殊处理模型不存在的错误
-                elif "Model Not Exist" in error_msg or "invalid_request_error" in error_msg:
-                    raise Exception(f"模型'{self.model}'不存在，请检查模型名称是否正确。可用模型: deepseek-chat, deepseek-coder")
-                
-                # 特殊处理API密钥错误
-                elif "authentication" in error_msg.lower() or "api key" in error_msg.lower() or "unauthorized" in error_msg.lower():
-                    raise Exception(f"API认证失败: API密钥无效或已过期")
-                
-                # 其他错误
-                elif attempt == MAX_RETRIES - 1:
-                    raise Exception(f"API调用失败 (尝试 {attempt+1}/{MAX_RETRIES}): {error_msg}")
-                
+                wait_time = self._backoff(attempt - 1)
                 if callback:
-                    callback("API调用", 25, f"API调用失败 (尝试 {attempt+1}/{MAX_RETRIES}): 准备重试...")
-                
-                # 指数退避
-                wait_time = 2 ** attempt
+                    callback("API调用", 25, f"等待 {wait_time:.1f} 秒后重试...")
+            
+            finally:
+                self.concurrency.release()
+            
+            time.sleep(wait_time)
+    
+    def _record_api(self, start_time: float, elapsed: float, usage, retries: int, finish_reason: Optional[str]):
+        """记录一次成功的API调用，令牌数取自响应中的usage（服务端没有返回时不记录）"""
+        fields = {'retries': retries, 'finish_reason': finish_reason}
+        if usage is not None:
+            fields['prompt_tokens'] = getattr(usage, 'prompt_tokens', 0) or 0
+            fields['completion_tokens'] = getattr(usage, 'completion_tokens', 0) or 0
+        self.metrics.record('api', elapsed, start_time, **fields)
+    
+    def _record_file(self, key: str, start_time: float, success: bool, content: Optional[str] = None,
+                     cleaned: Optional[str] = None, **fields):
+        """记录一个文件（或语料库页面）的清洗耗时和输入输出字节数"""
+        if not self.metrics:
+            return
+        if content is not None:
+            fields['bytes_in'] = len(content.encode('utf-8'))
+        if cleaned is not None:
+            fields['bytes_out'] = len(cleaned.encode('utf-8'))
+        self.metrics.record('clean_file', time.time() - start_time, start_time, file=key, success=success, **fields)
+    
+    @staticmethod
+    def _backoff(retry: int) -> float:
+        """带完全抖动的指数退避：在0到base*2^retry（不超过上限）之间随机取值"""
+        return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** retry)))
+    
+    def _stream_completion(self, messages: List[Dict[str, str]], callback, expected_tokens: int,
+                           stream_part: StreamPart) -> Tuple[str, Optional[str], Any]:
+        """以流式方式请求补全，增量写入输出文件，并按已接收的令牌数报告进度
+        
+        Returns:
+            (生成的内容, finish_reason, usage)，启用统计时请求服务端在最后一个数据块中返回usage
+        """
+        extra = {'stream_options': {'include_usage': True}} if self.metrics else {}
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            timeout=TIMEOUT,
+            max_tokens=self.max_tokens,
+            stream=True,
+            **extra
+        )
+        pieces = []
+        finish_reason = None
+        usage = None
+        received_tokens = 0
+        reported_tokens = 0
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = getattr(choice.delta, 'content', None)
+            if delta:
+                pieces.append(delta)
+                stream_part.write(delta)
+                received_tokens += estimate_tokens(delta)
+                if callback and received_tokens - reported_tokens >= 50:
+                    reported_tokens = received_tokens
+                    progress = 25 + min(55, int(55 * received_tokens / max(expected_tokens, 1)))
+                    callback("流式输出", progress, f"已接收约 {received_tokens} 个令牌")
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+        return ''.join(pieces), finish_reason, usage
+    
+    def _clean_content(self, content: str, callback=None, output: Optional[StreamingOutput] = None,
+                       stats: Optional[Dict[str, Any]] = None) -> str:
+        """清洗Markdown内容，超过分块预算的文档按标题和段落切分后并发清洗再按顺序拼接
+        
+        Args:
+            content: 原始Markdown内容
+            callback: 回调函数用于报告进度，接收(phase, progress, message)参数
+            output: 流式模式下增量写入的输出文件
+            stats: 文件统计字典
+            
+        Returns:
+            清洗后的Markdown内容
+        """
+        chunks = split_markdown(content, self.chunk_tokens)
+        if len(chunks) == 1:
+            stream_part = output.part(0) if output else None
+            result = self._call_api(content, callback, stream_part=stream_part, stats=stats)
+            if stream_part:
+                stream_part.finish()
+            return result
+        
+        total = len(chunks)
+        if callback:
+            callback("分块清洗", 25, f"文档较长，已按标题和段落分为 {total} 块并发清洗")
+        
+        cleaned = [None] * total
+        with ThreadPoolExecutor(max_workers=min(self.chunk_workers, total)) as executor:
+            futures = {executor.submit(self._call_api, chunk, None, (i + 1, total),
+                                       output.part(i) if output else None, stats): i
+                       for i, chunk in enumerate(chunks)}
+            for done_count, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                cleaned[index] = future.result().strip()
+                if output:
+                    output.finish_part(index)
                 if callback:
-                    callback("API调用", 25, f"等待 {wait_time} 秒后重试...")
-                
-                time.sleep(wait_time)
-                
-        raise Exception("API调用失败，已达到最大重试次数")
+                    message = f"已完成 {done_count}/{total} 块"
+                    if output:
+                        message += f"，已接收约 {output.received_chars} 个字符"
+                    callback("分块清洗", 25 + int(35 * done_count / total), message)
+        
+        return "\n\n".join(cleaned) + "\n"
     
-    def clean_file(self, file_path: str, callback=None) -> Tuple[bool, str]:
+    def clean_file(self, file_path: str, callback=None, pre_cleaner: Optional[BoilerplateFilter] = None) -> Tuple[bool, str]:
         """清洗单个Markdown文件
         
         Args:
             file_path: Markdown文件路径
             callback: 进度回调函数，接收(file_path, progress, message)参数
+            pre_cleaner: 预清洗过滤器，如果为None则只应用通用规则
             
         Returns:
             (成功标志, 输出文件路径或错误信息)
         """
+        start_time = time.time()
+        content = None
         try:
             if callback:
                 callback(file_path, 0, "开始处理文件")
@@ -184,21 +527,46 @@ class MarkdownCleaner:
                 except Exception as enc_error:
                     return False, f"无法读取文件，编码问题: {str(enc_error)}"
                 
+            # 本地预清洗，减少发送给API的内容
+            stats = self.file_stats[file_path] = {}
+            if self.pre_clean:
+                content, tokens_removed = (pre_cleaner or self.default_pre_cleaner).clean(content)
+                stats['pre_clean_tokens_removed'] = tokens_removed
+                if callback:
+                    callback(file_path, 22, f"预清洗完成，移除约 {tokens_removed} 个令牌的模板内容")
+            
+            # 生成输出文件路径
+            output_file = self._output_path(file_path)
+            
             # 调用API清洗内容
             if callback:
                 callback(file_path, 25, "准备调用API处理内容...")
-                
-            cleaned_content = self._call_api(content, lambda phase, progress, msg: 
-                callback(file_path, progress, msg) if callback else None)
+            
+            # 流式模式下输出增量写入临时文件，完成后重命名为输出文件
+            output = StreamingOutput(output_file) if self.stream else None
+            try:
+                cleaned_content = self._clean_content(content, lambda phase, progress, msg: 
+                    callback(file_path, progress, msg) if callback else None, output, stats)
+            except Exception as api_error:
+                partial_file = output.abort() if output else None
+                if partial_file:
+                    raise Exception(f"{str(api_error)}（已保存部分结果: {partial_file}）")
+                raise
+            
+            done_message = f"处理完成，已保存至 {output_file}"
+            if stats.get('continuations'):
+                done_message += f"（自动续写 {stats['continuations']} 次）"
+            
+            if output:
+                # 增量写入的是未去除首尾空白的片段，改写为与非流式模式相同的内容，避免切换模式后内容哈希变化
+                output.commit(cleaned_content)
+                self._record_file(file_path, start_time, True, content, cleaned_content)
+                if callback:
+                    callback(file_path, 100, done_message)
+                return True, output_file
             
             if callback:
                 callback(file_path, 60, "API处理完成，准备保存文件")
-                
-            # 生成输出文件路径
-            file_dir = os.path.dirname(file_path)
-            file_name = os.path.basename(file_path)
-            base_name, ext = os.path.splitext(file_name)
-            output_file = os.path.join(file_dir, f"{CLEANED_FILE_PREFIX}{base_name}{ext}")
             
             # 保存清洗后的内容
             try:
@@ -209,27 +577,51 @@ class MarkdownCleaner:
                     f.write(cleaned_content)
                     
                 if callback:
-                    callback(file_path, 100, f"处理完成，已保存至 {output_file}")
+                    callback(file_path, 100, done_message)
             except Exception as save_error:
+                self._record_file(file_path, start_time, False, content)
                 return False, f"保存文件失败: {str(save_error)}"
-                
+            
+            self._record_file(file_path, start_time, True, content, cleaned_content)
             return True, output_file
         except Exception as e:
+            self._record_file(file_path, start_time, False, content)
             if callback:
                 callback(file_path, -1, f"处理失败: {str(e)}")
             return False, str(e)
     
-    def clean_directory(self, dir_path: str, callback=None) -> List[Tuple[str, bool, str]]:
+    @staticmethod
+    def _output_path(file_path: str) -> str:
+        """清洗结果文件路径：与源文件同目录，文件名加上CLEANED_FILE_PREFIX前缀"""
+        file_dir = os.path.dirname(file_path)
+        file_name = os.path.basename(file_path)
+        base_name, ext = os.path.splitext(file_name)
+        return os.path.join(file_dir, f"{CLEANED_FILE_PREFIX}{base_name}{ext}")
+    
+    def clean_directory(self, dir_path: str, callback=None, max_workers: int = 1,
+                        incremental: bool = True, batch: bool = False, dedup: bool = True,
+                        cancel_event: Optional[threading.Event] = None) -> List[Tuple[str, bool, str]]:
         """清洗目录中的所有Markdown文件
         
+        清洗输出文件（带CLEANED_FILE_PREFIX前缀）不会被当作输入。清洗记录保存在目录中的
+        清洗记录文件里，增量模式下内容未变化且已成功清洗的文件会被跳过，只处理新文件、
+        变化的文件和上次失败的文件。
+        
         Args:
             dir_path: 目录路径
             callback: 进度回调函数，接收(file_path, progress, message)参数
+            max_workers: 同时清洗的文件数，大于1时使用线程池并发调用API
+            incremental: 是否跳过未变化的文件
+            batch: 是否将多个小文件合并到一个API请求中清洗
+            dedup: 是否跳过与其他文件内容相同或近似的文件，这些文件的输出指向被重复文件的清洗结果
+            cancel_event: threading.Event，设置后不再开始清洗新的文件，进行中的请求完成后返回；
+                未清洗的文件结果为失败且不写入清洗记录，增量模式下再次清洗时会继续处理
             
         Returns:
             处理结果列表，每项为(文件路径, 成功标志, 输出文件路径或错误信息)
         """
         results = []
+        self.file_stats = {}
         
         # 检查目录是否存在
         if not os.path.isdir(dir_path):
@@ -237,11 +629,11 @@ class MarkdownCleaner:
                 callback(dir_path, -1, f"目录不存在: {dir_path}")
             return [(dir_path, False, f"目录不存在: {dir_path}")]
         
-        # 获取所有Markdown文件
+        # 获取所有Markdown文件，跳过之前的清洗输出
         md_files = []
         for root, _, files in os.walk(dir_path):
             for file in files:
-                if file.lower().endswith(('.md', '.markdown')):
+                if file.lower().endswith(('.md', '.markdown')) and not file.startswith(CLEANED_FILE_PREFIX):
                     md_files.append(os.path.join(root, file))
         
         if not md_files:
@@ -249,20 +641,376 @@ class MarkdownCleaner:
                 callback(dir_path, 100, "目录中没有找到Markdown文件")
             return [(dir_path, True, "目录中没有找到Markdown文件")]
         
+        # 统计整个目录中重复出现的行，作为导航、页脚等模板内容在调用API前删除
+        pre_cleaner = None
+        if self.pre_clean:
+            pre_cleaner = BoilerplateFilter().fit_files(md_files)
+            if callback and pre_cleaner.boilerplate:
+                callback(dir_path, 0, f"识别出 {len(pre_cleaner.boilerplate)} 行重复的模板内容，将在调用API前删除")
+        
+        manifest = CleanManifest(dir_path)
+        skipped = {}
+        if incremental:
+            for file_path in md_files:
+                if manifest.is_unchanged(file_path):
+                    skipped[file_path] = os.path.join(dir_path, manifest.get(file_path)['output'])
+        pending_files = [file_path for file_path in md_files if file_path not in skipped]
+        
+        # 内容与其他文件相同或近似的文件不调用API
+        duplicates = {}
+        if dedup and pending_files:
+            duplicates = self._find_duplicates(list(skipped) + pending_files, set(pending_files), pre_cleaner)
+            pending_files = [file_path for file_path in pending_files if file_path not in duplicates]
+        
         # 处理每个文件
-        total_files = len(md_files)
+        total_files = len(pending_files)
         if callback:
-            callback(dir_path, 0, f"找到 {total_files} 个Markdown文件")
+            message = f"找到 {len(md_files)} 个Markdown文件"
+            if skipped:
+                message += f"，其中 {len(skipped)} 个未变化已跳过"
+            if duplicates:
+                message += f"，{len(duplicates)} 个与其他文件内容重复不再清洗"
+            callback(dir_path, 0, message)
+        
+        units = self._plan_units(pending_files, batch)
+        if callback and len(units) < total_files:
+            callback(dir_path, 0, f"已将小文件合并为批量请求，共 {len(units)} 个请求")
+        
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        
+        def process(unit, unit_callback):
+            if cancelled():
+                return [(file_path, False, "已取消") for file_path in unit]
+            return self._process_unit(unit, unit_callback, manifest, pre_cleaner)
+        
+        try:
+            if max_workers > 1:
+                results = self._clean_units_concurrently(dir_path, units, callback, max_workers, process)
+            else:
+                processed = 0
+                for unit in units:
+                    if callback and not cancelled():
+                        overall_progress = int((processed / total_files) * 100)
+                        names = ', '.join(os.path.basename(file_path) for file_path in unit[:3])
+                        if len(unit) > 3:
+                            names += f" 等 {len(unit)} 个文件"
+                        callback(dir_path, overall_progress, f"正在处理 ({processed+1}/{total_files}): {names}")
+                    
+                    results.extend(process(unit, callback))
+                    processed += len(unit)
+            
+            # 重复的文件使用被重复文件的清洗结果
+            for file_path, original in duplicates.items():
+                if original in skipped:
+                    success, result = True, skipped[original]
+                else:
+                    _, success, result = next(item for item in results if item[0] == original)
+                    if not success:
+                        result = f"与 {os.path.basename(original)} 内容重复，但该文件清洗失败: {result}"
+                results.append((file_path, success, result))
+                try:
+                    manifest.record(file_path, success, result,
+                                    extra={'duplicate_of': os.path.relpath(original, dir_path).replace(os.sep, '/')})
+                except OSError:
+                    pass
+        finally:
+            manifest.save()
+        
+        if callback:
+            if cancelled():
+                not_processed = sum(1 for _, _, result in results if result == "已取消")
+                callback(dir_path, -1, f"清洗已取消，{not_processed} 个文件未处理")
+            else:
+                callback(dir_path, 100, f"所有文件处理完成，共 {total_files} 个文件")
+        
+        # 按文件顺序合并跳过的文件
+        cleaned = {file_path: (file_path, success, result) for file_path, success, result in results}
+        return [(file_path, True, skipped[file_path]) if file_path in skipped else cleaned[file_path]
+                for file_path in md_files]
+    
+    def _find_duplicates(self, file_paths: List[str], candidates: set,
+                         pre_cleaner: Optional[BoilerplateFilter] = None) -> Dict[str, str]:
+        """按顺序检查文件内容，找出与前面的文件完全相同或近似的候选文件
+        
+        比较的是预清洗后的内容，导航、页脚等模板内容不会让不同的页面被误判为近似重复。
+        
+        Returns:
+            {重复的文件: 被重复的文件}
+        """
+        index = DuplicateIndex()
+        duplicates = {}
+        for file_path in file_paths:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = URL_HEADER_PATTERN.sub('', f.read(), count=1)
+            except (OSError, UnicodeDecodeError):
+                continue  # 由clean_file报告读取错误
+            if self.pre_clean:
+                content, _ = (pre_cleaner or self.default_pre_cleaner).clean(content)
+            if not content.strip():
+                continue
+            original = index.check_text(file_path, content)
+            if original is not None and file_path in candidates:
+                duplicates[file_path] = original
+        return duplicates
+    
+    def _plan_units(self, file_paths: List[str], batch: bool) -> List[List[str]]:
+        """将待清洗文件分组：批量模式下相邻的小文件在令牌预算内合并为一组，其他文件单独一组"""
+        if not batch:
+            return [[file_path] for file_path in file_paths]
+        
+        units = []
+        current = []
+        current_tokens = 0
+        for file_path in file_paths:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    tokens = estimate_tokens(f.read())
+            except (OSError, UnicodeDecodeError):
+                tokens = None
+            if tokens is None or tokens > BATCH_SMALL_FILE_TOKENS:
+                units.append([file_path])
+                continue
+            if current and (current_tokens + tokens > BATCH_MAX_TOKENS or len(current) >= BATCH_MAX_FILES):
+                units.append(current)
+                current = []
+                current_tokens = 0
+            current.append(file_path)
+            current_tokens += tokens
+        if current:
+            units.append(current)
+        return units
+    
+    def clean_manifest_file(self, manifest: CleanManifest, file_path: str, callback=None,
+                            pre_cleaner: Optional[BoilerplateFilter] = None) -> Tuple[str, bool, str]:
+        """清洗单个文件并写入清洗记录，用于在目录清洗之外逐个处理文件（例如边爬取边清洗）
+
+        Returns:
+            (文件路径, 成功标志, 输出文件路径或错误信息)
+        """
+        return self._process_unit([file_path], callback, manifest, pre_cleaner)[0]
+
+    def _process_unit(self, unit: List[str], callback, manifest: CleanManifest,
+                      pre_cleaner: Optional[BoilerplateFilter] = None) -> List[Tuple[str, bool, str]]:
+        """清洗一组文件（单个文件或批量请求）并写入清洗记录"""
+        snapshots = {}
+        for file_path in unit:
+            try:
+                snapshots[file_path] = file_snapshot(file_path)
+            except OSError:
+                pass
+        
+        if len(unit) == 1:
+            results = [(unit[0], *self.clean_file(unit[0], callback, pre_cleaner))]
+        else:
+            results = self._clean_batch(unit, callback, pre_cleaner)
+        
+        for file_path, success, result in results:
+            if file_path not in snapshots:
+                continue
+            try:
+                manifest.record(file_path, success, result, snapshots[file_path], self.file_stats.get(file_path))
+            except OSError:
+                pass  # 源文件在清洗期间被删除，不影响本次结果
+        return results
+    
+    def _clean_batch(self, file_paths: List[str], callback=None,
+                     pre_cleaner: Optional[BoilerplateFilter] = None) -> List[Tuple[str, bool, str]]:
+        """将多个小文件放入一个API请求中清洗
+        
+        每个文件用编号分隔符包裹，响应按分隔符拆回各个文件。响应中缺少分隔符的文件
+        （例如输出被截断）以及无法读取的文件退回单文件清洗。
+        
+        Returns:
+            处理结果列表，每项为(文件路径, 成功标志, 输出文件路径或错误信息)
+        """
+        start_time = time.time()
+        contents = {}
+        for file_path in file_paths:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+            stats = self.file_stats[file_path] = {}
+            if self.pre_clean:
+                content, stats['pre_clean_tokens_removed'] = (pre_cleaner or self.default_pre_cleaner).clean(content)
+            contents[file_path] = content
+        
+        # 已缓存的文件不再发送；拆分后的结果按单文件清洗的键缓存，之后单独清洗该文件时也能命中
+        outputs = {}
+        cache_keys = {}
+        for file_path, content in contents.items():
+            if self.cache:
+                cache_keys[file_path] = self._cache_key(content)
+                cached = self.cache.get(cache_keys[file_path])
+                if cached is not None:
+                    outputs[file_path] = cached
+        to_send = [file_path for file_path in contents if file_path not in outputs]
+        
+        if len(to_send) > 1:
+            label = f"批量请求({len(to_send)} 个文件)"
+            documents = "\n\n".join(f"<<<FILE {i}>>>\n{contents[file_path]}\n<<<END FILE {i}>>>"
+                                     for i, file_path in enumerate(to_send, 1))
+            messages = [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": f"请分别清洗以下 {len(to_send)} 个Markdown文档，使其更适合向量分析:\n\n{documents}"}
+            ]
+            batch_callback = (lambda phase, progress, msg: callback(to_send[0], progress, f"{label} {msg}")) if callback else None
+            try:
+                text, _ = self._request(messages, batch_callback,
+                                        sum(estimate_tokens(contents[file_path]) for file_path in to_send))
+            except Exception as e:
+                # 批量请求失败时全部退回单文件清洗，由单文件清洗报告具体错误
+                if callback:
+                    callback(to_send[0], 25, f"{label}失败，改为逐个清洗: {str(e)}")
+                text = ""
             
-        for i, file_path in enumerate(md_files):
+            parsed = {int(match.group(1)): match.group(2) for match in BATCH_OUTPUT_PATTERN.finditer(text)}
+            for i, file_path in enumerate(to_send, 1):
+                if parsed.get(i, "").strip():
+                    outputs[file_path] = parsed[i].strip() + "\n"
+                    self.file_stats[file_path]['batched'] = len(to_send)
+                    if file_path in cache_keys:
+                        self.cache.put(cache_keys[file_path], outputs[file_path])
+        
+        results = []
+        for file_path in file_paths:
+            if file_path not in outputs:
+                # 分隔符缺失或无法读取，单独清洗
+                results.append((file_path, *self.clean_file(file_path, callback, pre_cleaner)))
+                continue
+            output_file = self._output_path(file_path)
+            try:
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(outputs[file_path])
+            except Exception as save_error:
+                results.append((file_path, False, f"保存文件失败: {str(save_error)}"))
+                continue
+            self._record_file(file_path, start_time, True, contents[file_path], outputs[file_path],
+                              batched=len(to_send) > 1)
             if callback:
-                overall_progress = int((i / total_files) * 100)
-                callback(dir_path, overall_progress, f"正在处理 ({i+1}/{total_files}): {os.path.basename(file_path)}")
+                callback(file_path, 100, f"处理完成，已保存至 {output_file}")
+            results.append((file_path, True, output_file))
+        return results
+    
+    def _clean_units_concurrently(self, dir_path: str, units: List[List[str]], callback, max_workers: int,
+                                  process) -> List[Tuple[str, bool, str]]:
+        """使用线程池并发清洗各组文件，process(unit, callback)清洗一组文件并返回结果列表
+        
+        工作线程中的进度回调先放入队列，再由调用线程依次执行，
+        这样回调函数（例如更新Streamlit界面）始终在调用线程中运行。
+        """
+        events = queue.Queue()
+        worker_callback = (lambda *args: events.put(args)) if callback else None
+        total_files = sum(len(unit) for unit in units)
+        results = []
+        
+        def run(unit):
+            unit_results = []
+            try:
+                unit_results = process(unit, worker_callback)
+                return unit_results
+            finally:
+                events.put(len(unit_results) or len(unit))  # 完成的文件数
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run, unit) for unit in units]
+            completed = 0
+            while completed < total_files:
+                event = events.get()
+                if isinstance(event, tuple):
+                    callback(*event)
+                    continue
+                completed += event
+                if callback:
+                    callback(dir_path, int((completed / total_files) * 100), f"已完成 ({completed}/{total_files})")
             
-            success, result = self.clean_file(file_path, callback)
-            results.append((file_path, success, result))
+            # clean_file内部会捕获异常，这里只是确保意外错误不会被静默吞掉
+            for future in futures:
+                results.extend(future.result())
+        
+        return results
+    
+    def clean_store(self, store: CorpusStore, callback=None, max_workers: int = 1,
+                    incremental: bool = True) -> List[Tuple[str, bool, str]]:
+        """清洗语料库中的页面，清洗结果写回语料库
+        
+        Args:
+            store: 爬虫写入的语料库
+            callback: 进度回调函数，接收(url, progress, message)参数
+            max_workers: 同时清洗的页面数
+            incremental: 是否只清洗还没有清洗结果或清洗后内容发生变化的页面
+            
+        Returns:
+            处理结果列表，每项为(URL, 成功标志, 提示信息或错误信息)
+        """
+        self.file_stats = {}
+        urls = store.pending_clean() if incremental else store.urls()
+        if callback:
+            callback(store.path, 0, f"语料库共 {len(store)} 个页面，需要清洗 {len(urls)} 个")
+        if not urls:
+            return []
+        
+        # 统计整个语料库中重复出现的行，作为模板内容在调用API前删除
+        pre_cleaner = None
+        if self.pre_clean:
+            pre_cleaner = BoilerplateFilter().fit(markdown for _, markdown in store.iter_markdown())
+            if callback and pre_cleaner.boilerplate:
+                callback(store.path, 0, f"识别出 {len(pre_cleaner.boilerplate)} 行重复的模板内容，将在调用API前删除")
+        
+        units = [[url] for url in urls]
+        try:
+            if max_workers > 1:
+                results = self._clean_units_concurrently(
+                    store.path, units, callback, max_workers,
+                    lambda unit, unit_callback: [self.clean_store_page(store, unit[0], unit_callback, pre_cleaner)])
+            else:
+                results = []
+                for index, url in enumerate(urls):
+                    if callback:
+                        callback(store.path, int(index / len(urls) * 100), f"正在处理 ({index+1}/{len(urls)}): {url}")
+                    results.append(self.clean_store_page(store, url, callback, pre_cleaner))
+        finally:
+            store.commit()
         
         if callback:
-            callback(dir_path, 100, f"所有文件处理完成，共 {total_files} 个文件")
+            callback(store.path, 100, f"所有页面处理完成，共 {len(urls)} 个页面")
+        return results
+    
+    def clean_store_page(self, store: CorpusStore, url: str, callback=None,
+                         pre_cleaner: Optional[BoilerplateFilter] = None) -> Tuple[str, bool, str]:
+        """清洗语料库中的单个页面并写回清洗结果
+        
+        Returns:
+            (URL, 成功标志, 提示信息或错误信息)
+        """
+        record = store.get(url)
+        if record is None:
+            return url, False, f"语料库中没有该页面: {url}"
         
-        return results 
\ No newline at end of file
+        start_time = time.time()
+        stats = self.file_stats[url] = {}
+        try:
+            if callback:
+                callback(url, 10, f"读取页面内容，共 {len(record['markdown'])} 字符")
+            content = record['markdown']
+            if self.pre_clean:
+                content, removed = (pre_cleaner or self.default_pre_cleaner).clean(content)
+                stats['pre_clean_tokens_removed'] = removed
+            
+            cleaned = self._clean_content(content, lambda phase, progress, msg:
+                callback(url, progress, msg) if callback else None, stats=stats)
+            store.put_cleaned(url, cleaned, record['markdown_hash'], stats)
+            self._record_file(url, start_time, True, content, cleaned)
+        except Exception as e:
+            self._record_file(url, start_time, False, record['markdown'])
+            store.put_clean_error(url, str(e))
+            if callback:
+                callback(url, -1, f"处理失败: {str(e)}")
+            return url, False, str(e)
+        
+        if callback:
+            callback(url, 100, "处理完成，已写回语料库")
+        return url, True, "已写回语料库"
@@ -0,0 +1,184 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """已排序列表的百分位数（线性插值），列表为空时返回0"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Metrics:
+    """爬取和清洗各阶段的耗时、令牌数、字节数统计
+
+    每次记录是一个事件：阶段名、开始时间、耗时和附加字段（如bytes_in、prompt_tokens）。
+    提供path时事件以JSONL格式逐行写入文件，内存中只保留各阶段的耗时和数值字段的合计，
+    用于生成p50/p95等汇总。多个线程可以共享同一个实例。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: JSONL事件文件路径，为None时不写文件；文件已存在时追加写入
+        """
+        self.path = path
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+        self._durations: Dict[str, List[float]] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._first_start = None
+        self._last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: Optional[float] = None, start: Optional[float] = None, **fields):
+        """记录一个事件
+
+        Args:
+            stage: 阶段名，例如fetch、convert、api
+            seconds: 耗时(秒)，为None时只累计附加字段
+            start: 开始时间（time.time()），默认按当前时间减去耗时计算
+            fields: 附加字段，数值字段会按阶段累计，用于汇总
+        """
+        now = time.time()
+        if start is None:
+            start = now - (seconds or 0.0)
+        event = {'stage': stage, 'start': round(start, 6)}
+        if seconds is not None:
+            event['seconds'] = round(seconds, 6)
+        event.update(fields)
+
+        with self._lock:
+            if seconds is not None:
+                self._durations.setdefault(stage, []).append(seconds)
+            totals = self._totals.setdefault(stage, {})
+            for key, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+            self._counters[stage] = self._counters.get(stage, 0) + 1
+            self._first_start = start if self._first_start is None else min(self._first_start, start)
+            self._last_end = now if self._last_end is None else max(self._last_end, now)
+            if self._file:
+                self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    @contextmanager
+    def timer(self, stage: str, **fields) -> Iterator[Dict[str, Any]]:
+        """计时上下文，代码块中可以向返回的字典添加字段；代码块抛出异常时记录error字段"""
+        extra = dict(fields)
+        start = time.time()
+        began = time.perf_counter()
+        try:
+            yield extra
+        except BaseException as e:
+            extra['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - began, start, **extra)
+
+    def count(self, stage: str) -> int:
+        """阶段的事件数"""
+        with self._lock:
+            return self._counters.get(stage, 0)
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总统计
+
+        Returns:
+            字典：wall_seconds为第一个事件开始到最后一个事件结束的时长；stages为各阶段的
+            count、total、p50、p95、max（秒）及数值字段合计；pages_per_second为每秒爬取的页面数，
+            files_per_second为每秒清洗的文件数，tokens_per_second为每秒API输出的令牌数
+        """
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            totals = {stage: dict(values) for stage, values in self._totals.items()}
+            counters = dict(self._counters)
+            wall = (self._last_end - self._first_start) if self._first_start is not None else 0.0
+
+        stages = {}
+        for stage, count in counters.items():
+            values = durations.get(stage, [])
+            stages[stage] = {
+                'count': count,
+                'total': sum(values),
+                'p50': percentile(values, 0.5),
+                'p95': percentile(values, 0.95),
+                'max': values[-1] if values else 0.0,
+                **totals.get(stage, {}),
+            }
+
+        def rate(value):
+            return value / wall if wall > 0 else 0.0
+
+        return {
+            'wall_seconds': wall,
+            'stages': stages,
+            'pages_per_second': rate(counters.get('page', 0)),
+            'files_per_second': rate(counters.get('clean_file', 0)),
+            'tokens_per_second': rate(totals.get('api', {}).get('completion_tokens', 0)),
+        }
+
+    def report(self) -> str:
+        """以文本表格形式返回汇总统计"""
+        summary = self.summary()
+        lines = [f"总耗时 {summary['wall_seconds']:.2f} 秒，"
+                 f"爬取 {summary['pages_per_second']:.2f} 页/秒，"
+                 f"清洗 {summary['files_per_second']:.2f} 个文件/秒，"
+                 f"输出 {summary['tokens_per_second']:.1f} 令牌/秒",
+                 f"{'阶段':<12}{'次数':>8}{'合计(s)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'最大(ms)':>10}  其他"]
+        for stage, values in sorted(summary['stages'].items(), key=lambda item: -item[1]['total']):
+            others = ', '.join(f"{key}={value:g}" for key, value in values.items()
+                               if key not in ('count', 'total', 'p50', 'p95', 'max'))
+            lines.append(f"{stage:<12}{values['count']:>8}{values['total']:>10.2f}{values['p50'] * 1000:>10.1f}"
+                         f"{values['p95'] * 1000:>10.1f}{values['max'] * 1000:>10.1f}  {others}")
+        return '\n'.join(lines)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+@contextmanager
+def timed(metrics: Optional[Metrics], stage: str, **fields) -> Iterator[Dict[str, Any]]:
+    """metrics为None时不计时的Metrics.timer，便于在可选启用统计的代码中使用"""
+    if metrics is None:
+        yield {}
+        return
+    with metrics.timer(stage, **fields) as extra:
+        yield extra
+
+
+@contextmanager
+def profile(path: Optional[str] = None, limit: int = 30) -> Iterator[cProfile.Profile]:
+    """用cProfile分析代码块，结束时保存到path（可用snakeviz等工具查看），未提供path时打印最耗时的函数
+
+    cProfile只分析调用线程，并发爬取和清洗时工作线程中的耗时请参考Metrics的阶段统计。
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        else:
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(limit)
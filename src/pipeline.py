@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from clean_manifest import CleanManifest
+from config import PIPELINE_QUEUE_SIZE, PIPELINE_CLEAN_WORKERS
+from markdown_cleaner import MarkdownCleaner
+from web_crawler import WebCrawler
+
+# 队列结束标记
+_DONE = object()
+
+
+def run_pipeline(crawler: WebCrawler, cleaner: MarkdownCleaner, start_url: str, save_path: str,
+                 callback=None, clean_workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 incremental: bool = True, **crawl_kwargs) -> Dict[str, Any]:
+    """边爬取边清洗：爬虫每保存一个页面就通过有界队列交给清洗线程池
+
+    爬取在后台线程中运行，页面保存完成后放入队列；队列已满时爬取线程阻塞，
+    直到清洗线程取走页面，避免清洗跟不上时积压过多页面。清洗的第一个页面在爬取开始后
+    立即处理，两个阶段的耗时相互重叠。进度回调先放入事件队列，再由调用线程依次执行。
+
+    由于爬取结束前无法统计整个目录的重复行，预清洗只应用通用规则。增量模式下
+    内容未变化且已成功清洗的页面会被跳过，与clean_directory共用同一份清洗记录。
+    crawl_kwargs中提供store（CorpusStore）时页面从语料库读取，清洗结果写回语料库。
+
+    Args:
+        crawler: 爬虫实例
+        cleaner: 清洗器实例
+        start_url: 起始URL
+        save_path: Markdown文件保存目录，清洗结果也保存在该目录中
+        callback: 进度回调函数，接收(file_path, progress, message)参数
+        clean_workers: 清洗线程数，默认使用配置文件中的值
+        queue_size: 等待清洗的页面队列长度上限，默认使用配置文件中的值
+        incremental: 是否跳过未变化且已清洗的页面
+        crawl_kwargs: 传给WebCrawler.crawl的其他参数，例如concurrency
+
+    Returns:
+        统计字典：crawl为爬取统计，clean为清洗结果列表（(文件路径, 成功标志, 输出文件路径或错误信息)），
+        skipped为跳过的页面数，crawl_seconds、clean_seconds和overlap_seconds为两个阶段的耗时及重叠时长
+    """
+    pages = queue.Queue(maxsize=queue_size or PIPELINE_QUEUE_SIZE)
+    events = queue.Queue()
+    worker_callback = (lambda *args: events.put(args)) if callback else None
+    store = crawl_kwargs.get('store')
+    manifest = CleanManifest(save_path)
+    workers = clean_workers or PIPELINE_CLEAN_WORKERS
+
+    results: List[Tuple[str, bool, str]] = []
+    results_lock = threading.Lock()
+    timings = {'crawl_start': None, 'crawl_end': None, 'clean_start': None, 'clean_end': None}
+    summary = {'crawl': None, 'error': None, 'skipped': 0}
+
+    def on_page(file_path, status):
+        pages.put(file_path)  # 队列已满时阻塞爬取线程
+
+    def crawl():
+        timings['crawl_start'] = time.monotonic()
+        try:
+            summary['crawl'] = crawler.crawl(start_url, save_path, on_page=on_page, **crawl_kwargs)
+        except Exception as e:
+            summary['error'] = e
+        finally:
+            timings['crawl_end'] = time.monotonic()
+            for _ in range(workers):
+                pages.put(_DONE)
+            events.put('crawl_done')
+
+    def clean_page(file_path):
+        """清洗一个页面，返回结果；增量模式下未变化的页面返回None"""
+        if incremental and (store.url_is_cleaned(file_path) if store is not None
+                            else manifest.is_unchanged(file_path)):
+            return None
+        with results_lock:
+            if timings['clean_start'] is None:
+                timings['clean_start'] = time.monotonic()
+        if store is not None:
+            return cleaner.clean_store_page(store, file_path, worker_callback)
+        return cleaner.clean_manifest_file(manifest, file_path, worker_callback)
+
+    def clean():
+        try:
+            while True:
+                file_path = pages.get()
+                if file_path is _DONE:
+                    return
+                # 每个页面都必须得到结果，清洗线程异常退出会使队列填满、爬取线程永远阻塞
+                try:
+                    result = clean_page(file_path)
+                except Exception as e:
+                    result = (file_path, False, str(e))
+                with results_lock:
+                    if result is None:
+                        summary['skipped'] += 1
+                        continue
+                    results.append(result)
+                    timings['clean_end'] = time.monotonic()
+                events.put(1)
+        finally:
+            events.put('worker_done')
+
+    threads = [threading.Thread(target=crawl, daemon=True)]
+    threads += [threading.Thread(target=clean, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # 调用线程负责执行回调，直到爬取线程和所有清洗线程结束
+    running = len(threads)
+    cleaned = 0
+    try:
+        while running:
+            event = events.get()
+            if event in ('crawl_done', 'worker_done'):
+                running -= 1
+                if event == 'crawl_done' and callback:
+                    callback(save_path, -1 if summary['error'] else 50,
+                             f"爬取失败: {summary['error']}" if summary['error'] else "爬取完成，等待剩余页面清洗")
+            elif isinstance(event, tuple):
+                callback(*event)
+            else:
+                cleaned += event
+                if callback:
+                    callback(save_path, 50, f"已清洗 {cleaned} 个页面")
+    finally:
+        for thread in threads:
+            thread.join()
+        if store is not None:
+            store.commit()
+        else:
+            manifest.save()
+
+    if summary['error']:
+        raise summary['error']
+
+    if callback:
+        callback(save_path, 100, f"流水线完成，共清洗 {cleaned} 个页面，跳过 {summary['skipped']} 个未变化的页面")
+
+    crawl_seconds = timings['crawl_end'] - timings['crawl_start']
+    clean_seconds = overlap_seconds = 0.0
+    if timings['clean_start'] is not None:
+        clean_seconds = timings['clean_end'] - timings['clean_start']
+        overlap_seconds = max(0.0, min(timings['crawl_end'], timings['clean_end'])
+                              - max(timings['crawl_start'], timings['clean_start']))
+    return {
+        'crawl': summary['crawl'],
+        'clean': results,
+        'skipped': summary['skipped'],
+        'crawl_seconds': crawl_seconds,
+        'clean_seconds': clean_seconds,
+        'overlap_seconds': overlap_seconds,
+    }
@@ -0,0 +1,210 @@
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+from config import CRAWL_DEFAULT_DELAY, CRAWL_ROBOTS_MAX_BYTES, CRAWL_SITEMAP_MAX_BYTES, CRAWL_SITEMAP_MAX_URLS
+
+
+def _host_root(url):
+    parts = urlparse(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _get_limited(session, url, timeout, max_bytes):
+    """流式读取响应，最多读取max_bytes + 1字节，调用方据此判断响应是否超过上限
+
+    Returns:
+        (状态码, 响应体)
+    """
+    with session.get(url, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            return response.status_code, b''
+        chunks = []
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            received += len(chunk)
+            if received > max_bytes:
+                break
+        return response.status_code, b''.join(chunks)[:max_bytes + 1]
+
+
+def _gunzip_limited(body, max_bytes):
+    """解压gzip数据，解压后超过max_bytes时抛出ValueError，避免压缩炸弹占满内存"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"sitemap解压后超过 {max_bytes} 字节")
+    return data
+
+
+def _parse_crawl_delay(lines, user_agent):
+    """解析Crawl-delay，支持标准库RobotFileParser不接受的小数
+
+    优先使用名称包含在user_agent中的分组，其次是 * 分组。
+    """
+    delays = {}
+    agents = []
+    in_rules = False
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        key, value = (part.strip() for part in line.split(':', 1))
+        key = key.lower()
+        if key == 'user-agent':
+            if in_rules:
+                agents = []
+                in_rules = False
+            agents.append(value.lower())
+            continue
+        in_rules = True
+        if key == 'crawl-delay':
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            for agent in agents:
+                delays.setdefault(agent, delay)
+
+    name = user_agent.split('/')[0].lower()
+    for agent, delay in delays.items():
+        if agent != '*' and agent in name:
+            return delay
+    return delays.get('*')
+
+
+class RobotsPolicy:
+    """按主机缓存robots.txt规则，提供Disallow判断、Crawl-delay和Sitemap地址
+
+    robots.txt不存在或无法获取时视为允许全部爬取。
+    """
+
+    def __init__(self, session, timeout, user_agent='*'):
+        self.session = session
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self._parsers = {}
+        self._delays = {}
+        self._lock = threading.Lock()
+
+    def _parser(self, url):
+        root = _host_root(url)
+        with self._lock:
+            parser = self._parsers.get(root)
+        if parser is not None:
+            return parser
+
+        parser = RobotFileParser(urljoin(root, '/robots.txt'))
+        try:
+            # 与主流搜索引擎一样只读取前CRAWL_ROBOTS_MAX_BYTES字节，超出部分忽略
+            _, body = _get_limited(self.session, parser.url, self.timeout, CRAWL_ROBOTS_MAX_BYTES)
+            lines = body[:CRAWL_ROBOTS_MAX_BYTES].decode('utf-8', errors='replace').splitlines()
+        except Exception:
+            lines = []
+        parser.parse(lines)
+        with self._lock:
+            self._delays.setdefault(root, _parse_crawl_delay(lines, self.user_agent))
+            return self._parsers.setdefault(root, parser)
+
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """返回主机要求的两次请求之间的间隔(秒)，没有要求时返回None"""
+        parser = self._parser(url)
+        delay = self._delays.get(_host_root(url))
+        if delay is not None:
+            return delay
+        rate = parser.request_rate(self.user_agent)
+        if rate and rate.requests:
+            return rate.seconds / rate.requests
+        return None
+
+    def sitemaps(self, url):
+        """robots.txt中声明的Sitemap地址，没有声明时返回默认的/sitemap.xml"""
+        return self._parser(url).site_maps() or [urljoin(_host_root(url), '/sitemap.xml')]
+
+
+class HostScheduler:
+    """按主机安排请求时间：同一主机两次请求的开始时间至少间隔该主机的延迟
+
+    只由调度线程调用，不需要加锁。
+    """
+
+    def __init__(self, robots=None, default_delay=None):
+        """
+        Args:
+            robots: RobotsPolicy实例，提供时使用robots.txt中的Crawl-delay
+            default_delay: robots.txt没有要求时的默认间隔(秒)，如果为None则使用配置文件中的值
+        """
+        self.robots = robots
+        self.default_delay = CRAWL_DEFAULT_DELAY if default_delay is None else default_delay
+        self._delays = {}
+        self._next_time = {}
+
+    def delay(self, url):
+        host = urlparse(url).netloc
+        if host not in self._delays:
+            delay = self.robots.crawl_delay(url) if self.robots else None
+            self._delays[host] = max(delay or 0.0, self.default_delay)
+        return self._delays[host]
+
+    def ready_in(self, url):
+        """返回距离该URL的主机可以再次请求的秒数，0表示可以立即请求"""
+        return max(0.0, self._next_time.get(urlparse(url).netloc, 0.0) - time.monotonic())
+
+    def reserve(self, url):
+        """记录一次请求开始，推迟该主机的下一次请求"""
+        self._next_time[urlparse(url).netloc] = time.monotonic() + self.delay(url)
+
+
+def fetch_sitemap_urls(session, sitemap_url, timeout, max_urls=None, max_bytes=None):
+    """读取sitemap及sitemap索引中列出的页面URL
+
+    支持gzip压缩的sitemap，索引中的子sitemap按广度优先读取，每个sitemap只读取一次。
+    无法获取或解析的sitemap，以及下载或解压后超过max_bytes的sitemap会被忽略。
+
+    Args:
+        max_urls: 最多返回的URL数，如果为None则使用配置文件中的值
+        max_bytes: 单个sitemap的最大字节数，如果为None则使用配置文件中的值
+
+    Returns:
+        页面URL列表，最多max_urls个
+    """
+    max_urls = max_urls or CRAWL_SITEMAP_MAX_URLS
+    max_bytes = max_bytes or CRAWL_SITEMAP_MAX_BYTES
+    urls = []
+    pending = [sitemap_url]
+    seen = set()
+    while pending and len(urls) < max_urls:
+        current = pending.pop(0)
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            status_code, body = _get_limited(session, current, timeout, max_bytes)
+            if status_code != 200 or len(body) > max_bytes:
+                continue
+            if body[:2] == b'\x1f\x8b':
+                body = _gunzip_limited(body, max_bytes)
+            root = ET.fromstring(body)
+        except Exception:
+            continue
+
+        # 忽略XML命名空间，只看标签的本地名称
+        is_index = root.tag.rsplit('}', 1)[-1] == 'sitemapindex'
+        for element in root.iter():
+            if element.tag.rsplit('}', 1)[-1] != 'loc' or not element.text:
+                continue
+            loc = element.text.strip()
+            if is_index:
+                pending.append(loc)
+            else:
+                urls.append(loc)
+                if len(urls) >= max_urls:
+                    break
+    return urls
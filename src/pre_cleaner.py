@@ -0,0 +1,108 @@
+import re
+from collections import Counter
+from typing import Iterable, Optional, Set, Tuple
+
+from config import BOILERPLATE_MIN_DOCUMENTS, BOILERPLATE_MIN_RATIO
+from markdown_chunker import FENCE_PATTERN, HEADING_PATTERN, split_blocks
+from text_utils import estimate_tokens
+
+# 只包含页内锚点链接的行，例如 [¶](#section)、[跳到正文](#main)
+ANCHOR_ONLY_PATTERN = re.compile(r'^\s*([-*+]\s+)?(\[[^\]]*\]\(#[^)]*\)\s*)+$')
+# 链接文字为空的列表项或行，例如 * [](/path)
+EMPTY_LINK_PATTERN = re.compile(r'^\s*([-*+]\s+)?(\[\s*\]\([^)]*\)\s*)+$')
+# 空列表项
+EMPTY_ITEM_PATTERN = re.compile(r'^\s*[-*+]\s*$')
+# 表格和分隔线属于文档结构，即使在各页面重复也不删除
+STRUCTURAL_PATTERN = re.compile(r'^\s*(\||[-*_]{3,}\s*$)')
+
+
+def _normalize(line: str) -> str:
+    return ' '.join(line.split())
+
+
+def _is_candidate(line: str) -> bool:
+    """可以参与跨文档频率统计的行：非空、非标题、非表格或分隔线"""
+    return bool(line) and not HEADING_PATTERN.match(line) and not STRUCTURAL_PATTERN.match(line)
+
+
+class BoilerplateFilter:
+    """基于规则的本地预清洗，在调用API之前删除模板内容
+
+    通过统计同一次爬取的所有页面中每一行出现的文档数，找出在大量页面中重复的
+    导航菜单、页脚、Cookie提示等内容并删除；另外删除空链接列表和只有页内锚点的行。
+    代码块中的内容不会被修改。
+    """
+
+    def __init__(self, min_documents: Optional[int] = None, min_ratio: Optional[float] = None):
+        """
+        Args:
+            min_documents: 至少在多少个文档中重复出现的行才可能被删除，如果为None则使用配置文件中的值
+            min_ratio: 出现在超过该比例文档中的行被删除，如果为None则使用配置文件中的值
+        """
+        self.min_documents = min_documents or BOILERPLATE_MIN_DOCUMENTS
+        self.min_ratio = min_ratio or BOILERPLATE_MIN_RATIO
+        self.boilerplate: Set[str] = set()
+        self.document_count = 0
+
+    @staticmethod
+    def _candidate_lines(text: str) -> Set[str]:
+        lines = set()
+        for block in split_blocks(text):
+            if FENCE_PATTERN.match(block.lstrip('\n')):
+                continue
+            for line in block.splitlines():
+                normalized = _normalize(line)
+                if _is_candidate(normalized):
+                    lines.add(normalized)
+        return lines
+
+    def fit(self, documents: Iterable[str]) -> 'BoilerplateFilter':
+        """统计语料中每行出现的文档数，确定需要删除的重复行
+
+        Args:
+            documents: 同一站点的所有Markdown文档内容
+        """
+        counts = Counter()
+        self.document_count = 0
+        for text in documents:
+            counts.update(self._candidate_lines(text))
+            self.document_count += 1
+
+        threshold = max(self.min_documents, self.min_ratio * self.document_count)
+        self.boilerplate = {line for line, count in counts.items() if count >= threshold}
+        return self
+
+    def fit_files(self, file_paths: Iterable[str]) -> 'BoilerplateFilter':
+        """从文件读取语料并统计，无法读取的文件会被忽略"""
+        def read_all():
+            for file_path in file_paths:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        yield f.read()
+                except (OSError, UnicodeDecodeError):
+                    continue
+        return self.fit(read_all())
+
+    def _drop_line(self, line: str) -> bool:
+        normalized = _normalize(line)
+        if not normalized:
+            return False
+        if ANCHOR_ONLY_PATTERN.match(line) or EMPTY_LINK_PATTERN.match(line) or EMPTY_ITEM_PATTERN.match(line):
+            return True
+        return normalized in self.boilerplate
+
+    def clean(self, text: str) -> Tuple[str, int]:
+        """删除模板内容
+
+        Returns:
+            (预清洗后的文本, 估算减少的令牌数)
+        """
+        kept = []
+        for block in split_blocks(text):
+            if FENCE_PATTERN.match(block.lstrip('\n')):
+                kept.append(block)
+                continue
+            kept.append(''.join(line for line in block.splitlines(keepends=True) if not self._drop_line(line)))
+
+        cleaned = re.sub(r'\n{3,}', '\n\n', ''.join(kept))
+        return cleaned, max(0, estimate_tokens(text) - estimate_tokens(cleaned))
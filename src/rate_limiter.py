@@ -0,0 +1,166 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+class TokenBucket:
+    """线程安全的令牌桶
+
+    桶容量为capacity，每秒补充refill_rate个令牌。令牌不足时允许透支，
+    调用方按透支量等待，这样并发请求会按到达顺序依次排队，而不是同时重试。
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """取出amount个令牌，必要时阻塞等待
+
+        Returns:
+            实际等待的秒数
+        """
+        # 单次请求超过桶容量时按容量计算，否则永远无法满足
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+            self.updated_at = now
+            self.tokens -= amount
+            deficit = -self.tokens
+
+        wait_time = deficit / self.refill_rate if deficit > 0 else 0.0
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+class RateLimiter:
+    """按每分钟请求数和每分钟令牌数限制API调用速率"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        """
+        Args:
+            requests_per_minute: 每分钟最大请求数，None表示不限制
+            tokens_per_minute: 每分钟最大令牌数，None表示不限制
+        """
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute else None
+
+    def acquire(self, tokens: int = 0) -> float:
+        """在发送请求前调用，阻塞到请求数和令牌数都在限额内
+
+        Args:
+            tokens: 本次请求预计消耗的令牌数
+
+        Returns:
+            等待的总秒数
+        """
+        waited = 0.0
+        if self.request_bucket:
+            waited += self.request_bucket.acquire(1)
+        if self.token_bucket and tokens:
+            waited += self.token_bucket.acquire(tokens)
+        return waited
+
+
+class AdaptiveConcurrency:
+    """按AIMD（加性增、乘性减）自适应调整的共享并发上限
+
+    所有清洗线程在发送请求前取得一个并发名额。收到429时并发上限减半，
+    并在服务端要求的等待时间内暂停发放名额；连续成功的请求数达到当前上限后，
+    并发上限加一。这样在限额内尽量提高吞吐，限额变化时也能自动跟随。
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None, cooldown: float = 1.0):
+        """
+        Args:
+            initial: 初始并发上限
+            minimum: 并发上限的最小值
+            maximum: 并发上限的最大值，None表示等于初始值
+            cooldown: 两次减半之间的最短间隔(秒)，避免同一波并发请求的多个429连续减半
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(maximum or initial, self.minimum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.cooldown = cooldown
+        self.active = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._decreased_at = float('-inf')
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """阻塞到有空闲名额且不在暂停期内
+
+        Returns:
+            实际等待的秒数
+        """
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self.active < self.limit:
+                    self.active += 1
+                    return time.monotonic() - started
+                else:
+                    self._condition.wait()
+
+    def release(self):
+        """归还名额"""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def record_success(self):
+        """请求成功：连续成功数达到当前上限后上限加一"""
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def record_rate_limit(self, retry_after: Optional[float] = None):
+        """收到429：上限减半，并在retry_after秒内暂停发放名额"""
+        with self._condition:
+            now = time.monotonic()
+            self._successes = 0
+            if now - self._decreased_at >= self.cooldown:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._decreased_at = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """从响应头解析服务端要求的等待秒数
+
+    优先使用毫秒精度的retry-after-ms，其次是retry-after（秒数或HTTP日期）。
+    无法解析时返回None。
+    """
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResultCache:
+    """保存在本地磁盘的API结果缓存
+
+    以请求内容的哈希为键，总大小超过上限时按最近最少使用（LRU）淘汰。
+    数据库在第一次使用时才打开，多个线程共享同一个连接。
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        """
+        Args:
+            path: SQLite缓存文件路径
+            max_bytes: 缓存内容的总大小上限（字节）
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """根据请求的各组成部分计算缓存键"""
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中时返回None"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """写入缓存，超出大小上限时淘汰最久未使用的条目"""
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                         (key, value, size, time.time()))
+            self._total_bytes += size - (old[0] if old else 0)
+
+            while self._total_bytes > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 100").fetchall()
+                for evict_key, evict_size in rows:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (evict_key,))
+                    self._total_bytes -= evict_size
+                    if self._total_bytes <= self.max_bytes:
+                        break
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
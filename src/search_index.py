@@ -0,0 +1,229 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import CLEANED_FILE_PREFIX, SEARCH_INDEX_FILE, SEARCH_MMAP_BYTES
+from markdown_chunker import HEADING_PATTERN, split_blocks
+from text_utils import CJK_RANGES
+
+# 连续的中日韩字符，或不含中日韩字符的单词
+TOKEN_PATTERN = re.compile(f'[{CJK_RANGES}]+|[^\\W{CJK_RANGES}]+')
+CJK_RUN_PATTERN = re.compile(f'[{CJK_RANGES}]+')
+
+
+def _bigrams(run: str) -> List[str]:
+    """中日韩文字没有空格分词，按相邻两个字符切分；单个字符保留为一个词"""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: str) -> str:
+    """把文本转换为以空格分隔的索引词，中日韩文字按二元组切分，其他文字按单词切分并转为小写"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        piece = match.group(0)
+        if CJK_RUN_PATTERN.fullmatch(piece):
+            tokens.extend(_bigrams(piece))
+        else:
+            tokens.append(piece.lower())
+    return ' '.join(tokens)
+
+
+def build_query(query: str) -> Optional[str]:
+    """把用户输入转换为FTS5查询：每个词都必须出现，中日韩词组按相邻二元组组成短语
+
+    所有词都加引号，用户输入中的FTS5语法字符不会引起查询错误。
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(query):
+        piece = match.group(0)
+        if CJK_RUN_PATTERN.fullmatch(piece):
+            if len(piece) == 1:
+                terms.append(f'"{piece}"*')  # 单个汉字匹配以它开头的二元组
+            else:
+                terms.append('"' + ' '.join(_bigrams(piece)) + '"')
+        else:
+            terms.append(f'"{piece.lower()}"')
+    return ' '.join(terms) or None
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """按标题把Markdown文档切分为(标题, 正文)段落，代码块中的 # 行不会被当作标题"""
+    sections = []
+    heading = ''
+    body = []
+    for block in split_blocks(text):
+        stripped = block.lstrip('\n')
+        if HEADING_PATTERN.match(stripped):
+            if heading or ''.join(body).strip():
+                sections.append((heading, ''.join(body).strip()))
+            first_line, _, rest = stripped.partition('\n')
+            heading = first_line.strip().lstrip('#').strip()
+            body = [rest]
+        else:
+            body.append(block)
+    if heading or ''.join(body).strip():
+        sections.append((heading, ''.join(body).strip()))
+    return sections
+
+
+def _snippet(text: str, query: str, width: int = 80) -> str:
+    """从正文中截取包含第一个查询词的片段"""
+    lowered = text.lower()
+    position = -1
+    for match in TOKEN_PATTERN.finditer(query):
+        position = lowered.find(match.group(0).lower())
+        if position >= 0:
+            break
+    start = max(0, position - width // 2) if position >= 0 else 0
+    snippet = ' '.join(text[start:start + width].split())
+    return ('...' if start > 0 else '') + snippet + ('...' if start + width < len(text) else '')
+
+
+class SearchIndex:
+    """清洗结果的本地全文索引
+
+    使用SQLite FTS5按BM25排序，每个标题段落是一条索引记录，标题的权重高于正文。
+    中日韩文字按二元组索引，FTS表不保存原文，只保存倒排索引。索引文件通过内存映射读取，
+    文件按大小和修改时间增量更新。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 索引文件路径；传入目录时使用该目录中的默认索引文件
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, SEARCH_INDEX_FILE)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA mmap_size={SEARCH_MMAP_BYTES}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, size INTEGER, mtime REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            "id INTEGER PRIMARY KEY, doc_id INTEGER NOT NULL, position INTEGER NOT NULL, "
+            "heading TEXT NOT NULL, body TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sections_doc ON sections (doc_id)")
+        # 原文保存在sections表中，FTS表不再保存一份索引词文本
+        self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5(heading, body, content='')")
+        self.conn.commit()
+
+    def add_document(self, key: str, text: str, size: Optional[int] = None, mtime: Optional[float] = None):
+        """索引一个文档，已存在的同名文档会被替换（不提交事务）"""
+        with self._lock:
+            self._remove(key)
+            doc_id = self.conn.execute(
+                "INSERT INTO documents (key, size, mtime) VALUES (?, ?, ?)", (key, size, mtime)
+            ).lastrowid
+            for position, (heading, body) in enumerate(split_sections(text)):
+                section_id = self.conn.execute(
+                    "INSERT INTO sections (doc_id, position, heading, body) VALUES (?, ?, ?, ?)",
+                    (doc_id, position, heading, body)
+                ).lastrowid
+                self.conn.execute("INSERT INTO sections_fts (rowid, heading, body) VALUES (?, ?, ?)",
+                                  (section_id, tokenize(heading), tokenize(body)))
+
+    def remove_document(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        row = self.conn.execute("SELECT id FROM documents WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        # 无内容FTS表删除记录时需要提供原来的索引词
+        sections = [(section_id, tokenize(heading), tokenize(body)) for section_id, heading, body in
+                    self.conn.execute("SELECT id, heading, body FROM sections WHERE doc_id = ?", (row[0],))]
+        self.conn.executemany("INSERT INTO sections_fts (sections_fts, rowid, heading, body) "
+                              "VALUES ('delete', ?, ?, ?)", sections)
+        self.conn.execute("DELETE FROM sections WHERE doc_id = ?", (row[0],))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+
+    def update_directory(self, dir_path: str, callback=None) -> Dict[str, int]:
+        """增量索引目录中的清洗结果文件（CLEANED_FILE_PREFIX开头的Markdown文件）
+
+        大小和修改时间都没有变化的文件跳过，已删除的文件从索引中移除。
+
+        Args:
+            dir_path: 清洗输出目录
+            callback: 进度回调函数，接收(file_path, progress, message)参数
+
+        Returns:
+            统计字典：added、updated、removed、unchanged为文件数
+        """
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        with self._lock:
+            known = {key: (size, mtime) for key, size, mtime in
+                     self.conn.execute("SELECT key, size, mtime FROM documents")}
+
+        found = set()
+        for root, _, files in os.walk(dir_path):
+            for file in files:
+                if not (file.startswith(CLEANED_FILE_PREFIX) and file.lower().endswith(('.md', '.markdown'))):
+                    continue
+                file_path = os.path.join(root, file)
+                key = os.path.relpath(file_path, dir_path).replace(os.sep, '/')
+                found.add(key)
+                stat = os.stat(file_path)
+                if known.get(key) == (stat.st_size, stat.st_mtime):
+                    stats['unchanged'] += 1
+                    continue
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        text = f.read()
+                except (OSError, UnicodeDecodeError):
+                    continue
+                self.add_document(key, text, stat.st_size, stat.st_mtime)
+                stats['updated' if key in known else 'added'] += 1
+                if callback and (stats['added'] + stats['updated']) % 100 == 0:
+                    callback(dir_path, 50, f"已索引 {stats['added'] + stats['updated']} 个文件")
+
+        for key in set(known) - found:
+            self.remove_document(key)
+            stats['removed'] += 1
+        self.commit()
+        if callback:
+            callback(dir_path, 100, f"索引更新完成：新增 {stats['added']}，更新 {stats['updated']}，"
+                                    f"删除 {stats['removed']}，未变化 {stats['unchanged']}")
+        return stats
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """按BM25相关度返回匹配的段落
+
+        Returns:
+            结果列表，每项包含key（文档）、heading（段落标题）、snippet（正文片段）和score（越小越相关）
+        """
+        match = build_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT documents.key, sections.heading, sections.body, bm25(sections_fts, 2.0, 1.0) AS score "
+                "FROM sections_fts JOIN sections ON sections.id = sections_fts.rowid "
+                "JOIN documents ON documents.id = sections.doc_id "
+                "WHERE sections_fts MATCH ? ORDER BY score LIMIT ?", (match, limit)
+            ).fetchall()
+        return [{'key': key, 'heading': heading, 'snippet': _snippet(body, query), 'score': score}
+                for key, heading, body, score in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
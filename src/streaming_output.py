@@ -0,0 +1,124 @@
+import os
+import threading
+from typing import Optional
+
+
+class StreamingOutput:
+    """将流式API输出增量写入临时文件，完成后重命名为输出文件
+
+    长文档分块并发清洗时，各片段的输出按片段顺序写入：当前片段的增量直接写入文件，
+    后面片段的增量先缓存在内存中，前面的片段完成后再依次写入。
+    调用失败时保留已写入的部分结果。
+    """
+
+    PARTIAL_SUFFIX = '.partial'
+
+    def __init__(self, output_path: str, separator: str = '\n\n'):
+        """
+        Args:
+            output_path: 最终输出文件路径
+            separator: 片段之间的分隔符
+        """
+        self.output_path = output_path
+        self.tmp_path = output_path + self.PARTIAL_SUFFIX
+        self.separator = separator.encode('utf-8')
+        self._file = open(self.tmp_path, 'wb')
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._checkpoints = {}
+        self._finished = set()
+        self._head = 0
+        self._head_start = 0
+        self.received_chars = 0
+
+    def part(self, index: int) -> 'StreamPart':
+        """返回第index个片段（从0开始）的写入句柄"""
+        return StreamPart(self, index)
+
+    def write(self, index: int, text: str):
+        data = text.encode('utf-8')
+        with self._lock:
+            self.received_chars += len(text)
+            if index == self._head:
+                self._file.write(data)
+                self._file.flush()
+            else:
+                self._buffers.setdefault(index, []).append(data)
+
+    def checkpoint(self, index: int):
+        """将片段当前已写入的内容标记为已确认，之后的reset只丢弃检查点之后的内容"""
+        with self._lock:
+            if index == self._head:
+                self._checkpoints[index] = self._file.tell() - self._head_start
+            else:
+                self._checkpoints[index] = sum(len(data) for data in self._buffers.get(index, []))
+
+    def reset(self, index: int):
+        """丢弃片段在上一个检查点之后写入的内容，用于请求失败后重试"""
+        with self._lock:
+            keep = self._checkpoints.get(index, 0)
+            if index == self._head:
+                self._file.seek(self._head_start + keep)
+                self._file.truncate()
+            else:
+                data = b''.join(self._buffers.get(index, []))[:keep]
+                self._buffers[index] = [data] if data else []
+
+    def finish_part(self, index: int):
+        """标记片段完成，并写入排在它后面且已缓存的片段"""
+        with self._lock:
+            self._finished.add(index)
+            while self._head in self._finished:
+                self._head += 1
+                self._file.write(self.separator)
+                self._head_start = self._file.tell()
+                self._file.write(b''.join(self._buffers.pop(self._head, [])))
+            self._file.flush()
+
+    def commit(self, content: Optional[str] = None) -> str:
+        """所有片段完成后将临时文件重命名为输出文件
+
+        Args:
+            content: 规范化后的完整结果（去掉片段首尾空白并拼接），给出时用它替换增量写入的内容，
+                保证输出文件与非流式模式逐字节相同
+        """
+        with self._lock:
+            # 去掉最后一个片段之后多写的分隔符
+            self._file.seek(self._head_start - len(self.separator))
+            self._file.truncate()
+            self._file.close()
+        if content is not None:
+            with open(self.tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        os.replace(self.tmp_path, self.output_path)
+        return self.output_path
+
+    def abort(self) -> Optional[str]:
+        """调用失败时关闭文件，有部分结果时保留并返回其路径"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        if os.path.getsize(self.tmp_path) > 0:
+            return self.tmp_path
+        os.remove(self.tmp_path)
+        return None
+
+
+class StreamPart:
+    """单个片段的写入句柄"""
+
+    def __init__(self, output: StreamingOutput, index: int):
+        self.output = output
+        self.index = index
+
+    def write(self, text: str):
+        self.output.write(self.index, text)
+
+    def checkpoint(self):
+        self.output.checkpoint(self.index)
+
+    def reset(self):
+        self.output.reset(self.index)
+
+    def finish(self):
+        self.output.finish_part(self.index)
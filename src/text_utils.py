@@ -0,0 +1,18 @@
+import math
+import re
+
+# 中日韩字符（汉字、假名、谚文）
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+CJK_PATTERN = re.compile(f'[{CJK_RANGES}]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的令牌数
+
+    按DeepSeek文档给出的经验值：1个中文字符约0.6个令牌，1个英文字符约0.3个令牌。
+    只用于限流和分块预算，不需要精确。
+    """
+    if not text:
+        return 0
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return math.ceil(cjk_count * 0.6 + (len(text) - cjk_count) * 0.3)
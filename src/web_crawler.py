@@ -1,17 +1,139 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
 from urllib.parse import urljoin, urlparse
 import html2text
+import hashlib
 import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import (
+    CRAWL_DEDUP_MAX_DISTANCE,
+    CRAWL_MAX_DEPTH,
+    CRAWL_PER_HOST_LIMIT,
+    CRAWL_POOL_SIZE,
+    CRAWL_CONNECT_TIMEOUT,
+    CRAWL_READ_TIMEOUT,
+    CRAWL_SKIP_EXTENSIONS,
+    CRAWL_HTML_CONTENT_TYPES,
+    CRAWL_MAX_PAGE_BYTES,
+    CRAWL_RESPECT_ROBOTS,
+    CRAWL_USE_SITEMAP
+)
+from crawl_state import CrawlFrontier
+from dedup import DuplicateIndex, canonicalize_url, simhash
+from metrics import timed
+from politeness import HostScheduler, RobotsPolicy, fetch_sitemap_urls
+
+
+# <meta charset="..."> 或 <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+class SkippedPage(Exception):
+    """页面不是HTML或超过大小限制，不转换也不保存"""
+
+
+class LinkCollectingConverter(html2text.HTML2Text):
+    """在html2text转换Markdown的同一次解析中收集<a>标签的href，避免为提取链接再解析一遍HTML"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hrefs = []
+
+    def handle(self, data):
+        self.hrefs = []
+        return super().handle(data)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.hrefs.append(href)
+        super().handle_starttag(tag, attrs)
+
+
+def create_converter():
+    """创建保持代码格式和链接的html2text转换器"""
+    converter = LinkCollectingConverter()
+    converter.ignore_links = False
+    converter.body_width = 0
+    converter.protect_links = True
+    converter.mark_code = True
+    return converter
+
+
+_process_converter = None
+
+
+def convert_html(html):
+    """在进程池中执行的转换函数，返回(Markdown内容, 页面中的原始href列表, 转换耗时)
+
+    链接的同域名过滤在主进程中完成，这样子类重写的is_valid_url仍然生效。
+    """
+    global _process_converter
+    if _process_converter is None:
+        _process_converter = create_converter()
+    began = time.perf_counter()
+    markdown_content = _process_converter.handle(html)
+    return markdown_content, _process_converter.hrefs, time.perf_counter() - began
+
 
 class WebCrawler:
-    def __init__(self):
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None, include_patterns=None,
+                 exclude_patterns=None, max_page_bytes=None, metrics=None):
+        """初始化爬虫
+
+        Args:
+            pool_size: HTTP连接池大小，如果为None则使用配置文件中的值
+            connect_timeout: 建立连接超时时间(秒)，如果为None则使用配置文件中的值
+            read_timeout: 读取响应超时时间(秒)，如果为None则使用配置文件中的值
+            include_patterns: 正则表达式列表，提供时只爬取匹配其中之一的URL（起始URL除外）
+            exclude_patterns: 正则表达式列表，匹配其中之一的URL不会被爬取
+            max_page_bytes: 单个页面的最大字节数，如果为None则使用配置文件中的值
+            metrics: Metrics实例，提供时记录每个页面fetch、decode、convert、dedup、write各阶段的耗时和字节数
+        """
         self.visited_urls = set()
-        self.converter = html2text.HTML2Text()
-        self.converter.ignore_links = False
-        self.converter.body_width = 0
-        self.converter.protect_links = True
-        self.converter.mark_code = True
+        self.include_patterns = [re.compile(pattern) for pattern in include_patterns or ()]
+        self.exclude_patterns = [re.compile(pattern) for pattern in exclude_patterns or ()]
+        self.max_page_bytes = max_page_bytes or CRAWL_MAX_PAGE_BYTES
+        self.metrics = metrics
+        self._on_page = None  # 爬取期间的页面完成回调
+        self._callback = None  # 爬取期间的进度回调
+        self._cancel_event = None  # 爬取期间的取消标志
+        self._duplicates = None  # 爬取期间的重复内容索引
+        self._robots = None  # 爬取期间的robots.txt规则
+        self._scheduler = None  # 爬取期间的按主机请求间隔
+        self._store = None  # 爬取期间的语料库
+        self.timeout = (connect_timeout or CRAWL_CONNECT_TIMEOUT, read_timeout or CRAWL_READ_TIMEOUT)
+
+        # 复用长连接的会话，避免每个页面重新进行TCP和TLS握手
+        self.session = requests.Session()
+        # 安装了brotli时包含br
+        self.session.headers['Accept-Encoding'] = DEFAULT_ACCEPT_ENCODING
+        self.session.headers['Connection'] = 'keep-alive'
+        self.pool_size = 0
+        self._mount_adapters(pool_size or CRAWL_POOL_SIZE)
+
+        self.converter = self._create_converter()
+        # html2text的转换器带有解析状态，并发模式下每个工作线程使用独立实例
+        self._local = threading.local()
+
+    def _mount_adapters(self, pool_size):
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_size = pool_size
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+    def _create_converter(self):
+        return create_converter()
 
     def is_valid_url(self, url, base_url):
         # 确保URL属于同一域名
@@ -19,50 +141,471 @@ class WebCrawler:
         url_domain = urlparse(url).netloc
         return base_domain == url_domain
 
-    def extract_urls(self, html, base_url):
-        soup = BeautifulSoup(html, 'html.parser')
+    def should_crawl(self, url):
+        """按扩展名和包含/排除规则判断URL是否值得下载，在请求之前过滤图片、压缩包等非HTML资源"""
+        if urlparse(url).path.lower().endswith(CRAWL_SKIP_EXTENSIONS):
+            return False
+        if any(pattern.search(url) for pattern in self.exclude_patterns):
+            return False
+        return not self.include_patterns or any(pattern.search(url) for pattern in self.include_patterns)
+
+    def _resolve_links(self, hrefs, base_url, page_url=None):
+        """将href解析为要爬取的规范化URL
+
+        Args:
+            base_url: 解析相对链接的基准URL，应为重定向后的实际页面地址（未规范化）
+            page_url: 判断是否同域名的页面URL，默认与base_url相同
+        """
         urls = set()
-        for link in soup.find_all('a'):
-            href = link.get('href')
-            if href:
-                absolute_url = urljoin(base_url, href)
-                if self.is_valid_url(absolute_url, base_url):
-                    urls.add(absolute_url)
+        for href in hrefs:
+            absolute_url = canonicalize_url(urljoin(base_url, href))
+            if absolute_url.startswith(('http://', 'https://')) \
+                    and self.is_valid_url(absolute_url, page_url or base_url) and self.should_crawl(absolute_url):
+                urls.add(absolute_url)
         return urls
 
+    def extract_urls(self, html, base_url):
+        # 爬取时链接由convert_page在转换的同时收集，只有单独提取链接时才需要BeautifulSoup
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        return self._resolve_links((link.get('href') for link in soup.find_all('a') if link.get('href')), base_url)
+
+    def _get_converter(self):
+        if threading.current_thread() is threading.main_thread():
+            return self.converter
+        converter = getattr(self._local, 'converter', None)
+        if converter is None:
+            converter = self._local.converter = self._create_converter()
+        return converter
+
     def html_to_markdown(self, html):
         # 转换HTML到Markdown，保持代码格式
-        return self.converter.handle(html)
+        return self._get_converter().handle(html)
+
+    def convert_page(self, html, base_url, page_url=None):
+        """只解析一次HTML，同时得到Markdown内容和页面中的同域名子URL
+
+        结果与分别调用html_to_markdown和extract_urls相同，但省去了BeautifulSoup的第二次解析。
+
+        Args:
+            base_url: 解析相对链接的基准URL，参见_resolve_links
+            page_url: 判断是否同域名的页面URL，默认与base_url相同
+
+        Returns:
+            (Markdown内容, 子URL集合)
+        """
+        converter = self._get_converter()
+        markdown_content = converter.handle(html)
+        return markdown_content, self._resolve_links(converter.hrefs, base_url, page_url)
+
+    def _save_markdown(self, url, markdown_content, save_path, info=None):
+        # 使用语料库时写入语料库，以URL代替文件路径
+        with timed(self.metrics, 'write', url=url, bytes_out=len(markdown_content.encode('utf-8'))):
+            if self._store is not None:
+                self._store.put_page(url, markdown_content, info)
+                return url
+            # 保存Markdown文件
+            filename = f"{urlparse(url).path.strip('/').replace('/', '_') or 'index'}.md"
+            file_path = os.path.join(save_path, filename)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(f"# {url}\n\n")
+                f.write(markdown_content)
+            return file_path
+
+    def _fetch_page(self, url, save_path, headers=None, cookies=None, validators=None, convert=True):
+        """抓取并保存单个页面（在工作线程中执行）
 
-    def crawl(self, start_url, save_path, headers=None, cookies=None):
+        如果提供了上次爬取保存的校验信息，会发送条件请求；服务器返回304或页面内容
+        哈希未变化时跳过Markdown转换和文件写入。响应以流式方式读取，Content-Type不是HTML
+        或响应体超过大小限制时立即停止下载。
+
+        Args:
+            convert: 为False时不转换和保存页面，而是在返回值的html中带回页面内容，
+                由调用方交给进程池转换
+
+        Returns:
+            页面信息字典，包含status（new/changed/unchanged/duplicate/skipped）、links以及新的校验信息
+        """
+        request_headers = dict(headers or {})
+        if validators:
+            if validators.get('etag'):
+                request_headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                request_headers['If-Modified-Since'] = validators['last_modified']
+
+        try:
+            with timed(self.metrics, 'fetch', url=url) as fetch, \
+                    self.session.get(url, headers=request_headers, cookies=cookies, timeout=self.timeout,
+                                     stream=True) as response:
+                fetch['status_code'] = response.status_code
+                if validators and response.status_code == 304:
+                    return dict(validators, status='unchanged')
+                response.raise_for_status()
+                body = self._read_body(response)
+                fetch['bytes_in'] = len(body)
+        except SkippedPage as e:
+            return {'status': 'skipped', 'reason': str(e), 'file_path': None, 'links': []}
+
+        info = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': hashlib.sha256(body).hexdigest(),
+        }
+        if validators and info['content_hash'] == validators.get('content_hash'):
+            # 内容未变化，页面链接也不会变化
+            info.update(status='unchanged', file_path=validators['file_path'], links=validators['links'],
+                        simhash=validators.get('simhash'))
+            return info
+
+        if self._duplicates:
+            # 与其他URL的页面字节完全相同，无需转换
+            duplicate_of = self._duplicates.find_exact(info['content_hash'], url)
+            if duplicate_of:
+                info.update(status='duplicate', duplicate_of=duplicate_of, file_path=None, links=[])
+                return info
+
+        info['status'] = 'changed' if validators else 'new'
+        with timed(self.metrics, 'decode', url=url):
+            html = self._decode_body(response, body)
+        if not convert:
+            info['html'] = html
+            info['base_url'] = response.url
+            return info
+
+        # 转换内容为Markdown并提取子URL，相对链接按重定向后的实际地址解析
+        with timed(self.metrics, 'convert', url=url):
+            markdown_content, info['links'] = self.convert_page(html, response.url, url)
+        if not self._is_duplicate(url, markdown_content, info):
+            info['file_path'] = self._save_markdown(url, markdown_content, save_path, info)
+        return info
+
+    def _read_body(self, response):
+        """先检查响应头再分块读取响应体，非HTML或超过大小限制时抛出SkippedPage并停止下载"""
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in CRAWL_HTML_CONTENT_TYPES:
+            raise SkippedPage(f"不是HTML页面: {content_type}")
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > self.max_page_bytes:
+            raise SkippedPage(f"页面过大: {content_length} 字节")
+
+        chunks = []
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            received += len(chunk)
+            if received > self.max_page_bytes:
+                raise SkippedPage(f"页面超过 {self.max_page_bytes} 字节")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _decode_body(self, response, body):
+        """按响应头、页面中的<meta charset>的顺序确定编码，都没有时使用UTF-8
+
+        requests在响应头没有charset时对text/html默认使用ISO-8859-1，会把UTF-8的中文页面解码成乱码。
+        """
+        encoding = None
+        if 'charset=' in response.headers.get('Content-Type', '').lower():
+            encoding = response.encoding
+        if not encoding:
+            match = META_CHARSET_PATTERN.search(body[:4096])
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            return body.decode(encoding, errors='replace')
+        except LookupError:
+            return body.decode('utf-8', errors='replace')
+
+    def _is_duplicate(self, url, markdown_content, info):
+        """检查转换后的内容是否与已保存的页面完全相同或近似，重复时将info标记为duplicate，否则登记该页面"""
+        if not self._duplicates:
+            return False
+        with timed(self.metrics, 'dedup', url=url):
+            # 不做近似去重时不计算指纹，SimHash比转换Markdown还慢，而且在调度线程中执行
+            info['simhash'] = simhash(markdown_content) if self._duplicates.max_distance else None
+            duplicate_of = self._duplicates.check_and_add(url, info['content_hash'], info['simhash'])
+        if duplicate_of is None:
+            return False
+        info.update(status='duplicate', duplicate_of=duplicate_of, file_path=None)
+        return True
+
+    def _validators(self, frontier, url):
+        """返回可用于条件请求的校验信息，输出文件（或语料库中的记录）已被删除时返回None以重新下载"""
+        info = frontier.page_info(url)
+        if not info or not info.get('file_path'):
+            return None
+        if self._store is not None:
+            return info if info['file_path'] in self._store else None
+        return info if os.path.exists(info['file_path']) else None
+
+    def crawl(self, start_url, save_path, headers=None, cookies=None, concurrency=1, per_host_limit=None,
+              process_workers=0, on_page=None, dedup=True, respect_robots=None, use_sitemap=None, delay=None, store=None,
+              callback=None, cancel_event=None, dedup_distance=None):
+        """从起始URL开始爬取同域名页面，每个页面保存为一个Markdown文件或语料库中的一条记录
+
+        爬取状态保存在输出目录中，中断后使用相同的起始URL和输出目录再次调用会继续爬取。
+
+        Args:
+            start_url: 起始URL
+            save_path: Markdown文件保存目录
+            headers: 请求头
+            cookies: 请求cookies
+            concurrency: 同时抓取的页面数，大于1时启用并发爬取
+            per_host_limit: 并发模式下每个主机的最大同时连接数，默认使用配置文件中的值
+            process_workers: 大于0时将Markdown转换和链接提取交给该数量的子进程执行，
+                主进程只负责网络请求和文件写入，使转换速度可以随CPU核数扩展
+            on_page: 每个页面保存完成后调用，接收(file_path, status)参数，status为new、changed或unchanged；
+                在爬取线程中同步执行，阻塞时爬取也会暂停
+            dedup: 是否跳过与已保存页面内容相同的页面（URL本身总是会被规范化后再去重）
+            respect_robots: 是否遵守robots.txt的Disallow规则和Crawl-delay，默认使用配置文件中的值
+            use_sitemap: 是否在开始时读取sitemap（及sitemap索引）中位于起始URL所在目录下的同域名URL加入队列，
+                默认使用配置文件中的值
+            delay: robots.txt没有要求时同一主机两次请求之间的最小间隔(秒)，默认使用配置文件中的值
+            store: CorpusStore实例，提供时页面写入该语料库而不是save_path中的文件，
+                save_path只用于保存爬取状态；此时on_page和changed_files中的文件路径为页面URL
+            callback: 进度回调函数，接收(url, progress, message)参数，每完成一个页面调用一次；
+                progress按已完成和队列中的URL数估算，爬取结束时为100
+            cancel_event: threading.Event，设置后不再抓取新页面，等待进行中的请求完成后返回；
+                爬取状态保留，之后使用相同的起始URL和输出目录可以继续爬取
+            dedup_distance: 大于0时还跳过SimHash指纹汉明距离不超过该值的近似重复页面，默认使用配置文件中的值（0）；
+                指纹包含导航和页脚，导航较大的网站上不同页面也可能被判为近似重复，清洗阶段的去重会先去掉这些内容
+
+        Returns:
+            本次爬取的统计字典：new、changed、unchanged、duplicate、skipped、failed为页面数，
+            skipped为非HTML或超过大小限制的页面，disallowed为robots.txt禁止爬取的URL数，
+            seeded为从sitemap加入队列的URL数，changed_files为新增或内容变化的Markdown文件路径列表，
+            cancelled表示爬取是否被取消
+        """
         if not os.path.exists(save_path):
             os.makedirs(save_path)
 
-        def crawl_url(url, depth=0):
-            if url in self.visited_urls or depth > 5:  # 限制爬取深度
-                return
+        if concurrency > self.pool_size:
+            # 连接池小于并发数时多余的连接会被丢弃，无法复用
+            self._mount_adapters(concurrency)
 
-            try:
-                response = requests.get(url, headers=headers, cookies=cookies)
-                response.raise_for_status()
-                self.visited_urls.add(url)
+        stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'duplicate': 0, 'skipped': 0, 'failed': 0,
+                 'disallowed': 0, 'seeded': 0, 'changed_files': [], 'cancelled': False}
+        self._on_page = on_page
+        self._callback = callback
+        self._cancel_event = cancel_event
+        self._store = store
+        start_url = canonicalize_url(start_url)
+        frontier = CrawlFrontier(save_path)
+        try:
+            frontier.begin(start_url)
+            self.visited_urls = set(frontier.visited)
+            if dedup:
+                # 之前爬取保存的页面也参与去重
+                self._duplicates = DuplicateIndex(
+                    CRAWL_DEDUP_MAX_DISTANCE if dedup_distance is None else dedup_distance)
+                for url, content_hash, fingerprint in frontier.fingerprints():
+                    self._duplicates.add(url, content_hash, fingerprint)
 
-                # 转换内容为Markdown
-                markdown_content = self.html_to_markdown(response.text)
+            if CRAWL_RESPECT_ROBOTS if respect_robots is None else respect_robots:
+                user_agent = (headers or {}).get('User-Agent') or self.session.headers.get('User-Agent', '*')
+                self._robots = RobotsPolicy(self.session, self.timeout, user_agent)
+            self._scheduler = HostScheduler(self._robots, delay)
+            if not frontier.resumed and (CRAWL_USE_SITEMAP if use_sitemap is None else use_sitemap):
+                stats['seeded'] = self._seed_from_sitemaps(frontier, start_url)
 
-                # 保存Markdown文件
-                filename = f"{urlparse(url).path.strip('/').replace('/', '_') or 'index'}.md"
-                file_path = os.path.join(save_path, filename)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(f"# {url}\n\n")
-                    f.write(markdown_content)
+            if concurrency > 1 or process_workers > 0:
+                self._crawl_concurrent(frontier, save_path, headers, cookies, stats, concurrency,
+                                       per_host_limit or CRAWL_PER_HOST_LIMIT, process_workers)
+            else:
+                self._crawl_sequential(frontier, save_path, headers, cookies, stats)
 
-                # 提取并访问子URL
-                urls = self.extract_urls(response.text, url)
-                for sub_url in urls:
-                    crawl_url(sub_url, depth + 1)
+            if self._cancelled() and frontier:
+                # 保留未完成的队列，下次爬取时继续
+                stats['cancelled'] = True
+                if callback:
+                    callback(save_path, -1, f"爬取已取消，已完成 {self._done_count(stats)} 个页面，"
+                                            f"剩余 {len(frontier)} 个URL")
+            else:
+                frontier.finish()
+                if callback:
+                    callback(save_path, 100, f"爬取完成，新增 {stats['new']} 个、变化 {stats['changed']} 个、"
+                                             f"未变化 {stats['unchanged']} 个页面，失败 {stats['failed']} 个")
+        finally:
+            frontier.close()
+            self._on_page = None
+            self._callback = None
+            self._cancel_event = None
+            self._duplicates = None
+            self._robots = None
+            self._scheduler = None
+            if self._store is not None:
+                self._store.commit()
+                self._store = None
+        return stats
 
+    def _cancelled(self):
+        return self._cancel_event is not None and self._cancel_event.is_set()
+
+    @staticmethod
+    def _done_count(stats):
+        return sum(stats[key] for key in ('new', 'changed', 'unchanged', 'duplicate', 'skipped', 'failed',
+                                          'disallowed'))
+
+    def _report(self, frontier, url, stats, message):
+        """按已完成的页面数和队列长度估算进度并调用进度回调"""
+        if not self._callback:
+            return
+        done = self._done_count(stats)
+        progress = min(99, int(done * 100 / (done + len(frontier)))) if done else 0
+        self._callback(url, progress, f"已完成 {done} 个页面，队列中 {len(frontier)} 个: {message}")
+
+    def _seed_from_sitemaps(self, frontier, start_url):
+        """将sitemap中与起始URL同域名、且位于起始URL所在目录下的URL加入队列，不必先抓取页面再解析链接
+
+        sitemap通常列出整个网站，从 /docs/ 开始爬取时只接受 /docs/ 下的URL，避免变成整站爬取。
+
+        Returns:
+            新加入队列的URL数
+        """
+        sitemaps = self._robots.sitemaps(start_url) if self._robots else [urljoin(start_url, '/sitemap.xml')]
+        start_path = urlparse(start_url).path
+        prefix = start_path[:start_path.rfind('/') + 1] or '/'
+        seeded = 0
+        for sitemap_url in sitemaps:
+            for url in fetch_sitemap_urls(self.session, sitemap_url, self.timeout):
+                url = canonicalize_url(url)
+                if self.is_valid_url(url, start_url) and urlparse(url).path.startswith(prefix) \
+                        and self.should_crawl(url) and frontier.push(url, 1):
+                    seeded += 1
+        return seeded
+
+    def _disallowed(self, frontier, url, stats):
+        """robots.txt禁止爬取时将URL标记为已完成并返回True"""
+        if self._robots is None or self._robots.allowed(url):
+            return False
+        frontier.mark_done(url)
+        stats['disallowed'] += 1
+        return True
+
+    def _page_failed(self, frontier, url, error, stats):
+        print(f"Error crawling {url}: {str(error)}")
+        if self.metrics:
+            self.metrics.record('failed', url=url, error=str(error))
+        frontier.mark_failed(url)
+        stats['failed'] += 1
+        self._report(frontier, url, stats, f"抓取失败: {error}")
+
+    def _page_done(self, frontier, url, depth, info, stats):
+        """记录已完成的页面，并将未超过深度限制的子URL加入队列"""
+        self.visited_urls.add(url)
+        frontier.record_page(url, info)
+        frontier.mark_done(url)
+        stats[info['status']] += 1
+        if self.metrics:
+            self.metrics.record('page', url=url, status=info['status'])
+        if info['status'] in ('new', 'changed'):
+            stats['changed_files'].append(info['file_path'])
+        if self._on_page and info.get('file_path'):
+            self._on_page(info['file_path'], info['status'])
+
+        if depth < CRAWL_MAX_DEPTH:  # 限制爬取深度
+            for sub_url in info['links']:
+                if sub_url not in self.visited_urls:
+                    frontier.push(sub_url, depth + 1)
+        self._report(frontier, url, stats, url)
+
+    def _crawl_sequential(self, frontier, save_path, headers, cookies, stats):
+        """逐个抓取队列中的页面"""
+        while frontier and not self._cancelled():
+            url, depth = frontier.pop()
+            if url in self.visited_urls:
+                frontier.mark_done(url)
+                continue
+            if self._disallowed(frontier, url, stats):
+                continue
+
+            # 遵守主机要求的请求间隔
+            time.sleep(self._scheduler.ready_in(url))
+            self._scheduler.reserve(url)
+            try:
+                info = self._fetch_page(url, save_path, headers, cookies, self._validators(frontier, url))
             except Exception as e:
-                print(f"Error crawling {url}: {str(e)}")
+                self._page_failed(frontier, url, e, stats)
+                continue
+
+            self._page_done(frontier, url, depth, info, stats)
+
+    def _crawl_concurrent(self, frontier, save_path, headers, cookies, stats, concurrency, per_host_limit,
+                          process_workers=0):
+        """使用线程池并发爬取，主线程负责调度URL队列，工作线程只负责抓取和保存
+
+        启用进程池时，工作线程只下载页面，转换在子进程中完成，结果回到主线程保存。
+        """
+        host_active = {}
+        fetching = {}
+        converting = {}
+        process_pool = ProcessPoolExecutor(max_workers=process_workers) if process_workers > 0 else None
+        # 限制等待转换的页面数量，避免下载快于转换时HTML在内存中堆积
+        max_converting = process_workers * 4
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                while (frontier and not self._cancelled()) or fetching or converting:
+                    # 在全局并发数、单主机连接上限和主机请求间隔内尽量填满工作线程
+                    deferred = []
+                    next_ready = None
+                    while frontier and len(fetching) < concurrency and not self._cancelled() and \
+                            (process_pool is None or len(converting) < max_converting):
+                        url, depth = frontier.pop()
+                        if url in self.visited_urls:
+                            frontier.mark_done(url)
+                            continue
+                        if self._disallowed(frontier, url, stats):
+                            continue
+                        host = urlparse(url).netloc
+                        ready_in = self._scheduler.ready_in(url)
+                        if host_active.get(host, 0) >= per_host_limit or ready_in > 0:
+                            if ready_in > 0:
+                                next_ready = ready_in if next_ready is None else min(next_ready, ready_in)
+                            deferred.append((url, depth))
+                            if len(deferred) >= concurrency * 8:  # 避免每轮扫描整个队列
+                                break
+                            continue
+                        self._scheduler.reserve(url)
+                        host_active[host] = host_active.get(host, 0) + 1
+                        future = executor.submit(self._fetch_page, url, save_path, headers, cookies,
+                                                 self._validators(frontier, url), process_pool is None)
+                        fetching[future] = (url, depth, host)
+                    frontier.requeue(deferred)
+
+                    if not fetching and not converting:
+                        # 所有待爬URL的主机都在等待请求间隔
+                        if next_ready:
+                            time.sleep(next_ready)
+                        continue
+
+                    done, _ = wait(list(fetching) + list(converting), timeout=next_ready,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in converting:
+                            url, depth, info = converting.pop(future)
+                            try:
+                                markdown_content, hrefs, seconds = future.result()
+                                if self.metrics:
+                                    self.metrics.record('convert', seconds, url=url, process=True)
+                                info['links'] = self._resolve_links(hrefs, info.pop('base_url'), url)
+                                if not self._is_duplicate(url, markdown_content, info):
+                                    info['file_path'] = self._save_markdown(url, markdown_content, save_path, info)
+                            except Exception as e:
+                                self._page_failed(frontier, url, e, stats)
+                                continue
+                            self._page_done(frontier, url, depth, info, stats)
+                            continue
+
+                        url, depth, host = fetching.pop(future)
+                        host_active[host] -= 1
+                        try:
+                            info = future.result()
+                        except Exception as e:
+                            self._page_failed(frontier, url, e, stats)
+                            continue
 
-        crawl_url(start_url)
\ No newline at end of file
+                        if 'html' in info:
+                            converting[process_pool.submit(convert_html, info.pop('html'))] = (url, depth, info)
+                            continue
+                        self._page_done(frontier, url, depth, info, stats)
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
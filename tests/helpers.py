@@ -0,0 +1,120 @@
+"""测试共用的本地HTTP服务器和模拟OpenAI客户端"""
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from src.markdown_cleaner import MarkdownCleaner
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """提供目录中文件的处理器，不输出访问日志
+
+    delay为每个请求的延迟(秒)，delays按路径指定额外的延迟，用于模拟慢速页面。
+    """
+
+    delay = 0.0
+    delays = {}
+
+    def do_GET(self):
+        time.sleep(self.delay + self.delays.get(self.path, 0.0))
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory, delay=0.0, delays=None):
+    """在后台线程中启动提供directory中文件的服务器
+
+    Returns:
+        (服务器, 基础URL)，用完后调用server.shutdown()和server.server_close()
+    """
+    handler = type('Handler', (QuietHandler,), {'delay': delay, 'delays': delays or {}})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """兼容OpenAI接口的 /chat/completions，返回带前缀的待清洗文档"""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        content = 'CLEANED:' + request['messages'][-1]['content'].split('\n\n', 1)[-1]
+        body = json.dumps({
+            'id': 'test', 'object': 'chat.completion', 'created': int(time.time()), 'model': request['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_completions():
+    """在后台线程中启动模拟的OpenAI兼容API服务器
+
+    Returns:
+        (服务器, API端点URL)，用完后调用server.shutdown()和server.server_close()
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class FakeCompletions:
+    """模拟OpenAI客户端的chat.completions，返回带前缀的用户消息"""
+
+    def __init__(self, delay=0.0, fail_stream_after=None, max_chars=None):
+        self.delay = delay
+        self.fail_stream_after = fail_stream_after
+        self.max_chars = max_chars
+        self.errors = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, stream=False, **kwargs):
+        with self._lock:
+            self.calls.append(messages)
+            error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        time.sleep(self.delay)
+        content = 'CLEANED:' + messages[1]['content'].split('\n\n', 1)[-1]
+        # 续写请求只返回尚未输出的部分
+        content = content[len(''.join(m['content'] for m in messages if m['role'] == 'assistant')):]
+        finish_reason = 'stop'
+        if self.max_chars and len(content) > self.max_chars:
+            content, finish_reason = content[:self.max_chars], 'length'
+        if stream:
+            return self._stream(content, finish_reason)
+        return SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(content=content), finish_reason=finish_reason)])
+
+    def _stream(self, content, finish_reason='stop'):
+        for start in range(0, len(content), 7):
+            if self.fail_stream_after is not None and start >= self.fail_stream_after:
+                raise Exception('Request timed out.')
+            yield SimpleNamespace(choices=[SimpleNamespace(
+                delta=SimpleNamespace(content=content[start:start + 7]), finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=finish_reason)])
+
+
+def make_cleaner(delay=0.0, **kwargs):
+    """创建使用FakeCompletions的清洗器，默认不使用结果缓存
+
+    Returns:
+        (清洗器, FakeCompletions实例)
+    """
+    kwargs.setdefault('use_cache', False)
+    cleaner = MarkdownCleaner(api_key='test_key', **kwargs)
+    completions = FakeCompletions(delay)
+    cleaner.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return cleaner, completions
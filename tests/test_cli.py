@@ -0,0 +1,108 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src import cli
+from tests.helpers import serve_completions, serve_directory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SITE = {
+    'index.html': '<h1>首页</h1><a href="/a.html">A</a><a href="/b.html">B</a>',
+    'a.html': '<h1>A</h1><p>正文A</p>',
+    'b.html': '<h1>B</h1><p>正文B</p>',
+}
+
+
+def run_cli(*argv):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        code = cli.main(list(argv))
+    return code, json.loads(output.getvalue())
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        self.out_dir = tempfile.mkdtemp()
+        for name, body in SITE.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(f'<html><head><meta charset="utf-8"></head><body>{body}</body></html>')
+        self.site, self.site_url = serve_directory(self.site_dir)
+        self.llm, self.llm_url = serve_completions()
+
+    def tearDown(self):
+        for server in (self.site, self.llm):
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.site_dir)
+        shutil.rmtree(self.out_dir)
+
+    def test_import_does_not_load_heavy_modules(self):
+        code = ("import sys; sys.path.insert(0, 'src'); import cli; cli.build_parser(); "
+                "print(','.join(m for m in ('openai', 'bs4', 'html2text', 'requests') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '')
+
+    def test_crawl_then_clean_output_json(self):
+        code, result = run_cli('crawl', f'{self.site_url}/index.html', self.out_dir, '--quiet',
+                               '--ignore-robots', '--no-sitemap', '--concurrency', '2')
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(result['crawl']['new'], 3)
+        self.assertFalse(result['cancelled'])
+
+        metrics_path = os.path.join(self.out_dir, 'metrics.jsonl')
+        args = ('clean', self.out_dir, '--quiet', '--no-cache', '--api-key', 'test', '--api-endpoint', self.llm_url,
+                '--workers', '2', '--metrics', metrics_path)
+        code, result = run_cli(*args)
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(result['clean']['succeeded'], 3)
+        self.assertEqual(result['clean']['failed'], [])
+        self.assertEqual(result['metrics']['stages']['clean_file']['count'], 3)
+        self.assertTrue(os.path.getsize(metrics_path) > 0)
+        with open(result['clean']['outputs'][0], 'r', encoding='utf-8') as f:
+            self.assertTrue(f.read().startswith('CLEANED:'))
+
+        # 增量模式下再次清洗时未变化的文件被跳过
+        code, result = run_cli(*args)
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(result['metrics']['stages'].get('api', {}).get('count', 0), 0)
+
+    def test_errors_are_reported_in_json(self):
+        code, result = run_cli('clean', os.path.join(self.out_dir, 'missing.md'), '--quiet', '--api-key', 'test',
+                               '--api-endpoint', self.llm_url)
+        self.assertEqual(code, cli.EXIT_FAILED)
+        self.assertTrue(result.get('error') or result['clean']['failed'])
+
+
+class TestRequirementsCheck(unittest.TestCase):
+    def setUp(self):
+        spec = importlib.util.spec_from_file_location('run', os.path.join(ROOT, 'run.py'))
+        self.run = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.run)
+        fd, self.path = tempfile.mkstemp(suffix='.txt')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_only_missing_or_mismatched_versions_are_reported(self):
+        from importlib.metadata import version
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(f"# 注释\nrequests=={version('requests')}\nhttpx\n"
+                    "urllib3==0.0.1\nnot-installed-package-xyz==1.0\n")
+        missing = self.run.missing_requirements(self.path)
+        self.assertEqual(len(missing), 2)
+        self.assertTrue(missing[0].startswith('urllib3'))
+        self.assertTrue(missing[1].startswith('not-installed-package-xyz'))
+
+
+if __name__ == '__main__':
+    unittest.main()
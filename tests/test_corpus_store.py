@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.corpus_store import CorpusStore
+from src.web_crawler import WebCrawler
+from tests.helpers import make_cleaner, serve_directory
+
+SITE = {
+    'index.html': '<h1>Home</h1><a href="/a/b.html">A/B</a><a href="/a_b.html">A_B</a><a href="/q.html?page=2">Q</a>',
+    'a/b.html': '<h1>Nested</h1><p>nested page</p>',
+    'a_b.html': '<h1>Flat</h1><p>flat page</p>',
+    'q.html': '<h1>Query</h1><p>query page</p>',
+}
+
+
+class TestCorpusStore(unittest.TestCase):
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        self.out_dir = tempfile.mkdtemp()
+        for name, body in SITE.items():
+            path = os.path.join(self.site_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f'<html><body>{body}</body></html>')
+        self.server, self.base_url = serve_directory(self.site_dir)
+        self.store = CorpusStore(os.path.join(self.out_dir, 'corpus.sqlite'), commit_interval=2)
+
+    def tearDown(self):
+        self.store.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.site_dir)
+        shutil.rmtree(self.out_dir)
+
+    def test_crawl_into_store_and_clean_in_place(self):
+        stats = WebCrawler().crawl(f'{self.base_url}/index.html', self.out_dir, store=self.store, concurrency=2)
+
+        # /a/b.html和/a_b.html不再写入同一个文件
+        self.assertEqual(stats['new'], 4)
+        self.assertEqual(len(self.store), 4)
+        self.assertFalse(any(name.endswith('.md') for name in os.listdir(self.out_dir)))
+        self.assertIn('nested page', self.store.get(f'{self.base_url}/a/b.html')['markdown'])
+        self.assertIn('flat page', self.store.get(f'{self.base_url}/a_b.html')['markdown'])
+        self.assertIn('query page', self.store.get(f'{self.base_url}/q.html?page=2')['markdown'])
+
+        cleaner, completions = make_cleaner()
+        results = cleaner.clean_store(self.store, max_workers=2)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(success for _, success, _ in results))
+        record = self.store.get(f'{self.base_url}/a_b.html')
+        self.assertTrue(record['cleaned'].startswith('CLEANED:'))
+        self.assertEqual(self.store.pending_clean(), [])
+
+        # 页面重新抓取且内容变化后需要重新清洗
+        page_path = os.path.join(self.site_dir, 'a_b.html')
+        with open(page_path, 'w', encoding='utf-8') as f:
+            f.write('<html><body><h1>Flat</h1><p>flat page, second edition</p></body></html>')
+        # Last-Modified只精确到秒，推后修改时间避免同一秒内的修改被当作未变化
+        future = time.time() + 10
+        os.utime(page_path, (future, future))
+        WebCrawler().crawl(f'{self.base_url}/index.html', self.out_dir, store=self.store)
+        self.assertEqual(self.store.pending_clean(), [f'{self.base_url}/a_b.html'])
+        cleaner.clean_store(self.store)
+        self.assertEqual(len(completions.calls), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from src.dedup import DuplicateIndex, canonicalize_url, content_hash, hamming_distance, simhash
+
+ARTICLE = ' '.join(f'sentence number {i} describes how the crawler stores pages on disk.' for i in range(40))
+
+
+class TestDedup(unittest.TestCase):
+    def test_canonicalize_url(self):
+        expected = 'https://example.com/docs/guide?lang=en&page=2'
+        for url in ('HTTPS://Example.COM:443/docs//guide?page=2&lang=en#install',
+                    'https://example.com/docs/guide?utm_source=news&lang=en&page=2&fbclid=abc'):
+            self.assertEqual(canonicalize_url(url), expected)
+        # 末尾斜杠影响相对链接的解析，保留
+        self.assertEqual(canonicalize_url('https://example.com/docs/?gclid=x'), 'https://example.com/docs/')
+        # ref、from等通用参数可能是分支或分页，保留
+        self.assertEqual(canonicalize_url('https://git.example/repo/blob?ref=dev'), 'https://git.example/repo/blob?ref=dev')
+        self.assertEqual(canonicalize_url('https://example.com/list?from=20'), 'https://example.com/list?from=20')
+        self.assertEqual(canonicalize_url('http://example.com'), 'http://example.com/')
+        self.assertEqual(canonicalize_url('http://127.0.0.1:8000/a.html'), 'http://127.0.0.1:8000/a.html')
+
+    def test_simhash_is_close_for_small_edits(self):
+        edited = ARTICLE.replace('number 7 ', 'number seven ')
+        unrelated = ' '.join(f'the cleaner sends chunk {i} to the language model api.' for i in range(40))
+
+        self.assertLessEqual(hamming_distance(simhash(ARTICLE), simhash(edited)), 3)
+        self.assertGreater(hamming_distance(simhash(ARTICLE), simhash(unrelated)), 10)
+
+    def test_index_finds_exact_and_near_duplicates(self):
+        index = DuplicateIndex(max_distance=3)
+        self.assertIsNone(index.check_text('a', ARTICLE))
+        self.assertEqual(index.check_text('b', '  ' + ARTICLE.replace(' ', '\n')), 'a')
+        self.assertEqual(index.check_text('c', ARTICLE.replace('number 7 ', 'number seven ')), 'a')
+        # 同一个键再次登记（例如页面内容更新）不算重复
+        self.assertIsNone(index.check_text('a', ARTICLE))
+        self.assertEqual(index.find_exact(content_hash(ARTICLE)), 'a')
+
+        exact_only = DuplicateIndex(max_distance=0)
+        exact_only.check_text('a', ARTICLE)
+        self.assertIsNone(exact_only.check_text('c', ARTICLE.replace('number 7 ', 'number seven ')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+
+from src.jobs import CANCELLED, DONE, FAILED, RUNNING, JobManager
+
+
+def wait_until_finished(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestJobManager(unittest.TestCase):
+    def test_job_reports_progress_and_result(self):
+        manager = JobManager()
+        release = threading.Event()
+
+        def target(job):
+            job.update('a.md', 40, '处理中')
+            release.wait(5)
+            return 'ok'
+
+        job = manager.submit('clean', '清洗', target)
+        time.sleep(0.05)
+        snapshot = job.snapshot()
+        self.assertEqual((snapshot['status'], snapshot['progress'], snapshot['message']), (RUNNING, 40, '处理中'))
+        self.assertTrue(manager.has_running('clean'))
+        self.assertFalse(manager.has_running('crawl'))
+
+        release.set()
+        wait_until_finished(job)
+        self.assertEqual((job.status, job.progress, job.result), (DONE, 100, 'ok'))
+
+    def test_cancel_and_failure(self):
+        manager = JobManager()
+
+        def cancellable(job):
+            job.cancel_event.wait(5)
+            return 'partial'
+
+        cancelled = manager.submit('crawl', '爬取', cancellable)
+        manager.cancel(cancelled.id)
+        wait_until_finished(cancelled)
+        self.assertEqual((cancelled.status, cancelled.result), (CANCELLED, 'partial'))
+
+        def broken(job):
+            raise ValueError('坏了')
+
+        failed = manager.submit('crawl', '爬取', broken)
+        wait_until_finished(failed)
+        self.assertEqual((failed.status, failed.error), (FAILED, '坏了'))
+        self.assertEqual([job.id for job in manager.jobs('crawl')], [failed.id, cancelled.id])
+
+    def test_finished_jobs_are_pruned(self):
+        manager = JobManager(max_history=2)
+        for i in range(4):
+            wait_until_finished(manager.submit('clean', str(i), lambda job: None))
+        manager.submit('clean', 'last', lambda job: None)
+        self.assertEqual(len(manager.jobs()), 3)
+        wait_until_finished(manager.jobs()[0])
+        manager.clear_finished('clean')
+        self.assertEqual(manager.jobs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
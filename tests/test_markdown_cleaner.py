@@ -0,0 +1,428 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from src.markdown_chunker import split_markdown
+from src.metrics import Metrics
+from src.rate_limiter import AdaptiveConcurrency, TokenBucket, parse_retry_after
+from src.result_cache import ResultCache
+from tests.helpers import make_cleaner
+
+
+def api_error(error_class, status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers,
+                              request=httpx.Request('POST', 'https://api.example/chat/completions'))
+    return error_class(f'HTTP {status_code}', response=response, body=None)
+
+
+class TestMarkdownCleaner(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        for i in range(6):
+            with open(os.path.join(self.dir_path, f'page{i}.md'), 'w', encoding='utf-8') as f:
+                f.write(f'# 页面 {i}\n\n正文 {i}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_concurrent_clean_directory_keeps_order_and_callback_thread(self):
+        cleaner, completions = make_cleaner(delay=0.05)
+        callback_threads = set()
+
+        def callback(path, progress, message):
+            callback_threads.add(threading.current_thread())
+
+        results = cleaner.clean_directory(self.dir_path, callback, max_workers=3)
+
+        self.assertEqual(len(completions.calls), 6)
+        self.assertEqual(len(results), 6)
+        for path, success, output in results:
+            self.assertTrue(success)
+            self.assertEqual(os.path.basename(output), 'Cleandone-' + os.path.basename(path))
+        self.assertEqual(callback_threads, {threading.current_thread()})
+        with open(os.path.join(self.dir_path, 'Cleandone-page2.md'), encoding='utf-8') as f:
+            self.assertIn('CLEANED:# 页面 2', f.read())
+
+    def test_cancelled_clean_directory_resumes_incrementally(self):
+        cleaner, completions = make_cleaner()
+        cancel_event = threading.Event()
+
+        def callback(path, progress, message):
+            if progress == 100 and path.endswith('.md'):
+                cancel_event.set()
+
+        results = cleaner.clean_directory(self.dir_path, callback, cancel_event=cancel_event)
+        self.assertEqual(len(completions.calls), 1)
+        self.assertEqual(sum(1 for _, success, _ in results if success), 1)
+        self.assertEqual(sum(1 for _, _, result in results if result == '已取消'), 5)
+
+        results = cleaner.clean_directory(self.dir_path)
+        self.assertEqual(len(completions.calls), 6)
+        self.assertTrue(all(success for _, success, _ in results))
+
+    def test_incremental_clean_skips_unchanged_and_outputs(self):
+        cleaner, completions = make_cleaner()
+        cleaner.clean_directory(self.dir_path)
+        self.assertEqual(len(completions.calls), 6)
+
+        with open(os.path.join(self.dir_path, 'page3.md'), 'a', encoding='utf-8') as f:
+            f.write('新增段落\n')
+        results = cleaner.clean_directory(self.dir_path)
+
+        self.assertEqual(len(completions.calls), 7)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(success for _, success, _ in results))
+        self.assertFalse(any(name.startswith('Cleandone-Cleandone-') for name in os.listdir(self.dir_path)))
+
+        cleaner.clean_directory(self.dir_path, incremental=False)
+        self.assertEqual(len(completions.calls), 13)
+
+    def test_file_modified_during_clean_is_cleaned_again(self):
+        cleaner, completions = make_cleaner()
+        file_path = os.path.join(self.dir_path, 'page0.md')
+        create = completions.create
+
+        def create_and_modify(model, messages, **kwargs):
+            # 清洗page0期间文件被改写为大小相同的新内容
+            if '正文 0' in messages[-1]['content']:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write('# 页面 0\n\n正文 X\n')
+                future = time.time() + 10
+                os.utime(file_path, (future, future))
+            return create(model, messages, **kwargs)
+
+        completions.create = create_and_modify
+        cleaner.clean_directory(self.dir_path)
+        self.assertEqual(len(completions.calls), 6)
+
+        results = cleaner.clean_directory(self.dir_path)
+
+        self.assertEqual(len(completions.calls), 7)
+        self.assertIn('正文 X', completions.calls[-1][-1]['content'])
+        self.assertTrue(all(success for _, success, _ in results))
+
+    def test_repeated_navigation_is_removed_before_api_call(self):
+        nav = '* [首页](/)\n* [文档](/docs)\n* [](/logo)\n\n[¶](#top)\n\n版权所有 © 2024 示例站点\n\n'
+        for i in range(6):
+            with open(os.path.join(self.dir_path, f'page{i}.md'), 'w', encoding='utf-8') as f:
+                f.write(f'# 页面 {i}\n\n{nav}正文 {i}\n\n```\n* [首页](/)\n```\n')
+        cleaner, completions = make_cleaner()
+
+        cleaner.clean_directory(self.dir_path)
+
+        for messages in completions.calls:
+            prompt = messages[-1]['content']
+            self.assertNotIn('[文档](/docs)', prompt)
+            self.assertNotIn('版权所有', prompt)
+            self.assertNotIn('(#top)', prompt)
+            self.assertIn('```\n* [首页](/)\n```', prompt)
+        stats = cleaner.file_stats[os.path.join(self.dir_path, 'page0.md')]
+        self.assertGreater(stats['pre_clean_tokens_removed'], 0)
+
+    def test_file_stats_are_local_to_each_job(self):
+        cleaner, completions = make_cleaner()
+        other_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_dir)
+        with open(os.path.join(other_dir, 'other.md'), 'w', encoding='utf-8') as f:
+            f.write('# 其他页面\n\n正文\n')
+
+        first, second = cleaner.for_job(), cleaner.for_job()
+        first.clean_directory(self.dir_path)
+        second.clean_directory(other_dir)
+
+        self.assertEqual(len(first.file_stats), 6)
+        self.assertEqual(list(second.file_stats), [os.path.join(other_dir, 'other.md')])
+        self.assertEqual(cleaner.file_stats, {})
+        self.assertIs(first.rate_limiter, cleaner.rate_limiter)
+        self.assertIs(first.concurrency, cleaner.concurrency)
+
+        # 同一个清洗器再次清洗目录时只保留本次的统计
+        first.clean_directory(other_dir, incremental=False)
+        self.assertEqual(list(first.file_stats), [os.path.join(other_dir, 'other.md')])
+
+    def test_duplicate_files_reuse_existing_output(self):
+        body = '\n\n'.join(f'第{i}段：爬虫把每个页面保存为一个Markdown文件。' for i in range(20))
+        for name, url in (('copy-a.md', 'https://example.com/a'), ('copy-b.md', 'https://example.com/a?print=1')):
+            with open(os.path.join(self.dir_path, name), 'w', encoding='utf-8') as f:
+                f.write(f'# {url}\n\n{body}\n')
+        cleaner, completions = make_cleaner()
+
+        results = dict((path, (success, output)) for path, success, output in cleaner.clean_directory(self.dir_path))
+
+        self.assertEqual(len(completions.calls), 7)
+        copy_a = os.path.join(self.dir_path, 'copy-a.md')
+        copy_b = os.path.join(self.dir_path, 'copy-b.md')
+        self.assertEqual(results[copy_b], results[copy_a])
+        self.assertEqual(len([name for name in os.listdir(self.dir_path) if name.startswith('Cleandone-copy-')]), 1)
+
+        # 增量模式下重复文件也会被跳过
+        cleaner.clean_directory(self.dir_path)
+        self.assertEqual(len(completions.calls), 7)
+
+    def test_split_markdown_keeps_code_blocks_intact(self):
+        code = '```python\n' + '\n\n'.join(f'# 注释 {i}\nprint({i})' for i in range(40)) + '\n```\n\n'
+        text = ''.join(f'## 章节 {i}\n\n' + '正文内容。' * 60 + '\n\n' for i in range(10)) + code + '## 结尾\n'
+
+        chunks = split_markdown(text, 300)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), text)
+        self.assertTrue(any(chunk.startswith(code) or code in chunk for chunk in chunks))
+        for chunk in chunks:
+            self.assertEqual(chunk.count('```') % 2, 0)
+
+    def test_long_document_is_cleaned_in_ordered_chunks(self):
+        cleaner, completions = make_cleaner()
+        cleaner.chunk_tokens = 200
+        sections = [f'## 章节 {i}\n\n' + f'第{i}节内容。' * 40 for i in range(8)]
+        file_path = os.path.join(self.dir_path, 'long.md')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(sections))
+
+        success, output = cleaner.clean_file(file_path)
+
+        self.assertTrue(success)
+        self.assertGreater(len(completions.calls), 1)
+        with open(output, encoding='utf-8') as f:
+            cleaned = f.read()
+        positions = [cleaned.index(f'## 章节 {i}') for i in range(8)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertNotIn('内容已截断', cleaned)
+
+    def test_cached_result_skips_api_call(self):
+        cache_path = os.path.join(self.dir_path, 'cache', 'clean_cache.sqlite')
+        cleaner, completions = make_cleaner(use_cache=True, cache_path=cache_path)
+        file_path = os.path.join(self.dir_path, 'page0.md')
+
+        first = cleaner.clean_file(file_path)
+        second = cleaner.clean_file(file_path)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(completions.calls), 1)
+
+        # 换模型后缓存键不同，需要重新调用
+        cleaner.model = 'deepseek-coder'
+        cleaner.clean_file(file_path)
+        self.assertEqual(len(completions.calls), 2)
+
+    def test_cache_reuses_unchanged_chunks_after_inserting_a_section(self):
+        cache_path = os.path.join(self.dir_path, 'cache', 'clean_cache.sqlite')
+        cleaner, completions = make_cleaner(use_cache=True, cache_path=cache_path)
+        cleaner.chunk_tokens = 200
+        sections = [f'## 章节 {i}\n\n' + f'第{i}节内容。' * 40 for i in range(6)]
+        file_path = os.path.join(self.dir_path, 'long.md')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(sections))
+        cleaner.clean_file(file_path)
+        first_calls = len(completions.calls)
+        self.assertGreater(first_calls, 1)
+
+        # 在开头插入一节后片段总数变化，只有新章节需要调用API
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(['## 新章节\n\n' + '新增内容。' * 40] + sections))
+        success, _ = cleaner.clean_file(file_path)
+
+        self.assertTrue(success)
+        self.assertEqual(len(completions.calls) - first_calls, 1)
+
+    def test_result_cache_evicts_least_recently_used(self):
+        cache = ResultCache(os.path.join(self.dir_path, 'lru.sqlite'), max_bytes=10)
+        cache.put('a', 'xxxx')
+        cache.put('b', 'yyyy')
+        cache.get('a')
+        cache.put('c', 'zzzz')
+
+        self.assertEqual(cache.get('a'), 'xxxx')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'zzzz')
+        cache.close()
+
+    def test_streaming_writes_same_output_as_blocking_call(self):
+        sections = [f'## 章节 {i}\n\n' + f'第{i}节内容。' * 40 for i in range(6)]
+        file_path = os.path.join(self.dir_path, 'long.md')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(sections))
+
+        outputs = {}
+        for stream in (False, True):
+            cleaner, _ = make_cleaner(stream=stream)
+            cleaner.chunk_tokens = 200
+            success, output = cleaner.clean_file(file_path)
+            self.assertTrue(success)
+            with open(output, 'rb') as f:
+                outputs[stream] = f.read()
+
+        self.assertEqual(outputs[True], outputs[False])
+        self.assertFalse(any(name.endswith('.partial') for name in os.listdir(self.dir_path)))
+
+    def test_streaming_keeps_partial_output_on_failure(self):
+        cleaner, completions = make_cleaner(stream=True)
+        completions.fail_stream_after = 7
+        progress = []
+
+        with unittest.mock.patch('src.markdown_cleaner.time.sleep'):
+            success, error = cleaner.clean_file(os.path.join(self.dir_path, 'page1.md'),
+                                                lambda path, value, message: progress.append(message))
+
+        self.assertFalse(success)
+        partial_path = os.path.join(self.dir_path, 'Cleandone-page1.md.partial')
+        self.assertIn(partial_path, error)
+        with open(partial_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'CLEANED')
+
+    def test_truncated_output_is_continued(self):
+        file_path = os.path.join(self.dir_path, 'page4.md')
+        with open(file_path, encoding='utf-8') as f:
+            expected = 'CLEANED:' + f.read()
+
+        for stream in (False, True):
+            cleaner, completions = make_cleaner(stream=stream)
+            completions.max_chars = 6
+            success, output = cleaner.clean_file(file_path)
+
+            self.assertTrue(success)
+            with open(output, encoding='utf-8') as f:
+                self.assertEqual(f.read().strip(), expected.strip())
+            self.assertEqual(cleaner.file_stats[file_path]['continuations'], len(completions.calls) - 1)
+            self.assertNotIn('truncated', cleaner.file_stats[file_path])
+
+    def test_continuation_stops_at_configured_limit(self):
+        cleaner, completions = make_cleaner()
+        completions.max_chars = 2
+        cleaner.max_continuations = 2
+        file_path = os.path.join(self.dir_path, 'page4.md')
+
+        success, output = cleaner.clean_file(file_path)
+
+        self.assertTrue(success)
+        self.assertEqual(len(completions.calls), 3)
+        self.assertEqual(cleaner.file_stats[file_path], {'pre_clean_tokens_removed': 0, 'continuations': 2, 'truncated': 1})
+
+    def test_small_files_are_batched_into_one_request(self):
+        cleaner, completions = make_cleaner()
+
+        results = cleaner.clean_directory(self.dir_path, batch=True)
+
+        self.assertEqual(len(completions.calls), 1)
+        self.assertTrue(all(success for _, success, _ in results))
+        for i in range(6):
+            with open(os.path.join(self.dir_path, f'Cleandone-page{i}.md'), encoding='utf-8') as f:
+                cleaned = f.read()
+            self.assertIn(f'正文 {i}', cleaned)
+            self.assertNotIn('<<<', cleaned)
+        self.assertEqual(cleaner.file_stats[os.path.join(self.dir_path, 'page5.md')]['batched'], 6)
+
+    def test_batch_and_single_file_cleaning_share_cache(self):
+        cache_path = os.path.join(self.dir_path, 'cache', 'clean_cache.sqlite')
+        cleaner, completions = make_cleaner(use_cache=True, cache_path=cache_path)
+
+        # 单独清洗过的文件不再放入批量请求
+        cleaner.clean_file(os.path.join(self.dir_path, 'page0.md'))
+        cleaner.clean_directory(self.dir_path, batch=True)
+        self.assertEqual(len(completions.calls), 2)
+        self.assertNotIn('正文 0', completions.calls[-1][-1]['content'])
+
+        # 批量清洗过的文件单独清洗时命中缓存
+        cleaner.clean_file(os.path.join(self.dir_path, 'page3.md'))
+        self.assertEqual(len(completions.calls), 2)
+
+    def test_batch_falls_back_to_single_files_when_delimiters_are_missing(self):
+        cleaner, completions = make_cleaner()
+        completions.max_chars = 120
+
+        results = cleaner.clean_directory(self.dir_path, batch=True)
+
+        self.assertTrue(all(success for _, success, _ in results))
+        self.assertGreater(len(completions.calls), 1)
+        for i in range(6):
+            with open(os.path.join(self.dir_path, f'Cleandone-page{i}.md'), encoding='utf-8') as f:
+                self.assertIn(f'正文 {i}', f.read())
+        # 被截断的批量响应中缺少结束分隔符的文件单独清洗
+        self.assertNotIn('batched', cleaner.file_stats[os.path.join(self.dir_path, 'page5.md')])
+
+    def test_rate_limit_honours_retry_after_and_lowers_concurrency(self):
+        cleaner, completions = make_cleaner()
+        completions.errors = [api_error(openai.RateLimitError, 429, {'retry-after-ms': '200'}),
+                              api_error(openai.InternalServerError, 503)]
+        limit = cleaner.concurrency.limit
+
+        with unittest.mock.patch('src.markdown_cleaner.time.sleep') as sleep:
+            success, _ = cleaner.clean_file(os.path.join(self.dir_path, 'page0.md'))
+
+        self.assertTrue(success)
+        self.assertEqual(len(completions.calls), 3)
+        self.assertEqual(cleaner.concurrency.limit, limit // 2)
+        self.assertGreaterEqual(sleep.call_args_list[0].args[0], 0.2)
+        self.assertLess(sleep.call_args_list[0].args[0], 1.3)
+
+    def test_metrics_record_api_usage_retries_and_files(self):
+        metrics = Metrics()
+        cleaner, completions = make_cleaner(metrics=metrics)
+        completions.errors = [api_error(openai.InternalServerError, 503)]
+        create = completions.create
+        completions.create = lambda *args, **kwargs: SimpleNamespace(
+            **vars(create(*args, **kwargs)), usage=SimpleNamespace(prompt_tokens=30, completion_tokens=12))
+
+        with unittest.mock.patch('src.markdown_cleaner.time.sleep'):
+            success, _ = cleaner.clean_file(os.path.join(self.dir_path, 'page0.md'))
+
+        self.assertTrue(success)
+        stages = metrics.summary()['stages']
+        self.assertEqual(stages['api']['count'], 1)
+        self.assertEqual((stages['api']['prompt_tokens'], stages['api']['completion_tokens']), (30, 12))
+        self.assertEqual(stages['api']['retries'], 1)
+        self.assertEqual(stages['api_retry']['count'], 1)
+        self.assertEqual(stages['clean_file']['count'], 1)
+        self.assertGreater(stages['clean_file']['bytes_out'], stages['clean_file']['bytes_in'])
+
+    def test_authentication_error_is_not_retried(self):
+        cleaner, completions = make_cleaner()
+        completions.errors = [api_error(openai.AuthenticationError, 401)]
+
+        success, error = cleaner.clean_file(os.path.join(self.dir_path, 'page0.md'))
+
+        self.assertFalse(success)
+        self.assertIn('API认证失败', error)
+        self.assertEqual(len(completions.calls), 1)
+
+    def test_adaptive_concurrency_halves_and_recovers(self):
+        concurrency = AdaptiveConcurrency(8, maximum=10, cooldown=60)
+        concurrency.record_rate_limit()
+        concurrency.record_rate_limit()  # 冷却时间内的429不再减半
+        self.assertEqual(concurrency.limit, 4)
+
+        for _ in range(4 + 5 + 6 + 7):
+            concurrency.record_success()
+        self.assertEqual(concurrency.limit, 8)
+
+        concurrency.record_rate_limit(retry_after=0.1)
+        started = time.monotonic()
+        concurrency.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        concurrency.release()
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after({'retry-after-ms': '1500', 'retry-after': '9'}), 1.5)
+        self.assertEqual(parse_retry_after({'retry-after': '3'}), 3.0)
+        self.assertIsNone(parse_retry_after({'retry-after': 'soon'}))
+        self.assertIsNone(parse_retry_after({}))
+
+    def test_token_bucket_throttles_after_burst(self):
+        bucket = TokenBucket(capacity=2, refill_rate=20)
+        started = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # 前2个令牌立即可用，后2个各需等待0.05秒
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.metrics import Metrics, percentile, timed
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_percentile_interpolates(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertAlmostEqual(percentile(values, 0.5), 50.5)
+        self.assertAlmostEqual(percentile(values, 0.95), 95.05)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summary_and_jsonl_events(self):
+        path = os.path.join(self.dir_path, 'metrics.jsonl')
+        metrics = Metrics(path)
+        for seconds in (0.1, 0.2, 0.3, 0.4):
+            metrics.record('api', seconds, start=100.0, prompt_tokens=10, completion_tokens=5)
+        with self.assertRaises(ValueError):
+            with metrics.timer('fetch', url='http://example.com/') as event:
+                event['bytes_in'] = 42
+                raise ValueError
+        metrics.close()
+
+        stages = metrics.summary()['stages']
+        self.assertEqual(stages['api']['count'], 4)
+        self.assertAlmostEqual(stages['api']['total'], 1.0)
+        self.assertAlmostEqual(stages['api']['p50'], 0.25)
+        self.assertEqual(stages['api']['completion_tokens'], 20)
+        self.assertEqual(stages['fetch']['bytes_in'], 42)
+        self.assertIn('api', metrics.report())
+
+        with open(path, encoding='utf-8') as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(len(events), 5)
+        self.assertEqual(events[-1]['stage'], 'fetch')
+        self.assertEqual(events[-1]['error'], 'ValueError')
+
+    def test_timed_without_metrics_is_a_no_op(self):
+        with timed(None, 'fetch') as event:
+            event['bytes_in'] = 1
+
+
+if __name__ == "__main__":
+    unittest.main()
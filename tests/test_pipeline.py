@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from src import pipeline
+from src.pipeline import run_pipeline
+from src.web_crawler import WebCrawler
+from tests.helpers import make_cleaner, serve_directory
+
+PAGE_COUNT = 6
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        self.out_dir = tempfile.mkdtemp()
+        # 链式页面：每个页面只链接下一页，爬取必须逐页进行
+        for i in range(PAGE_COUNT):
+            link = f'<a href="/p{i + 1}.html">next</a>' if i + 1 < PAGE_COUNT else ''
+            with open(os.path.join(self.site_dir, f'p{i}.html'), 'w', encoding='utf-8') as f:
+                f.write(f'<html><head><meta charset="utf-8"></head><body><h1>Page {i}</h1>{link}</body></html>')
+        self.server, base_url = serve_directory(self.site_dir, delay=0.1)
+        self.start_url = f'{base_url}/p0.html'
+        self.cleaner, self.completions = make_cleaner(delay=0.05)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.site_dir)
+        shutil.rmtree(self.out_dir)
+
+    def test_cleaning_overlaps_crawling(self):
+        callback_threads = set()
+
+        def callback(path, progress, message):
+            callback_threads.add(threading.current_thread())
+
+        summary = run_pipeline(WebCrawler(), self.cleaner, self.start_url, self.out_dir, callback,
+                               clean_workers=2, queue_size=2)
+
+        self.assertEqual(summary['crawl']['new'], PAGE_COUNT)
+        self.assertEqual(len(summary['clean']), PAGE_COUNT)
+        self.assertTrue(all(success for _, success, _ in summary['clean']))
+        self.assertGreater(summary['overlap_seconds'], 0)
+        self.assertEqual(callback_threads, {threading.current_thread()})
+        with open(os.path.join(self.out_dir, 'Cleandone-p3.html.md'), encoding='utf-8') as f:
+            self.assertIn('Page 3', f.read())
+
+        # 再次运行时页面未变化，清洗全部跳过
+        summary = run_pipeline(WebCrawler(), self.cleaner, self.start_url, self.out_dir)
+        self.assertEqual(summary['skipped'], PAGE_COUNT)
+        self.assertEqual(len(self.completions.calls), PAGE_COUNT)
+
+    def test_worker_errors_do_not_block_the_crawl(self):
+        original = self.cleaner.clean_manifest_file
+
+        def flaky_clean(manifest, file_path, callback=None):
+            if file_path.endswith('p2.html.md'):
+                raise RuntimeError('清洗出错')
+            return original(manifest, file_path, callback)
+
+        def flaky_is_unchanged(manifest, file_path):
+            if file_path.endswith('p4.html.md'):
+                raise OSError('读取清洗记录出错')
+            return False
+
+        self.cleaner.clean_manifest_file = flaky_clean
+        outcome = {}
+        # 流水线使用src目录中的模块，需要替换它实际使用的CleanManifest
+        with unittest.mock.patch.object(pipeline.CleanManifest, 'is_unchanged', flaky_is_unchanged):
+            # 只有一个清洗线程且队列长度为1，清洗线程退出时爬取线程会阻塞
+            thread = threading.Thread(target=lambda: outcome.setdefault('summary', run_pipeline(
+                WebCrawler(), self.cleaner, self.start_url, self.out_dir, clean_workers=1, queue_size=1)), daemon=True)
+            thread.start()
+            thread.join(60)
+        self.assertFalse(thread.is_alive())
+
+        results = {os.path.basename(path): success for path, success, _ in outcome['summary']['clean']}
+        self.assertEqual(len(results), PAGE_COUNT)
+        self.assertFalse(results['p2.html.md'])
+        self.assertFalse(results['p4.html.md'])
+        self.assertTrue(results['p5.html.md'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.search_index import SearchIndex, build_query, split_sections, tokenize
+
+DOCS = {
+    'Cleandone-crawler.md': '# 网页爬虫\n\n爬虫把每个页面保存为Markdown文件。\n\n## 断点续爬\n\n爬取状态保存在SQLite数据库中，中断后可以继续。\n',
+    'Cleandone-cleaner.md': '# 文档清洗\n\n调用大模型API清洗Markdown，使其更适合向量分析。\n\n```\n# 这不是标题\n```\n\n## Rate limits\n\nThe cleaner honours Retry-After headers.\n',
+    'raw.md': '# 未清洗的文件\n\n向量分析\n',
+}
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        for name, text in DOCS.items():
+            with open(os.path.join(self.dir_path, name), 'w', encoding='utf-8') as f:
+                f.write(text)
+        self.index = SearchIndex(self.dir_path)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir_path)
+
+    def test_tokenize_and_query_handle_cjk(self):
+        self.assertEqual(tokenize('向量分析 BM25 Index'), '向量 量分 分析 bm25 index')
+        self.assertEqual(build_query('向量分析 "retry'), '"向量 量分 分析" "retry"')
+        self.assertEqual(build_query('爬'), '"爬"*')
+        self.assertIsNone(build_query('  ?? '))
+
+    def test_split_sections_ignores_headings_in_code(self):
+        sections = split_sections(DOCS['Cleandone-cleaner.md'])
+        self.assertEqual([heading for heading, _ in sections], ['文档清洗', 'Rate limits'])
+        self.assertIn('# 这不是标题', sections[0][1])
+
+    def test_search_ranks_sections_and_updates_incrementally(self):
+        stats = self.index.update_directory(self.dir_path)
+        self.assertEqual(stats['added'], 2)
+
+        results = self.index.search('断点续爬')
+        self.assertEqual(results[0]['key'], 'Cleandone-crawler.md')
+        self.assertEqual(results[0]['heading'], '断点续爬')
+        self.assertEqual(self.index.search('向量分析')[0]['key'], 'Cleandone-cleaner.md')
+        self.assertEqual(self.index.search('retry-after')[0]['heading'], 'Rate limits')
+        self.assertEqual(self.index.search('不存在的内容'), [])
+
+        # 修改一个文件、删除另一个文件后增量更新
+        path = os.path.join(self.dir_path, 'Cleandone-crawler.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('# 网页爬虫\n\n支持sitemap种子。\n')
+        future = time.time() + 10
+        os.utime(path, (future, future))
+        os.remove(os.path.join(self.dir_path, 'Cleandone-cleaner.md'))
+
+        stats = self.index.update_directory(self.dir_path)
+        self.assertEqual((stats['updated'], stats['removed'], stats['unchanged']), (1, 1, 0))
+        self.assertEqual(self.index.search('断点续爬'), [])
+        self.assertEqual(self.index.search('sitemap')[0]['key'], 'Cleandone-crawler.md')
+        self.assertEqual(self.index.search('向量'), [])
+        self.assertEqual(len(self.index), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,316 @@
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+from src.crawl_state import CrawlFrontier
+from src.metrics import Metrics
+from src.politeness import fetch_sitemap_urls
+from src.web_crawler import WebCrawler
+from tests.helpers import serve_directory
+
+SITE = {
+    'index.html': '<h1>首页</h1><a href="/a.html">A</a><a href="/b.html">B</a><a href="https://other.example/">外链</a>',
+    'a.html': '<h1>A</h1><a href="/c.html">C</a><a href="/index.html">首页</a>',
+    'b.html': '<h1>B</h1><pre><code>print("b")</code></pre><a href="/c.html">C</a>',
+    'c.html': '<h1>C</h1><p>正文</p>',
+}
+
+
+def _md_files(path):
+    return sorted(f for f in os.listdir(path) if f.endswith('.md'))
+
+
+class TestWebCrawler(unittest.TestCase):
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        self.out_dir = tempfile.mkdtemp()
+        for name, body in SITE.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(f'<html><head><meta charset="utf-8"></head><body>{body}</body></html>')
+        self.server, self.base_url = serve_directory(self.site_dir, delays={'/slow.html': 3})
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.site_dir)
+        shutil.rmtree(self.out_dir)
+
+    def test_concurrent_crawl_matches_sequential(self):
+        sequential_dir = os.path.join(self.out_dir, 'sequential')
+        concurrent_dir = os.path.join(self.out_dir, 'concurrent')
+
+        WebCrawler().crawl(f'{self.base_url}/index.html', sequential_dir)
+        crawler = WebCrawler()
+        crawler.crawl(f'{self.base_url}/index.html', concurrent_dir, concurrency=4, per_host_limit=2)
+
+        self.assertEqual(_md_files(sequential_dir), ['a.html.md', 'b.html.md', 'c.html.md', 'index.html.md'])
+        self.assertEqual(_md_files(concurrent_dir), _md_files(sequential_dir))
+        self.assertEqual(len(crawler.visited_urls), 4)
+        with open(os.path.join(concurrent_dir, 'b.html.md'), encoding='utf-8') as f:
+            self.assertIn('print("b")', f.read())
+
+    def test_process_pool_conversion_matches_inline(self):
+        inline_dir = os.path.join(self.out_dir, 'inline')
+        offload_dir = os.path.join(self.out_dir, 'offload')
+
+        WebCrawler().crawl(f'{self.base_url}/index.html', inline_dir)
+        stats = WebCrawler().crawl(f'{self.base_url}/index.html', offload_dir, concurrency=2, process_workers=2)
+
+        self.assertEqual(stats['new'], 4)
+        self.assertEqual(_md_files(offload_dir), _md_files(inline_dir))
+        for name in _md_files(inline_dir):
+            with open(os.path.join(inline_dir, name), encoding='utf-8') as expected, \
+                    open(os.path.join(offload_dir, name), encoding='utf-8') as actual:
+                self.assertEqual(actual.read(), expected.read())
+
+    def test_crawl_resumes_from_saved_frontier(self):
+        start_url = f'{self.base_url}/index.html'
+        # 模拟上次爬取在首页完成后中断，队列中只剩b.html
+        frontier = CrawlFrontier(self.out_dir)
+        frontier.begin(start_url)
+        frontier.pop()
+        frontier.mark_done(start_url)
+        frontier.push(f'{self.base_url}/b.html', 1)
+        frontier.close()
+
+        WebCrawler().crawl(start_url, self.out_dir)
+
+        self.assertEqual(_md_files(self.out_dir), ['b.html.md', 'c.html.md'])
+
+        # 已完成的爬取不再续爬，再次调用会重新开始
+        WebCrawler().crawl(start_url, self.out_dir)
+        self.assertIn('index.html.md', _md_files(self.out_dir))
+
+    def test_read_timeout_does_not_block_crawl(self):
+        crawler = WebCrawler(read_timeout=0.5)
+        started = time.time()
+        crawler.crawl(f'{self.base_url}/slow.html', self.out_dir)
+
+        self.assertLess(time.time() - started, 2.5)
+        self.assertEqual(_md_files(self.out_dir), [])
+        crawler.close()
+
+    def test_recrawl_skips_unchanged_pages(self):
+        start_url = f'{self.base_url}/index.html'
+        first = WebCrawler().crawl(start_url, self.out_dir)
+        self.assertEqual((first['new'], first['changed'], first['unchanged']), (4, 0, 0))
+
+        c_path = os.path.join(self.site_dir, 'c.html')
+        with open(c_path, 'w', encoding='utf-8') as f:
+            f.write('<html><body><h1>C</h1><p>updated body</p></body></html>')
+        future = time.time() + 10
+        os.utime(c_path, (future, future))
+
+        second = WebCrawler().crawl(start_url, self.out_dir)
+        self.assertEqual((second['new'], second['changed'], second['unchanged']), (0, 1, 3))
+        self.assertEqual(second['changed_files'], [os.path.join(self.out_dir, 'c.html.md')])
+        with open(os.path.join(self.out_dir, 'c.html.md'), encoding='utf-8') as f:
+            self.assertIn('updated body', f.read())
+
+    def test_reused_crawler_recrawls_pages(self):
+        start_url = f'{self.base_url}/index.html'
+        crawler = WebCrawler()
+        first = crawler.crawl(start_url, self.out_dir)
+        self.assertEqual(first['new'], 4)
+
+        c_path = os.path.join(self.site_dir, 'c.html')
+        with open(c_path, 'w', encoding='utf-8') as f:
+            f.write('<html><body><h1>C</h1><p>updated body</p></body></html>')
+        future = time.time() + 10
+        os.utime(c_path, (future, future))
+
+        second = crawler.crawl(start_url, self.out_dir)
+        self.assertEqual((second['new'], second['changed'], second['unchanged']), (0, 1, 3))
+
+    def test_duplicate_urls_and_pages_are_skipped(self):
+        pages = {
+            'index.html': '<h1>Home</h1><a href="/a.html?utm_source=feed">A</a><a href="/a.html#top">A</a>'
+                          '<a href="/c.html">C</a><a href="/d.html">D</a>',
+            'd.html': '<h1>C</h1><p>body</p>',
+            'c.html': '<h1>C</h1><p>body</p>',
+        }
+        for name, body in pages.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(f'<html><body>{body}</body></html>')
+        crawler = WebCrawler()
+
+        stats = crawler.crawl(f'{self.base_url}/index.html?utm_campaign=x', self.out_dir)
+
+        self.assertEqual(stats['duplicate'], 1)
+        self.assertEqual(stats['new'], 3)
+        self.assertIn(f'{self.base_url}/a.html', crawler.visited_urls)
+        self.assertFalse(any('utm_' in url or '#' in url for url in crawler.visited_urls))
+        self.assertEqual(len([name for name in _md_files(self.out_dir) if name in ('c.html.md', 'd.html.md')]), 1)
+
+    def test_relative_links_resolve_against_directory_start_url(self):
+        os.makedirs(os.path.join(self.site_dir, 'docs'))
+        for name, body in {'index.html': '<h1>Docs</h1><a href="intro.html">Intro</a>',
+                           'intro.html': '<h1>Intro</h1><p>body</p>'}.items():
+            with open(os.path.join(self.site_dir, 'docs', name), 'w', encoding='utf-8') as f:
+                f.write(f'<html><body>{body}</body></html>')
+
+        for start_url, out_dir, kwargs in ((f'{self.base_url}/docs/', 'slash', {}),
+                                           (f'{self.base_url}/docs', 'redirect', {}),
+                                           (f'{self.base_url}/docs', 'process', {'process_workers': 1})):
+            # /docs 由服务器重定向到 /docs/，相对链接按重定向后的地址解析
+            stats = WebCrawler().crawl(start_url, os.path.join(self.out_dir, out_dir), **kwargs)
+            self.assertEqual((stats['new'], stats['failed']), (2, 0), start_url)
+
+    def test_pages_sharing_a_large_nav_are_kept(self):
+        nav = '<ul>' + ''.join(f'<li>导航项目 {i}</li>' for i in range(600)) + '</ul>'
+        pages = {
+            'index.html': f'{nav}<h1>Home</h1><a href="/a.html">A</a><a href="/b.html">B</a>',
+            'a.html': f'{nav}<h1>Install</h1><p>Run the installer and restart.</p>',
+            'b.html': f'{nav}<h1>Upgrade</h1><p>Back up the data directory first.</p>',
+        }
+        for name, body in pages.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(f'<html><head><meta charset="utf-8"></head><body>{body}</body></html>')
+
+        with unittest.mock.patch('src.web_crawler.simhash') as fingerprint:
+            stats = WebCrawler().crawl(f'{self.base_url}/index.html', self.out_dir)
+
+        self.assertEqual((stats['new'], stats['duplicate']), (3, 0))
+        # 默认不做近似去重，不计算SimHash指纹
+        fingerprint.assert_not_called()
+
+    def test_non_html_and_oversized_pages_are_not_downloaded(self):
+        links = ''.join(f'<a href="/{name}">{name}</a>' for name in
+                        ('c.html', 'manual.pdf', 'notes.txt', 'big.html', 'private/secret.html'))
+        files = {
+            'index.html': f'<html><head><meta charset="utf-8"></head><body>{links}</body></html>',
+            'manual.pdf': '%PDF-1.4',
+            'notes.txt': 'plain text',
+            'big.html': '<html><body>' + 'x' * 5000 + '</body></html>',
+        }
+        os.makedirs(os.path.join(self.site_dir, 'private'))
+        files['private/secret.html'] = '<html><body>secret</body></html>'
+        for name, body in files.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(body)
+        crawler = WebCrawler(max_page_bytes=2000, exclude_patterns=[r'/private/'])
+
+        stats = crawler.crawl(f'{self.base_url}/index.html', self.out_dir)
+
+        self.assertEqual(stats['new'], 2)
+        self.assertEqual(stats['skipped'], 2)  # notes.txt按Content-Type跳过，big.html按大小跳过
+        self.assertEqual(_md_files(self.out_dir), ['c.html.md', 'index.html.md'])
+        self.assertFalse(any(url.endswith(('.pdf', 'secret.html')) for url in crawler.visited_urls))
+        # 响应头没有charset时按页面中的<meta charset>解码
+        with open(os.path.join(self.out_dir, 'c.html.md'), encoding='utf-8') as f:
+            self.assertIn('正文', f.read())
+
+    def test_robots_and_sitemap_drive_the_crawl(self):
+        files = {
+            'robots.txt': f'User-agent: *\nDisallow: /b.html\nCrawl-delay: 0.2\nSitemap: {self.base_url}/sitemap-index.xml\n',
+            'sitemap-index.xml': '<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                                 f'<sitemap><loc>{self.base_url}/pages.xml</loc></sitemap></sitemapindex>',
+            'pages.xml': '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                         f'<url><loc>{self.base_url}/orphan.html</loc></url>'
+                         '<url><loc>https://other.example/x.html</loc></url></urlset>',
+            'orphan.html': '<html><body><h1>Orphan</h1></body></html>',
+        }
+        for name, body in files.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(body)
+
+        started = time.monotonic()
+        stats = WebCrawler().crawl(f'{self.base_url}/index.html', self.out_dir, concurrency=4)
+
+        self.assertEqual(stats['seeded'], 1)
+        self.assertEqual(stats['disallowed'], 1)
+        self.assertEqual(_md_files(self.out_dir), ['a.html.md', 'c.html.md', 'index.html.md', 'orphan.html.md'])
+        # 4个页面，每两次请求至少间隔0.2秒
+        self.assertGreaterEqual(time.monotonic() - started, 0.6)
+
+    def test_sitemap_seeds_only_urls_under_start_path(self):
+        os.makedirs(os.path.join(self.site_dir, 'docs'))
+        os.makedirs(os.path.join(self.site_dir, 'blog'))
+        files = {
+            'sitemap.xml': '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                           f'<url><loc>{self.base_url}/docs/guide.html</loc></url>'
+                           f'<url><loc>{self.base_url}/blog/post.html</loc></url>'
+                           f'<url><loc>{self.base_url}/index.html</loc></url></urlset>',
+            'docs/index.html': '<html><body><h1>Docs</h1></body></html>',
+            'docs/guide.html': '<html><body><h1>Guide</h1></body></html>',
+            'blog/post.html': '<html><body><h1>Post</h1></body></html>',
+        }
+        for name, body in files.items():
+            with open(os.path.join(self.site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(body)
+
+        stats = WebCrawler().crawl(f'{self.base_url}/docs/', self.out_dir)
+
+        self.assertEqual(stats['seeded'], 1)
+        self.assertEqual(_md_files(self.out_dir), ['docs.md', 'docs_guide.html.md'])
+
+    def test_oversized_gzip_sitemap_is_ignored(self):
+        entries = ''.join(f'<url><loc>{self.base_url}/p{i}.html</loc></url>' for i in range(2000))
+        sitemap = f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+        with open(os.path.join(self.site_dir, 'sitemap.xml.gz'), 'wb') as f:
+            f.write(gzip.compress(sitemap.encode('utf-8')))
+        crawler = WebCrawler()
+        url = f'{self.base_url}/sitemap.xml.gz'
+
+        self.assertEqual(len(fetch_sitemap_urls(crawler.session, url, 5)), 2000)
+        # 压缩后远小于上限，但解压后超过上限
+        self.assertEqual(fetch_sitemap_urls(crawler.session, url, 5, max_bytes=len(sitemap) // 2), [])
+        crawler.close()
+
+    def test_metrics_record_each_page_stage(self):
+        metrics_path = os.path.join(self.out_dir, 'metrics.jsonl')
+        metrics = Metrics(metrics_path)
+        stats = WebCrawler(metrics=metrics).crawl(f'{self.base_url}/index.html', self.out_dir, use_sitemap=False)
+        metrics.close()
+
+        summary = metrics.summary()
+        stages = summary['stages']
+        self.assertEqual(stages['page']['count'], stats['new'])
+        for stage in ('fetch', 'decode', 'convert', 'write'):
+            self.assertEqual(stages[stage]['count'], stats['new'], stage)
+        self.assertGreater(stages['fetch']['bytes_in'], 0)
+        self.assertGreater(summary['pages_per_second'], 0)
+        with open(metrics_path, encoding='utf-8') as f:
+            self.assertEqual(sum(1 for _ in f), sum(values['count'] for values in stages.values()))
+
+    def test_progress_callback_and_cancel_keep_frontier(self):
+        start_url = f'{self.base_url}/index.html'
+        cancel_event = threading.Event()
+        events = []
+
+        def callback(url, progress, message):
+            events.append((url, progress))
+            if len(events) == 2:
+                cancel_event.set()
+
+        stats = WebCrawler().crawl(start_url, self.out_dir, use_sitemap=False, callback=callback,
+                                   cancel_event=cancel_event)
+        self.assertTrue(stats['cancelled'])
+        self.assertEqual(stats['new'], 2)
+        self.assertEqual(events[-1], (self.out_dir, -1))
+
+        # 取消后再次爬取从断点继续，最后一次回调的进度为100
+        events.clear()
+        stats = WebCrawler().crawl(start_url, self.out_dir, use_sitemap=False, callback=callback)
+        self.assertFalse(stats['cancelled'])
+        self.assertEqual(stats['new'], 2)
+        self.assertEqual(events[-1], (self.out_dir, 100))
+        self.assertTrue(all(0 <= progress < 100 for _, progress in events[:-1]))
+        self.assertEqual(len(_md_files(self.out_dir)), 4)
+
+    def test_convert_page_matches_two_pass_conversion(self):
+        crawler = WebCrawler()
+        for name, body in SITE.items():
+            url = f'{self.base_url}/{name}'
+            html = f'<html><body>{body}<a href="b.html#top">相对链接</a></body></html>'
+            self.assertEqual(crawler.convert_page(html, url),
+                             (crawler.html_to_markdown(html), crawler.extract_urls(html, url)))
+
+
+if __name__ == "__main__":
+    unittest.main()